@@ -0,0 +1,233 @@
+# Conversor em streaming do XML de clientes (clientes -> cliente -> compras
+# -> compra -> itens -> item, como em dados.xml) para tabelas planas.
+#
+# O arquivo é lido com iterparse, um elemento por vez, e cada item, compra
+# e cliente sai da árvore assim que termina: a memória não cresce com o XML,
+# nem com um cliente que tenha muitas compras.
+# Saem três tabelas, gravadas em lotes de tamanho fixo, em CSV ou Parquet:
+#   itens    - uma linha por item (cliente, compra, produto, quantidade,
+#              preco_unitario, subtotal)
+#   compras  - totais de cada compra, calculados a partir dos itens, ao lado
+#              do <total> que veio no XML
+#   clientes - totais de cada cliente
+#
+# Uso: python conversor_xml.py dados.xml --pasta saida --formato csv
+import xml.etree.ElementTree as ET
+from decimal import Decimal
+import argparse
+import csv
+import os
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # Parquet é opcional
+    pyarrow = None
+
+COLUNAS = {
+    "itens": [
+        "id_cliente", "cliente", "id_compra", "data",
+        "produto", "quantidade", "preco_unitario", "subtotal",
+    ],
+    "compras": [
+        "id_cliente", "id_compra", "data", "itens",
+        "quantidade_total", "total", "total_declarado",
+    ],
+    "clientes": [
+        "id_cliente", "cliente", "email", "compras", "itens",
+        "quantidade_total", "total",
+    ],
+}
+
+# Colunas com valores em dinheiro (Decimal durante a conversão)
+MONETARIAS = {"preco_unitario", "subtotal", "total", "total_declarado"}
+INTEIRAS = {"id_cliente", "id_compra", "quantidade", "itens", "compras", "quantidade_total"}
+
+
+# Base das tabelas de saída: as linhas são acumuladas e gravadas a cada lote
+# (descarregar) de `tamanho_lote` linhas
+class Saida:
+    def __init__(self, tamanho_lote):
+        self.tamanho_lote = tamanho_lote
+        self.lote = []
+
+    def adicionar(self, row):
+        self.lote.append(row)
+        if len(self.lote) >= self.tamanho_lote:
+            self.descarregar()
+
+    def descarregar(self):
+        raise NotImplementedError
+
+    def fechar(self):
+        self.descarregar()
+
+
+# Tabela de saída em CSV
+class SaidaCSV(Saida):
+    def __init__(self, caminho, colunas, tamanho_lote):
+        super().__init__(tamanho_lote)
+        self.file = open(caminho, mode="w", newline="", encoding="utf-8")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(colunas)
+
+    def descarregar(self):
+        self.writer.writerows(self.lote)
+        self.lote = []
+
+    def fechar(self):
+        super().fechar()
+        self.file.close()
+
+
+# Tabela de saída em Parquet: cada lote vira um row group
+class SaidaParquet(Saida):
+    def __init__(self, caminho, colunas, tamanho_lote):
+        if pyarrow is None:
+            raise RuntimeError("A saída em Parquet precisa do pyarrow (pip install pyarrow)")
+        super().__init__(tamanho_lote)
+        self.colunas = colunas
+        self.schema = pyarrow.schema([(coluna, tipo_arrow(coluna)) for coluna in colunas])
+        self.writer = pyarrow.parquet.ParquetWriter(caminho, self.schema)
+
+    def descarregar(self):
+        if not self.lote:
+            return
+        colunas = list(zip(*self.lote))
+        arrays = [
+            pyarrow.array([None if v is None else float(v) for v in valores], pyarrow.float64())
+            if coluna in MONETARIAS
+            else pyarrow.array(valores, self.schema.field(coluna).type)
+            for coluna, valores in zip(self.colunas, colunas)
+        ]
+        self.writer.write_batch(pyarrow.record_batch(arrays, schema=self.schema))
+        self.lote = []
+
+    def fechar(self):
+        super().fechar()
+        self.writer.close()
+
+
+def tipo_arrow(coluna):
+    if coluna in MONETARIAS:
+        return pyarrow.float64()
+    if coluna in INTEIRAS:
+        return pyarrow.int64()
+    return pyarrow.string()
+
+
+def texto(elem, tag):
+    valor = elem.findtext(tag)
+    return None if valor is None else valor.strip()
+
+
+def numero(elem, tag, tipo):
+    valor = texto(elem, tag)
+    return None if valor is None else tipo(valor)
+
+
+# Percorre o XML e chama saidas["itens"|"compras"|"clientes"].adicionar(row)
+# para cada linha, na ordem do documento. Devolve quantas linhas de cada
+# tabela foram geradas.
+def converter(caminho, saidas):
+    contagem = dict.fromkeys(COLUNAS, 0)
+    contexto = ET.iterparse(caminho, events=("start", "end"))
+    _, root = next(contexto)
+    # Elementos abertos no momento; <compras> e <itens> são guardados para
+    # tirar deles cada compra e cada item que terminar
+    cliente = compras = compra = itens = None
+    totais_cliente = totais_compra = None
+    for evento, elem in contexto:
+        if evento == "start":
+            if elem.tag == "cliente":
+                cliente = elem
+                totais_cliente = {"compras": 0, "itens": 0, "quantidade_total": 0, "total": Decimal(0)}
+            elif elem.tag == "compras":
+                compras = elem
+            elif elem.tag == "compra":
+                compra = elem
+                totais_compra = {"itens": 0, "quantidade_total": 0, "total": Decimal(0)}
+            elif elem.tag == "itens":
+                itens = elem
+            continue
+
+        if elem.tag == "item":
+            # id e nome do cliente e da compra vêm antes dos itens no XML
+            quantidade = numero(elem, "quantidade", int)
+            preco_unitario = numero(elem, "preco_unitario", Decimal)
+            subtotal = quantidade * preco_unitario
+            saidas["itens"].adicionar([
+                numero(cliente, "id_cliente", int),
+                texto(cliente, "nome"),
+                numero(compra, "id_compra", int),
+                texto(compra, "data"),
+                texto(elem, "produto"),
+                quantidade,
+                preco_unitario,
+                subtotal,
+            ])
+            contagem["itens"] += 1
+            totais_compra["itens"] += 1
+            totais_compra["quantidade_total"] += quantidade
+            totais_compra["total"] += subtotal
+            itens.remove(elem)
+        elif elem.tag == "compra":
+            saidas["compras"].adicionar([
+                numero(cliente, "id_cliente", int),
+                numero(elem, "id_compra", int),
+                texto(elem, "data"),
+                totais_compra["itens"],
+                totais_compra["quantidade_total"],
+                totais_compra["total"],
+                numero(elem, "total", Decimal),
+            ])
+            contagem["compras"] += 1
+            totais_cliente["compras"] += 1
+            for campo in ("itens", "quantidade_total", "total"):
+                totais_cliente[campo] += totais_compra[campo]
+            compra = None
+            compras.remove(elem)
+        elif elem.tag == "cliente":
+            saidas["clientes"].adicionar([
+                numero(elem, "id_cliente", int),
+                texto(elem, "nome"),
+                texto(elem, "email"),
+                totais_cliente["compras"],
+                totais_cliente["itens"],
+                totais_cliente["quantidade_total"],
+                totais_cliente["total"],
+            ])
+            contagem["clientes"] += 1
+            cliente = None
+            root.clear()
+    return contagem
+
+
+# Converte o XML para itens.<ext>, compras.<ext> e clientes.<ext> na pasta
+def converter_para_arquivos(caminho, pasta, formato="csv", tamanho_lote=10_000):
+    classe = {"csv": SaidaCSV, "parquet": SaidaParquet}[formato]
+    os.makedirs(pasta, exist_ok=True)
+    saidas = {}
+    try:
+        for tabela, colunas in COLUNAS.items():
+            saidas[tabela] = classe(os.path.join(pasta, f"{tabela}.{formato}"), colunas, tamanho_lote)
+        return converter(caminho, saidas)
+    finally:
+        for saida in saidas.values():
+            saida.fechar()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Converte o XML de clientes em tabelas planas")
+    parser.add_argument("entrada", nargs="?", default="./dados.xml")
+    parser.add_argument("--pasta", default="saida", help="pasta dos arquivos gerados")
+    parser.add_argument("--formato", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--tamanho-lote", type=int, default=10_000, help="linhas por escrita")
+    args = parser.parse_args()
+    contagem = converter_para_arquivos(args.entrada, args.pasta, args.formato, args.tamanho_lote)
+    for tabela, linhas in contagem.items():
+        print(f"{tabela}: {linhas} linhas em {os.path.join(args.pasta, f'{tabela}.{args.formato}')}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,60 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-import xml.etree.ElementTree as ET
+from typing import Literal, Optional
+from xml.sax.saxutils import XMLGenerator
+from contextlib import asynccontextmanager
+import importlib.util
+import itertools
+import threading
+import tempfile
+import io
 import os
+import motor_xml
+
+# As respostas em streaming (json, ndjson ou csv, em pedaços de vários
+# produtos) são as mesmas das APIs de produtos da pasta FastAPI: o módulo
+# respostas.py de lá é carregado pelo caminho, sem mexer no sys.path
+def carregar_respostas():
+    caminho = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "FastAPI", "respostas.py")
+    spec = importlib.util.spec_from_file_location("respostas_fastapi", caminho)
+    modulo = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(modulo)
+    return modulo
+
+respostas = carregar_respostas()
 
-app = FastAPI()
 XML_FILE = "database.xml"
+INICIO_RAIZ = b"<produtos>"
+FIM_RAIZ = b"</produtos>"
+FIM_PRODUTO = b"</produto>"
+
+# Garantias do arquivo:
+# - PUT e DELETE reescrevem o arquivo num temporário (com fsync) que depois
+#   substitui o original: o arquivo fica com a versão antiga ou a nova.
+# - POST acrescenta o produto por cima do </produtos> final e faz fsync
+#   antes de responder. Se o processo cair no meio, o arquivo fica sem o
+#   </produtos>; o reparo (reparar_xml), feito ao iniciar a aplicação e
+#   antes de cada acréscimo, descarta o pedaço incompleto depois do último
+#   </produto> e escreve o </produtos> de novo. Numa queda de energia no
+#   meio do acréscimo, isso depende de o sistema de arquivos gravar as
+#   páginas em ordem.
+# - As leituras não usam a trava nem escrevem no arquivo: abrem um
+#   instantâneo (abrir_xml) que lê só até o último </produto> que existia ao
+#   abrir e fecha o </produtos> por conta própria. Um acréscimo feito durante
+#   a leitura (ou interrompido) não aparece nela pela metade.
+
+# Uma escrita por vez no arquivo (as rotas rodam em threads). Reentrante:
+# as escritas também leem o arquivo, com a trava já obtida
+trava_escrita = threading.RLock()
+
+# Ao iniciar, repara um acréscimo interrompido pela queda do processo
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    reparar_xml()
+    yield
+
+app = FastAPI(lifespan=lifespan)
 
 # Modelo de dados para o produto
 class Produto(BaseModel):
@@ -13,76 +63,285 @@ class Produto(BaseModel):
     preco: float
     quantidade: int
 
+# Procura a última ocorrência de `padrao` no arquivo antes da posição `fim`,
+# lendo blocos do fim para o começo. Devolve -1 se não achar.
+def procurar_do_fim(file, padrao, fim, bloco=65536):
+    posicao = fim
+    while posicao > 0:
+        inicio = max(0, posicao - bloco)
+        file.seek(inicio)
+        dados = file.read(min(fim, posicao + len(padrao) - 1) - inicio)
+        achado = dados.rfind(padrao)
+        if achado >= 0:
+            return inicio + achado
+        posicao = inicio
+    return -1
+
+# Função que devolve a posição logo depois do último </produto> do arquivo
+# aberto (ou do <produtos>, se não houver produtos), até onde o conteúdo está
+# completo. None se o arquivo não tiver esse formato. Só lê o arquivo.
+def fim_dos_produtos(file):
+    tamanho = file.seek(0, os.SEEK_END)
+    ultimo = procurar_do_fim(file, FIM_PRODUTO, tamanho)
+    if ultimo >= 0:
+        return ultimo + len(FIM_PRODUTO)
+    inicio = procurar_do_fim(file, INICIO_RAIZ, tamanho)
+    if inicio < 0:
+        return None
+    return inicio + len(INICIO_RAIZ)
+
+# Função que devolve a posição do </produtos> final do arquivo aberto para
+# escrita (None se o arquivo não tiver esse formato). Se depois do último
+# </produto> não houver só o </produtos> (um acréscimo que parou no meio), o
+# resto é descartado e o </produtos> é escrito de novo. Chamada com a trava.
+def fim_da_raiz(file):
+    corte = fim_dos_produtos(file)
+    if corte is None:
+        return None
+    file.seek(corte)
+    resto = file.read()
+    if resto.strip() == FIM_RAIZ:
+        return corte + resto.index(FIM_RAIZ)
+    file.seek(corte)
+    file.write(b"\n" + FIM_RAIZ + b"\n")
+    file.truncate()
+    file.flush()
+    os.fsync(file.fileno())
+    return corte + 1
+
+# Função que repara o fim do XML, se um acréscimo tiver parado no meio
+def reparar_xml():
+    with trava_escrita:
+        if os.path.exists(XML_FILE):
+            with open(XML_FILE, "r+b") as file:
+                fim_da_raiz(file)
+
+# Leitura do XML até o fim do último </produto> que existia ao abrir. Os
+# acréscimos só escrevem depois dessa posição e as reescritas trocam o
+# arquivo (o descritor aberto continua no antigo), então o que vem antes
+# dela não muda; o </produtos> é devolvido pelo próprio leitor.
+class InstantaneoXML:
+    def __init__(self, file, fim):
+        self.file = file
+        self.restante = fim  # bytes do arquivo ainda por ler (None: até o fim)
+        self.final = b"\n" + FIM_RAIZ + b"\n" if fim is not None else b""
+        info = os.fstat(file.fileno())
+        # Identifica o conteúdo lido (cache do documento no motor_xml)
+        self.assinatura = (info.st_ino, info.st_mtime_ns, info.st_size, fim)
+
+    def read(self, n=-1):
+        if n is None or n < 0:
+            n = None
+        if self.restante is None:
+            return self.file.read(n)
+        if self.restante > 0:
+            dados = self.file.read(self.restante if n is None else min(n, self.restante))
+            self.restante = self.restante - len(dados) if dados else 0
+            if dados:
+                return dados
+        n = len(self.final) if n is None else n
+        dados, self.final = self.final[:n], self.final[n:]
+        return dados
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *erro):
+        self.close()
+
+# Função que abre o XML para leitura (None se ele não existir), sem trava
+def abrir_xml():
+    try:
+        file = open(XML_FILE, "rb")
+    except FileNotFoundError:
+        return None
+    try:
+        fim = fim_dos_produtos(file)
+        file.seek(0)
+        return InstantaneoXML(file, fim)
+    except BaseException:
+        file.close()
+        raise
+
+# Função que percorre os elementos <produto> do XML um a um com iterparse,
+# sem guardar os já lidos (ver motor_xml.iterar_elementos)
+def iterar_elementos_xml():
+    instantaneo = abrir_xml()
+    if instantaneo is None:
+        return
+    with instantaneo:
+        yield from motor_xml.iterar_elementos(instantaneo)
+
+# Função que devolve os elementos <produto> que atendem aos filtros (ver
+# motor_xml.consultar_produtos)
+def consultar_elementos_xml(**filtros):
+    instantaneo = abrir_xml()
+    if instantaneo is None:
+        return
+    with instantaneo:
+        yield from motor_xml.consultar_produtos(instantaneo, **filtros)
+
+def produto_do_elemento(elem):
+    return Produto(
+        id=int(elem.find("id").text),
+        nome=elem.find("nome").text,
+        preco=float(elem.find("preco").text),
+        quantidade=int(elem.find("quantidade").text)
+    )
+
+# Função que percorre os produtos do XML um a um, sem montar uma lista
+def iterar_produtos_xml():
+    for elem in iterar_elementos_xml():
+        yield produto_do_elemento(elem)
+
+# Função que procura um produto pelo ID: para no primeiro encontrado e só
+# monta o Produto dele
+def buscar_produto_xml(produto_id):
+    for elem in iterar_elementos_xml():
+        if int(elem.find("id").text) == produto_id:
+            return produto_do_elemento(elem)
+    return None
+
 # Função para ler os dados do XML
 def ler_dados_xml():
-    produtos = []
-    if os.path.exists(XML_FILE):
-        tree = ET.parse(XML_FILE)
-        root = tree.getroot()
-        for elem in root.findall("produto"):
-            produto = Produto(
-                id=int(elem.find("id").text),
-                nome=elem.find("nome").text,
-                preco=float(elem.find("preco").text),
-                quantidade=int(elem.find("quantidade").text)
-            )
-            produtos.append(produto)
-    return produtos
-
-# Função para escrever os dados no XML
+    return list(iterar_produtos_xml())
+
+# Função que escreve um <produto> com o gerador SAX, um campo por vez
+def escrever_produto(gerador, produto):
+    gerador.startElement("produto", {})
+    for campo, valor in produto.model_dump().items():
+        gerador.startElement(campo, {})
+        gerador.characters(str(valor))
+        gerador.endElement(campo)
+    gerador.endElement("produto")
+
+# Função para escrever os dados no XML. Os produtos (que podem vir de um
+# gerador) são escritos um a um num arquivo temporário, que depois substitui
+# o original: nenhuma árvore é montada em memória e uma falha no meio não
+# estraga o arquivo. Cada produto fica numa linha e </produtos> na última,
+# o que permite acrescentar produtos sem reescrever o resto.
 def escrever_dados_xml(produtos):
-    root = ET.Element("produtos")
-    for produto in produtos:
-        produto_elem = ET.SubElement(root, "produto")
-        ET.SubElement(produto_elem, "id").text = str(produto.id)
-        ET.SubElement(produto_elem, "nome").text = produto.nome
-        ET.SubElement(produto_elem, "preco").text = str(produto.preco)
-        ET.SubElement(produto_elem, "quantidade").text = str(produto.quantidade)
-
-    tree = ET.ElementTree(root)
-    tree.write(XML_FILE)
-
-# Rota para obter todos os produtos
+    pasta = os.path.dirname(os.path.abspath(XML_FILE))
+    fd, temporario = tempfile.mkstemp(dir=pasta, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            gerador = XMLGenerator(file, encoding="utf-8", short_empty_elements=False)
+            gerador.startDocument()
+            gerador.startElement("produtos", {})
+            gerador.characters("\n")
+            for produto in produtos:
+                escrever_produto(gerador, produto)
+                gerador.characters("\n")
+            gerador.endElement("produtos")
+            gerador.characters("\n")
+            gerador.endDocument()
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporario, XML_FILE)
+    except BaseException:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        raise
+
+# Função que acrescenta um produto ao fim do XML sem reescrevê-lo: o novo
+# <produto> e o </produtos> são escritos de uma vez por cima do </produtos>
+# final, com fsync. Se o arquivo não terminar assim, ele é reescrito inteiro.
+def acrescentar_produto_xml(produto):
+    with trava_escrita:
+        if not os.path.exists(XML_FILE):
+            escrever_dados_xml([produto])
+            return
+        buffer = io.BytesIO()
+        escrever_produto(XMLGenerator(buffer, encoding="utf-8", short_empty_elements=False), produto)
+        with open(XML_FILE, "r+b") as file:
+            fim = fim_da_raiz(file)
+            if fim is not None:
+                file.seek(fim)
+                file.write(buffer.getvalue() + b"\n" + FIM_RAIZ + b"\n")
+                file.truncate()
+                file.flush()
+                os.fsync(file.fileno())
+                return
+        escrever_dados_xml(itertools.chain(iterar_produtos_xml(), [produto]))
+
+# Rota para obter os produtos, na ordem do documento, paginados por
+# offset/limit ou pelo cursor after_id (só produtos com id maior que ele;
+# equivale a "depois do último recebido" quando os ids são crescentes no
+# arquivo, como acontece com produtos criados pela API em ordem)
 @app.get("/produtos", response_model=list[Produto])
-def listar_produtos():
-    return ler_dados_xml()
+def listar_produtos(
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1),
+    after_id: Optional[int] = None,
+    formato: Literal["json", "ndjson", "csv"] = "json",
+):
+    produtos = iterar_produtos_xml()
+    if after_id is not None:
+        produtos = (produto for produto in produtos if produto.id > after_id)
+    fim = None if limit is None else offset + limit
+    produtos = itertools.islice(produtos, offset, fim)
+    return respostas.resposta_produtos(produtos, formato, list(Produto.model_fields))
+
+# Rota de consulta por faixa de preço, estoque máximo e trecho do nome. Com
+# o lxml, vira uma expressão XPath compilada (e reaproveitada) sobre a árvore
+# do arquivo; sem ele, o arquivo é percorrido com iterparse (ver motor_xml.py)
+@app.get("/produtos/consulta", response_model=list[Produto])
+def consultar_produtos(
+    preco_min: Optional[float] = None,
+    preco_max: Optional[float] = None,
+    quantidade_max: Optional[int] = None,
+    nome_contem: Optional[str] = None,
+    formato: Literal["json", "ndjson", "csv"] = "json",
+):
+    elementos = consultar_elementos_xml(
+        preco_min=preco_min,
+        preco_max=preco_max,
+        quantidade_max=quantidade_max,
+        nome_contem=nome_contem,
+    )
+    return respostas.resposta_produtos(
+        (produto_do_elemento(elem) for elem in elementos), formato, list(Produto.model_fields)
+    )
 
 # Rota para obter um produto por ID
 @app.get("/produtos/{produto_id}", response_model=Produto)
 def obter_produto(produto_id: int):
-    produtos = ler_dados_xml()
-    for produto in produtos:
-        if produto.id == produto_id:
-            return produto
+    produto = buscar_produto_xml(produto_id)
+    if produto is not None:
+        return produto
     raise HTTPException(status_code=404, detail="Produto não encontrado")
 
-# Rota para criar um novo produto
+# Rota para criar um novo produto: confere o ID com uma busca que para no
+# primeiro encontrado e acrescenta o produto no fim do arquivo
 @app.post("/produtos", response_model=Produto)
 def criar_produto(produto: Produto):
-    produtos = ler_dados_xml()
-    if any(p.id == produto.id for p in produtos):
-        raise HTTPException(status_code=400, detail="ID já existe")
-    produtos.append(produto)
-    escrever_dados_xml(produtos)
+    with trava_escrita:
+        if buscar_produto_xml(produto.id) is not None:
+            raise HTTPException(status_code=400, detail="ID já existe")
+        acrescentar_produto_xml(produto)
     return produto
 
-# Rota para atualizar um produto
+# Rota para atualizar um produto: o arquivo é reescrito em streaming, lendo
+# e escrevendo um produto por vez
 @app.put("/produtos/{produto_id}", response_model=Produto)
 def atualizar_produto(produto_id: int, produto_atualizado: Produto):
-    produtos = ler_dados_xml()
-    for i, produto in enumerate(produtos):
-        if produto.id == produto_id:
-            produtos[i] = produto_atualizado
-            escrever_dados_xml(produtos)
-            return produto_atualizado
-    raise HTTPException(status_code=404, detail="Produto não encontrado")
+    with trava_escrita:
+        if buscar_produto_xml(produto_id) is None:
+            raise HTTPException(status_code=404, detail="Produto não encontrado")
+        escrever_dados_xml(
+            produto_atualizado if produto.id == produto_id else produto
+            for produto in iterar_produtos_xml()
+        )
+    return produto_atualizado
 
 # Rota para deletar um produto
 @app.delete("/produtos/{produto_id}", response_model=dict)
 def deletar_produto(produto_id: int):
-    produtos = ler_dados_xml()
-    produtos_filtrados = [produto for produto in produtos if produto.id != produto_id]
-    if len(produtos) == len(produtos_filtrados):
-        raise HTTPException(status_code=404, detail="Produto não encontrado")
-    escrever_dados_xml(produtos_filtrados)
+    with trava_escrita:
+        if buscar_produto_xml(produto_id) is None:
+            raise HTTPException(status_code=404, detail="Produto não encontrado")
+        escrever_dados_xml(produto for produto in iterar_produtos_xml() if produto.id != produto_id)
     return {"mensagem": "Produto deletado com sucesso"}
@@ -0,0 +1,143 @@
+# Motor XML usado pelo mainxml.py: lxml quando estiver instalado, senão o
+# xml.etree.ElementTree da biblioteca padrão. Os dois oferecem a mesma API
+# (iterar_elementos e consultar_produtos), então as rotas não mudam com o
+# motor.
+# A variável de ambiente XML_MOTOR=etree força o ElementTree.
+import xml.etree.ElementTree as ElementTree
+import importlib
+import importlib.machinery
+import importlib.util
+import contextlib
+import threading
+import os
+import sys
+
+PASTA = os.path.dirname(os.path.abspath(__file__))
+
+
+# Importa o lxml de verdade. O lxml.py de exemplo desta pasta tem o mesmo
+# nome do pacote e, com a pasta no sys.path, seria encontrado no lugar dele.
+# Nesse caso, o pacote é procurado nos outros caminhos, sem alterar o
+# sys.path (que é global e compartilhado com as outras threads).
+def importar_lxml():
+    try:
+        spec = importlib.util.find_spec("lxml")
+    except (ImportError, ValueError):
+        return None
+    if spec is None:
+        return None
+    if spec.submodule_search_locations is None:
+        # Achou um módulo, não o pacote: procura o pacote fora desta pasta
+        caminhos = [p for p in sys.path if os.path.abspath(p or os.curdir) != PASTA]
+        spec = importlib.machinery.PathFinder.find_spec("lxml", caminhos)
+        if spec is None or spec.submodule_search_locations is None:
+            return None
+        pacote = importlib.util.module_from_spec(spec)
+        sys.modules["lxml"] = pacote
+        try:
+            spec.loader.exec_module(pacote)
+        except ImportError:
+            del sys.modules["lxml"]
+            return None
+    try:
+        return importlib.import_module("lxml.etree")
+    except ImportError:
+        return None
+
+
+lxml_etree = importar_lxml() if os.environ.get("XML_MOTOR", "lxml") == "lxml" else None
+MOTOR = "lxml" if lxml_etree is not None else "etree"
+
+
+# As funções abaixo leem de `origem`: o caminho do arquivo ou um arquivo
+# binário já aberto, como o instantâneo do mainxml.abrir_xml (que tem o
+# atributo `assinatura`, usado no lugar do stat para o cache do documento)
+def _abrir(origem):
+    if isinstance(origem, (str, os.PathLike)):
+        return open(origem, "rb")
+    return contextlib.nullcontext(origem)
+
+
+def _assinatura(origem):
+    if isinstance(origem, (str, os.PathLike)):
+        info = os.stat(origem)
+        return (os.fspath(origem), info.st_ino, info.st_mtime_ns, info.st_size)
+    return origem.assinatura
+
+
+# Percorre os elementos <produto> do arquivo com iterparse. Cada elemento é
+# limpo depois de usado e sai da árvore, para que ela não guarde os produtos
+# já lidos: a memória não cresce com o arquivo. O lxml filtra a tag no
+# próprio parser, sem gerar eventos para os outros elementos.
+def iterar_elementos(origem):
+    with _abrir(origem) as file:
+        if MOTOR == "lxml":
+            for _, elem in lxml_etree.iterparse(file, events=("end",), tag="produto"):
+                yield elem
+                elem.clear(keep_tail=True)
+                while elem.getprevious() is not None:
+                    del elem.getparent()[0]
+            return
+        contexto = ElementTree.iterparse(file, events=("start", "end"))
+        _, root = next(contexto)
+        for evento, elem in contexto:
+            if evento == "end" and elem.tag == "produto":
+                yield elem
+                elem.clear()
+                root.clear()
+
+
+# Filtros aceitos por consultar_produtos: a condição XPath (usada com o
+# lxml, com o valor passado como variável) e o teste equivalente em Python
+# (usado com o ElementTree, cujo XPath não compara números)
+FILTROS = {
+    "preco_min": ("preco >= $preco_min", lambda elem, valor: float(elem.findtext("preco")) >= valor),
+    "preco_max": ("preco <= $preco_max", lambda elem, valor: float(elem.findtext("preco")) <= valor),
+    "quantidade_max": (
+        "quantidade <= $quantidade_max",
+        lambda elem, valor: int(elem.findtext("quantidade")) <= valor,
+    ),
+    "nome_contem": ("contains(nome, $nome_contem)", lambda elem, valor: valor in (elem.findtext("nome") or "")),
+}
+
+# Expressões XPath compiladas, uma cópia por thread (os objetos XPath do
+# lxml não devem ser usados por várias threads ao mesmo tempo)
+_local = threading.local()
+
+
+def xpath(expressao):
+    compiladas = _local.__dict__.setdefault("compiladas", {})
+    if expressao not in compiladas:
+        compiladas[expressao] = lxml_etree.XPath(expressao)
+    return compiladas[expressao]
+
+
+# Árvore do arquivo analisada pelo lxml, guardada enquanto o arquivo não
+# muda (inode, mtime e tamanho), para que as consultas não o analisem de novo
+_documento = {}
+_trava_documento = threading.Lock()
+
+
+def documento(origem):
+    assinatura = _assinatura(origem)
+    with _trava_documento:
+        if _documento.get("assinatura") != assinatura:
+            with _abrir(origem) as file:
+                _documento.update(assinatura=assinatura, arvore=lxml_etree.parse(file))
+        return _documento["arvore"]
+
+
+# Elementos <produto> do arquivo que atendem a todos os filtros informados
+# (os que forem None são ignorados), na ordem do documento
+def consultar_produtos(origem, **filtros):
+    filtros = {nome: valor for nome, valor in filtros.items() if valor is not None}
+    if isinstance(origem, (str, os.PathLike)) and not os.path.exists(origem):
+        return
+    if MOTOR == "lxml":
+        condicoes = " and ".join(FILTROS[nome][0] for nome in sorted(filtros))
+        expressao = "/produtos/produto" + (f"[{condicoes}]" if condicoes else "")
+        yield from xpath(expressao)(documento(origem), **filtros)
+        return
+    for elem in iterar_elementos(origem):
+        if all(FILTROS[nome][1](elem, valor) for nome, valor in filtros.items()):
+            yield elem
@@ -0,0 +1,28 @@
+# Contador de matrículas `total_alunos` de cada curso.
+#
+# O contador acompanha o array `alunos` do curso e é mantido nas escritas
+# que mexem nele (matrículas em routes/acao.py, exclusão de aluno e
+# criação/atualização de curso), no mesmo update do array, para que as rotas
+# de detalhes leiam o número pronto em vez de fazer $lookup em `alunos`.
+# O total por professor é a soma dos contadores dos seus cursos.
+
+
+async def preencher_contadores(db, todos=False):
+    """
+    Calcula `total_alunos` a partir do array `alunos` nos cursos que ainda
+    não têm o contador (criados antes dele) ou, com todos=True, em todos os
+    cursos, para corrigir um contador que tenha divergido. Devolve quantos
+    cursos foram atualizados.
+    """
+    filtro = {} if todos else {"total_alunos": {"$exists": False}}
+    resultado = await db.cursos.update_many(
+        filtro,
+        [{"$set": {"total_alunos": {"$size": {"$setUnion": [{"$ifNull": ["$alunos", []]}, []]}}}}],
+    )
+    return resultado.modified_count
+
+
+if __name__ == "__main__":
+    import asyncio
+    from config import db
+    print("Cursos atualizados:", asyncio.run(preencher_contadores(db, todos=True)))
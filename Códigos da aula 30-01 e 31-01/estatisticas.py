@@ -0,0 +1,165 @@
+# Coleção materializada `estatisticas` com os resultados das agregações
+# pesadas de routes/acao.py (média de idade por curso/departamento e total
+# de cursos por professor).
+#
+# Cada tipo de estatística é recalculado com o pipeline original terminado
+# em $merge, que grava as linhas em `estatisticas` sem passar pela API; as
+# rotas só leem as linhas prontas (com índice) e informam quando elas foram
+# geradas. A atualização roda numa tarefa em segundo plano (ver main.py):
+#   - a cada ESTATISTICAS_INTERVALO segundos (padrão 300), e
+#   - logo depois de uma escrita que muda os dados usados (marcar_alteracao),
+#     esperando ESTATISTICAS_ESPERA segundos (padrão 5) para juntar uma
+#     rajada de escritas numa atualização só.
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timezone
+
+from pymongo.errors import PyMongoError
+
+from indices import registrar_pipeline
+
+COLECAO = "estatisticas"
+ESTATISTICAS_INTERVALO = float(os.getenv("ESTATISTICAS_INTERVALO", "300"))
+ESTATISTICAS_ESPERA = float(os.getenv("ESTATISTICAS_ESPERA", "5"))
+
+# Média de idade dos alunos por curso e departamento
+PIPELINE_MEDIA_IDADE = registrar_pipeline("estatisticas/media_idade", "alunos", [
+    {
+        "$lookup": {
+            "from": "cursos",
+            "localField": "cursos",
+            "foreignField": "_id",
+            "as": "cursos_info"
+        }
+    },
+    {"$unwind": "$cursos_info"},
+    {
+        "$lookup": {
+            "from": "departamentos",
+            "localField": "cursos_info.departamento_id",
+            "foreignField": "_id",
+            "as": "departamento_info"
+        }
+    },
+    {"$unwind": "$departamento_info"},
+    {
+        "$group": {
+            "_id": {"curso": "$cursos_info.nome", "departamento": "$departamento_info.nome"},
+            "media_idade": {"$avg": "$idade"},
+            "total_alunos": {"$sum": 1}
+        }
+    },
+])
+
+# Total de cursos de cada professor
+PIPELINE_CURSOS_POR_PROFESSOR = registrar_pipeline("estatisticas/cursos_por_professor", "cursos", [
+    {"$group": {"_id": "$professor_id", "total_cursos": {"$sum": 1}}},
+])
+
+# Tipo -> (coleção de origem, pipeline, projeção para as linhas de
+# `estatisticas`). O _id de cada linha inclui o tipo e a chave do $group,
+# para o $merge substituir a linha da mesma chave.
+MATERIALIZACOES = {
+    "media_idade": ("alunos", PIPELINE_MEDIA_IDADE, {
+        "_id": {"tipo": "media_idade", "curso": "$_id.curso", "departamento": "$_id.departamento"},
+        "tipo": "media_idade",
+        "curso": "$_id.curso",
+        "departamento": "$_id.departamento",
+        "media_idade": 1,
+        "total_alunos": 1,
+    }),
+    "cursos_por_professor": ("cursos", PIPELINE_CURSOS_POR_PROFESSOR, {
+        "_id": {"tipo": "cursos_por_professor", "professor_id": "$_id"},
+        "tipo": "cursos_por_professor",
+        "professor_id": "$_id",
+        "total_cursos": 1,
+    }),
+}
+
+_alterado = asyncio.Event()
+
+
+def marcar_alteracao():
+    """
+    Avisa que mudaram dados usados pelas estatísticas (alunos, cursos,
+    departamentos, matrículas); a tarefa de fundo as recalcula em seguida.
+    """
+    _alterado.set()
+
+
+async def atualizar(db, tipo):
+    """
+    Recalcula as linhas de `tipo` em `estatisticas` e devolve os metadados
+    da atualização (quando foi gerada, quanto demorou, quantas linhas).
+    """
+    colecao, pipeline, projecao = MATERIALIZACOES[tipo]
+    agora = datetime.now(timezone.utc)
+    # O BSON guarda milissegundos: sem isso, as linhas desta geração teriam
+    # gerado_em menor que `geracao` e seriam apagadas abaixo
+    geracao = agora.replace(microsecond=agora.microsecond // 1000 * 1000)
+    inicio = time.perf_counter()
+    await db[colecao].aggregate(pipeline + [
+        {"$project": projecao},
+        {"$set": {"gerado_em": geracao}},
+        {"$merge": {"into": COLECAO, "on": "_id", "whenMatched": "replace", "whenNotMatched": "insert"}},
+    ]).to_list(None)
+    # Linhas de gerações anteriores que não saíram nesta (um curso que ficou
+    # sem alunos, por exemplo). Com `$lt`, uma atualização mais antiga que
+    # termine depois não apaga as linhas de uma mais nova.
+    await db[COLECAO].delete_many({"tipo": tipo, "gerado_em": {"$lt": geracao}})
+    linhas = await db[COLECAO].count_documents({"tipo": tipo, "gerado_em": geracao})
+    metadados = {
+        "tipo": "atualizacao",
+        "de": tipo,
+        "duracao_ms": round((time.perf_counter() - inicio) * 1000, 1),
+        "linhas": linhas,
+    }
+    await db[COLECAO].update_one(
+        {"_id": f"atualizacao:{tipo}"},
+        {"$set": metadados, "$max": {"atualizado_em": geracao}},
+        upsert=True,
+    )
+    return {**metadados, "atualizado_em": geracao}
+
+
+async def ler(db, tipo, filtro, ordenacao, limite=0):
+    """
+    Linhas materializadas de `tipo` e os metadados da última atualização.
+    Se o tipo ainda não foi calculado (banco novo), calcula agora.
+    """
+    metadados = await db[COLECAO].find_one({"_id": f"atualizacao:{tipo}"})
+    if metadados is None:
+        metadados = await atualizar(db, tipo)
+    linhas = await db[COLECAO].find({"tipo": tipo, **filtro}).sort(ordenacao).limit(limite).to_list(None)
+    return linhas, metadados
+
+
+def cabecalhos_atualizacao(response, metadados):
+    # Quando as linhas foram geradas e há quantos segundos
+    atualizado_em = metadados["atualizado_em"]
+    if atualizado_em.tzinfo is None:  # o Motor devolve datas em UTC sem fuso
+        atualizado_em = atualizado_em.replace(tzinfo=timezone.utc)
+    idade = (datetime.now(timezone.utc) - atualizado_em).total_seconds()
+    response.headers["X-Estatisticas-Atualizadas-Em"] = atualizado_em.isoformat()
+    response.headers["X-Estatisticas-Idade"] = str(max(0, int(idade)))
+
+
+async def manter_atualizadas(db):
+    """
+    Tarefa de fundo: recalcula todos os tipos ao iniciar, a cada
+    ESTATISTICAS_INTERVALO segundos e depois de marcar_alteracao().
+    """
+    while True:
+        _alterado.clear()
+        for tipo in MATERIALIZACOES:
+            try:
+                await atualizar(db, tipo)
+            except PyMongoError:
+                logging.getLogger(__name__).exception("Erro ao atualizar as estatísticas %s", tipo)
+        try:
+            await asyncio.wait_for(_alterado.wait(), ESTATISTICAS_INTERVALO)
+            await asyncio.sleep(ESTATISTICAS_ESPERA)
+        except asyncio.TimeoutError:
+            pass
@@ -0,0 +1,280 @@
+# Registro dos índices do banco `gestao_academica` e verificação de que as
+# consultas mais usadas pelas rotas realmente usam índices.
+#
+# Os índices são criados na inicialização da API (ver main.py) com
+# `create_indexes`, que não faz nada quando o índice já existe com a mesma
+# definição. Também pode ser rodado à parte, por exemplo num deploy ou CI:
+#
+#     python indices.py
+#
+# que cria os índices, mostra o estado de cada um e termina com erro se
+# alguma consulta registrada (CONSULTAS_QUENTES e PIPELINES_QUENTES) não
+# usar índice.
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+from bson import ObjectId
+
+# Índices por coleção. O `_id` já tem índice em todas as coleções, então os
+# $lookup que usam `foreignField: "_id"` (cursos.alunos -> alunos._id,
+# alunos.cursos -> cursos._id, cursos.departamento_id -> departamentos._id,
+# cursos.professor_id -> professores._id) não precisam de mais nada.
+INDICES = {
+    "cursos": [
+        # $lookup de professores em cursos e $group por professor
+        IndexModel([("professor_id", ASCENDING)], name="cursos_professor_id"),
+        # Cursos de um departamento
+        IndexModel([("departamento_id", ASCENDING)], name="cursos_departamento_id"),
+        # Índice multikey: cursos em que um aluno está (excluir_aluno)
+        IndexModel([("alunos", ASCENDING)], name="cursos_alunos"),
+        # Ordenação de /acao/cursos/maior_carga_horaria e paginação por
+        # carga horária (o _id desempata o cursor)
+        IndexModel([("carga_horaria", DESCENDING), ("_id", DESCENDING)], name="cursos_carga_horaria_id"),
+        IndexModel([("nome", ASCENDING), ("_id", ASCENDING)], name="cursos_nome"),
+    ],
+    "alunos": [
+        # Índice multikey: alunos matriculados em um curso
+        IndexModel([("cursos", ASCENDING)], name="alunos_cursos"),
+        # Ordenação de /acao/alunos/mais_velhos e paginação por idade
+        IndexModel([("idade", DESCENDING), ("_id", DESCENDING)], name="alunos_idade_id"),
+        IndexModel([("nome", ASCENDING), ("_id", ASCENDING)], name="alunos_nome"),
+    ],
+    "turmas": [
+        # Turmas de um curso
+        IndexModel([("curso_id", ASCENDING)], name="turmas_curso_id"),
+        IndexModel([("nome", ASCENDING), ("_id", ASCENDING)], name="turmas_nome"),
+    ],
+    # Paginação por nome (paginacao.py): (nome, _id) nas listagens
+    "departamentos": [
+        IndexModel([("nome", ASCENDING), ("_id", ASCENDING)], name="departamentos_nome"),
+    ],
+    "professores": [
+        IndexModel([("nome", ASCENDING), ("_id", ASCENDING)], name="professores_nome"),
+    ],
+    # Leitura das estatísticas materializadas (estatisticas.py), já na ordem
+    # das rotas, e limpeza das linhas de gerações antigas
+    "estatisticas": [
+        IndexModel(
+            [("tipo", ASCENDING), ("departamento", ASCENDING), ("media_idade", DESCENDING)],
+            name="estatisticas_media_idade",
+        ),
+        IndexModel([("tipo", ASCENDING), ("total_cursos", DESCENDING)], name="estatisticas_total_cursos"),
+        IndexModel([("tipo", ASCENDING), ("gerado_em", ASCENDING)], name="estatisticas_gerado_em"),
+    ],
+}
+
+# Consultas find das rotas que não podem virar varredura da coleção:
+# (descrição, coleção, comando find). Os valores dos filtros são só
+# exemplos: o plano escolhido não depende deles.
+CONSULTAS_QUENTES = [
+    (
+        "alunos mais velhos",
+        "alunos",
+        {"filter": {}, "sort": {"idade": -1}, "limit": 10},
+    ),
+    (
+        "cursos com maior carga horária",
+        "cursos",
+        {"filter": {}, "sort": {"carga_horaria": -1}, "limit": 10},
+    ),
+    (
+        "página de alunos por idade",
+        "alunos",
+        {
+            "filter": {"$or": [{"idade": {"$lt": 20}}, {"idade": 20, "_id": {"$lt": ObjectId()}}]},
+            "sort": {"idade": -1, "_id": -1},
+            "limit": 11,
+        },
+    ),
+    (
+        "professores com mais cursos (estatísticas)",
+        "estatisticas",
+        {"filter": {"tipo": "cursos_por_professor", "total_cursos": {"$gte": 2}}, "sort": {"total_cursos": -1}},
+    ),
+    (
+        "cursos de um aluno",
+        "cursos",
+        {"filter": {"alunos": ObjectId()}},
+    ),
+]
+
+# Pipelines de agregação registrados pelas rotas: (descrição, coleção,
+# pipeline). Em cada $lookup, o campo procurado na outra coleção precisa
+# ser o primeiro campo de algum índice dela.
+PIPELINES_QUENTES = []
+
+
+class IndiceNaoUsado(RuntimeError):
+    def __init__(self, problemas):
+        super().__init__("Consultas sem índice: " + "; ".join(problemas))
+        self.problemas = problemas
+
+
+def registrar_pipeline(descricao, colecao, pipeline):
+    PIPELINES_QUENTES.append((descricao, colecao, pipeline))
+    return pipeline
+
+
+async def criar_indices(db):
+    """
+    Cria os índices do registro. Devolve, por coleção, os nomes criados (ou
+    já existentes) ou o erro, por exemplo um índice com o mesmo nome e outra
+    definição criado à mão.
+    """
+    resultado = {}
+    for colecao, modelos in INDICES.items():
+        try:
+            resultado[colecao] = await db[colecao].create_indexes(modelos)
+        except OperationFailure as erro:
+            resultado[colecao] = {"erro": str(erro)}
+    return resultado
+
+
+async def _construcoes_em_andamento(db):
+    # Construções de índice em andamento, com o progresso (precisa de
+    # permissão para $currentOp; sem ela, a lista fica vazia)
+    try:
+        operacoes = await db.client.admin.aggregate([
+            {"$currentOp": {}},
+            {"$match": {"command.createIndexes": {"$exists": True}}},
+        ]).to_list(None)
+    except OperationFailure:
+        return {}
+    andamento = {}
+    for operacao in operacoes:
+        colecao = operacao["command"]["createIndexes"]
+        for indice in operacao["command"].get("indexes", []):
+            andamento[(colecao, indice["name"])] = operacao.get("progress")
+    return andamento
+
+
+async def status_indices(db):
+    """
+    Estado de cada índice do registro: "pronto", "construindo" (com o
+    progresso, quando o servidor informa) ou "ausente".
+    """
+    andamento = await _construcoes_em_andamento(db)
+    status = {}
+    for colecao, modelos in INDICES.items():
+        existentes = await db[colecao].index_information()
+        status[colecao] = {}
+        for modelo in modelos:
+            nome = modelo.document["name"]
+            if (colecao, nome) in andamento:
+                status[colecao][nome] = {"estado": "construindo", "progresso": andamento[(colecao, nome)]}
+            elif nome in existentes:
+                status[colecao][nome] = {"estado": "pronto"}
+            else:
+                status[colecao][nome] = {"estado": "ausente"}
+    return status
+
+
+def _estagios(plano, nome):
+    # Procura, em qualquer nível do plano, os valores da chave `nome`
+    if isinstance(plano, dict):
+        for chave, valor in plano.items():
+            if chave == nome:
+                yield valor
+            yield from _estagios(valor, nome)
+    elif isinstance(plano, list):
+        for valor in plano:
+            yield from _estagios(valor, nome)
+
+
+# COLLSCAN no explain de um pipeline: (na coleção de origem, nos $lookup).
+# O plano da coleção de origem fica em queryPlanner.winningPlan ou no
+# estágio $cursor; cada estágio $lookup do explain traz as varreduras da
+# outra coleção (collectionScans, com verbosity="executionStats") ou o
+# plano dela, conforme a versão do servidor.
+def _varreduras(plano):
+    origem = False
+    lookups = False
+    for estagio in plano.get("stages", []):
+        if "$lookup" in estagio:
+            if estagio.get("collectionScans", 0) > 0 or "COLLSCAN" in _estagios(estagio, "stage"):
+                lookups = True
+        elif "COLLSCAN" in _estagios(estagio, "stage"):
+            origem = True
+    if "queryPlanner" in plano:
+        origem = origem or "COLLSCAN" in _estagios(plano["queryPlanner"]["winningPlan"], "stage")
+    return origem, lookups
+
+
+def _lookups(pipeline):
+    for estagio in pipeline:
+        if "$lookup" in estagio:
+            yield estagio["$lookup"]
+            yield from _lookups(estagio["$lookup"].get("pipeline", []))
+        if "$facet" in estagio:
+            for sub in estagio["$facet"].values():
+                yield from _lookups(sub)
+
+
+async def verificar_consultas(db, verbosidade="queryPlanner"):
+    """
+    Confere que as consultas registradas usam índices e levanta
+    IndiceNaoUsado com a lista de problemas se alguma não usar:
+      - find: o plano escolhido (explain) não pode ter COLLSCAN
+      - pipeline: o plano não pode ter COLLSCAN num $lookup nem, se o
+        pipeline começar com $match, na coleção de origem (sem $match, ele
+        lê a coleção inteira de propósito)
+      - $lookup: o foreignField precisa ser o primeiro campo de um índice da
+        coleção de origem, e o plano não pode fazer a junção sem índice
+        (NestedLoopJoin/HashJoin, nos servidores que mostram a estratégia)
+    Com verbosidade="executionStats", os pipelines são executados e o
+    explain informa as varreduras feitas dentro de cada $lookup.
+    """
+    problemas = []
+    for descricao, colecao, find in CONSULTAS_QUENTES:
+        plano = await db.command("explain", {"find": colecao, **find}, verbosity="queryPlanner")
+        if "COLLSCAN" in _estagios(plano["queryPlanner"]["winningPlan"], "stage"):
+            problemas.append(f"{descricao} ({colecao}): COLLSCAN")
+
+    informacoes = {}
+    for descricao, colecao, pipeline in PIPELINES_QUENTES:
+        for lookup in _lookups(pipeline):
+            origem = lookup["from"]
+            campo = lookup.get("foreignField")
+            if campo is None or campo == "_id":
+                continue
+            if origem not in informacoes:
+                informacoes[origem] = await db[origem].index_information()
+            if not any(indice["key"][0][0] == campo for indice in informacoes[origem].values()):
+                problemas.append(f"{descricao}: $lookup em {origem}.{campo} sem índice")
+        plano = await db.command(
+            "explain", {"aggregate": colecao, "pipeline": pipeline, "cursor": {}}, verbosity=verbosidade
+        )
+        origem, lookups = _varreduras(plano)
+        if origem and pipeline and "$match" in pipeline[0]:
+            problemas.append(f"{descricao} ({colecao}): COLLSCAN")
+        if lookups:
+            problemas.append(f"{descricao} ({colecao}): COLLSCAN em $lookup")
+        for estrategia in _estagios(plano, "strategy"):
+            if estrategia in ("NestedLoopJoin", "HashJoin"):
+                problemas.append(f"{descricao} ({colecao}): $lookup com {estrategia}")
+
+    if problemas:
+        raise IndiceNaoUsado(problemas)
+
+
+async def _main():
+    from config import db
+    # Os pipelines são registrados quando o módulo das rotas é importado
+    import routes.acao  # noqa: F401
+
+    print("Índices:", await criar_indices(db))
+    for colecao, indices in (await status_indices(db)).items():
+        for nome, estado in indices.items():
+            print(f"  {colecao}.{nome}: {estado}")
+    try:
+        # Fora da API, vale executar os pipelines para ver dentro dos $lookup
+        await verificar_consultas(db, verbosidade="executionStats")
+    except IndiceNaoUsado as erro:
+        for problema in erro.problemas:
+            print("ERRO:", problema)
+        raise SystemExit(1)
+    print("Todas as consultas registradas usam índices")
+
+
+if __name__ == "__main__":
+    import asyncio
+    asyncio.run(_main())
@@ -1,14 +1,40 @@
 # Importação do framework FastAPI para construção de APIs
 from fastapi import FastAPI
+from contextlib import asynccontextmanager
+import asyncio
+import os
+
+from config import db
+from contadores import preencher_contadores
+from estatisticas import manter_atualizadas
+from indices import criar_indices, verificar_consultas
 
 # Importação das rotas organizadas em módulos separados
 from routes import (
     curso_routes, professor_routes, aluno_routes, 
-    turma_routes, departamento_routes, acao
+    turma_routes, departamento_routes, acao, indice_routes
 )
 
+# Com MONGO_VERIFICAR_INDICES=1, a API não sobe se alguma consulta registrada
+# em indices.py não usar índice (útil em staging/CI)
+MONGO_VERIFICAR_INDICES = os.getenv("MONGO_VERIFICAR_INDICES") == "1"
+
+
+# Cria os índices e os contadores que faltarem antes de a API começar a
+# atender e mantém a coleção `estatisticas` atualizada em segundo plano
+@asynccontextmanager
+async def lifespan(app):
+    app.state.indices = await criar_indices(db)
+    await preencher_contadores(db)
+    if MONGO_VERIFICAR_INDICES:
+        await verificar_consultas(db)
+    tarefa_estatisticas = asyncio.create_task(manter_atualizadas(db))
+    yield
+    tarefa_estatisticas.cancel()
+
+
 # Criação da instância principal da aplicação FastAPI
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Inclusão das rotas específicas para cada entidade do sistema acadêmico
 app.include_router(curso_routes.router, prefix="/cursos", tags=["Cursos"])
@@ -17,6 +43,7 @@ app.include_router(aluno_routes.router, prefix="/alunos", tags=["Alunos"])
 app.include_router(turma_routes.router, prefix="/turmas", tags=["Turmas"])
 app.include_router(departamento_routes.router, prefix="/departamentos", tags=["Departamentos"])
 app.include_router(acao.router, prefix="/acao", tags=["Ação"])
+app.include_router(indice_routes.router, prefix="/indices", tags=["Índices"])
 
 # Rota raiz da API, apenas para verificar se a aplicação está rodando
 @app.get("/")
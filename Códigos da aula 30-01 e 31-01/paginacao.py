@@ -0,0 +1,102 @@
+# Paginação por cursor (keyset) das rotas de listagem.
+#
+# Em vez de `skip`, que faz o servidor percorrer e descartar todos os
+# documentos anteriores, cada página continua a partir da chave de ordenação
+# do último documento da página anterior: `_id` ou (campo, _id). Com um
+# índice nessa chave (ver indices.py), uma página funda custa o mesmo que a
+# primeira.
+#
+# O cursor devolvido ao cliente é opaco: a ordenação e os valores da chave
+# em JSON estendido (preserva ObjectId) codificados em base64.
+import base64
+from datetime import datetime
+
+from bson import ObjectId, json_util
+from bson.errors import BSONError
+from fastapi import HTTPException
+from pymongo import ASCENDING, DESCENDING
+
+# Cabeçalho da resposta com o cursor da próxima página (ausente na última)
+CABECALHO_CURSOR = "X-Proximo-Cursor"
+
+# Tipos aceitos como valor da chave num cursor. Qualquer outro (documento,
+# lista, Regex, Code...) mudaria o sentido do filtro em vez de ser comparado.
+# A comparação é pelo tipo exato: Code, por exemplo, é subclasse de str.
+TIPOS_CHAVE = {ObjectId, str, int, float, bool, datetime, type(None)}
+
+
+def codificar_cursor(ordenar, valores):
+    dados = json_util.dumps([ordenar, valores])
+    return base64.urlsafe_b64encode(dados.encode()).decode()
+
+
+def decodificar_cursor(cursor, ordenar):
+    try:
+        anterior, valores = json_util.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError, BSONError):
+        # BSONError: JSON estendido malformado, como {"$oid": "zz"}
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    if anterior != ordenar:
+        raise HTTPException(status_code=400, detail="Cursor gerado para outra ordenação")
+    # Um valor por campo da chave, e só dos tipos de TIPOS_CHAVE
+    if (
+        not isinstance(valores, list)
+        or len(valores) != len(chave_ordenacao(ordenar))
+        or not all(type(valor) in TIPOS_CHAVE for valor in valores)
+    ):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    return valores
+
+
+# Chave de ordenação de `ordenar` ("campo" crescente, "-campo" decrescente):
+# o campo e o _id para desempatar, na mesma direção
+def chave_ordenacao(ordenar):
+    direcao = DESCENDING if ordenar.startswith("-") else ASCENDING
+    campo = ordenar.lstrip("-")
+    campos = ["_id"] if campo == "_id" else [campo, "_id"]
+    return [(campo, direcao) for campo in campos]
+
+
+# Filtro dos documentos que vêm depois de `valores` na ordem da chave:
+# (a, b) > (va, vb) quando a > va, ou a == va e b > vb.
+# No MongoDB, campo nulo e campo ausente ordenam juntos, antes de qualquer
+# outro valor, mas não entram em comparações como {"$gt": valor}: por isso
+# os nulos têm condições próprias (`{campo: None}` pega os dois casos).
+def filtro_apos(chave, valores):
+    depois = "$gt" if chave[0][1] == ASCENDING else "$lt"
+    apos_id = {"_id": {depois: valores[-1]}}
+    if len(chave) == 1:
+        return apos_id
+    campo, valor = chave[0][0], valores[0]
+    # Mesmo valor no campo: desempata pelo _id
+    condicoes = [{campo: valor, **apos_id}]
+    if valor is None:
+        if depois == "$gt":
+            # Crescente: depois dos nulos vêm todos os outros valores
+            condicoes.append({campo: {"$ne": None}})
+    else:
+        condicoes.append({campo: {depois: valor}})
+        if depois == "$lt":
+            # Decrescente: os nulos vêm depois de todos os valores
+            condicoes.append({campo: None})
+    return {"$or": condicoes}
+
+
+async def paginar(colecao, cursor=None, limit=10, ordenar="_id", filtro=None):
+    """
+    Uma página de `colecao` em ordem de `ordenar`, a partir do `cursor`
+    devolvido pela página anterior (None para a primeira). Devolve os
+    documentos e o cursor da próxima página, ou None se esta for a última.
+    """
+    chave = chave_ordenacao(ordenar)
+    consulta = dict(filtro or {})
+    if cursor:
+        apos = filtro_apos(chave, decodificar_cursor(cursor, ordenar))
+        consulta = {"$and": [consulta, apos]} if consulta else apos
+    # Um documento a mais só para saber se há próxima página
+    documentos = await colecao.find(consulta).sort(chave).limit(limit + 1).to_list(None)
+    if len(documentos) <= limit:
+        return documentos, None
+    documentos = documentos[:limit]
+    ultimo = documentos[-1]
+    return documentos, codificar_cursor(ordenar, [ultimo.get(campo) for campo, _ in chave])
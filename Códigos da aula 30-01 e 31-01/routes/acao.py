@@ -7,12 +7,16 @@ from typing import Dict, Any
 
 router = APIRouter()
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Response
 from bson import ObjectId
 from config import db
-from schemas import Aluno, Curso
+from schemas import Aluno, Curso, Matricula
 from typing import List
 from typing import Dict, Any
+from indices import registrar_pipeline
+import estatisticas
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
 
 router = APIRouter()
 
@@ -38,10 +42,12 @@ async def matricular_aluno(curso_id: str, aluno_id: str):
     if not aluno:
         raise HTTPException(status_code=404, detail="Aluno não encontrado")
 
-    # Atualiza o curso para incluir o aluno na lista de matriculados
+    # Atualiza o curso para incluir o aluno na lista de matriculados. O filtro
+    # com `$ne` impede duplicatas e garante que o contador `total_alunos` só
+    # aumenta quando o aluno ainda não estava no curso (tudo no mesmo documento)
     await db.cursos.update_one(
-        {"_id": ObjectId(curso_id)},
-        {"$addToSet": {"alunos": ObjectId(aluno_id)}}  # `$addToSet` impede duplicatas
+        {"_id": ObjectId(curso_id), "alunos": {"$ne": ObjectId(aluno_id)}},
+        {"$push": {"alunos": ObjectId(aluno_id)}, "$inc": {"total_alunos": 1}}
     )
 
     # Atualiza o aluno para incluir o curso na lista de matrículas
@@ -50,9 +56,109 @@ async def matricular_aluno(curso_id: str, aluno_id: str):
         {"$addToSet": {"cursos": ObjectId(curso_id)}}  # Mantém a relação N:N entre alunos e cursos
     )
 
+    estatisticas.marcar_alteracao()
+
     return {"message": "Aluno matriculado com sucesso!"}
 
 
+async def _gravar_em_lote(colecao, operacoes):
+    """
+    Executa as operações ({chave: UpdateOne}) com um único bulk_write não
+    ordenado. Devolve as chaves das operações que falharam.
+    """
+    if not operacoes:
+        return set()
+    chaves = list(operacoes)
+    try:
+        await colecao.bulk_write([operacoes[chave] for chave in chaves], ordered=False)
+    except BulkWriteError as erro:
+        return {chaves[falha["index"]] for falha in erro.details["writeErrors"]}
+    return set()
+
+
+# Matrícula em massa: recebe uma lista de pares curso/aluno e grava todos
+# com poucas idas ao banco (duas buscas com $in e um bulk_write por coleção),
+# em vez das quatro por matrícula de /matriculas/
+@router.post("/matriculas/bulk")
+async def matricular_alunos_em_lote(matriculas: List[Matricula]):
+    """
+    Devolve, na ordem recebida, o status de cada matrícula: "matriculado",
+    "ja_matriculado", "duplicado" (par repetido no lote), "id_invalido",
+    "curso_nao_encontrado", "aluno_nao_encontrado" ou "erro".
+    """
+    status = [None] * len(matriculas)
+    pares = {}
+    for i, matricula in enumerate(matriculas):
+        if not ObjectId.is_valid(matricula.curso_id) or not ObjectId.is_valid(matricula.aluno_id):
+            status[i] = "id_invalido"
+            continue
+        par = (ObjectId(matricula.curso_id), ObjectId(matricula.aluno_id))
+        if par in pares:
+            status[i] = "duplicado"
+            continue
+        pares[par] = i
+
+    # Duas consultas validam todos os ids; dos alunos vêm também os cursos
+    # em que já estão, para separar as matrículas que já existiam
+    cursos_existentes = {
+        curso["_id"]
+        for curso in await db.cursos.find(
+            {"_id": {"$in": list({curso for curso, _ in pares})}}, {"_id": 1}
+        ).to_list(None)
+    }
+    cursos_do_aluno = {
+        aluno["_id"]: set(aluno.get("cursos", []))
+        for aluno in await db.alunos.find(
+            {"_id": {"$in": list({aluno for _, aluno in pares})}}, {"cursos": 1}
+        ).to_list(None)
+    }
+
+    # Agrupa as matrículas novas por curso e por aluno
+    por_curso = {}
+    por_aluno = {}
+    for (curso, aluno), i in pares.items():
+        if curso not in cursos_existentes:
+            status[i] = "curso_nao_encontrado"
+        elif aluno not in cursos_do_aluno:
+            status[i] = "aluno_nao_encontrado"
+        elif curso in cursos_do_aluno[aluno]:
+            status[i] = "ja_matriculado"
+        else:
+            por_curso.setdefault(curso, []).append(aluno)
+            por_aluno.setdefault(aluno, []).append(curso)
+
+    # Nos cursos, uma operação por matrícula, como em /matriculas/, para que
+    # `total_alunos` só conte quem ainda não estava no curso
+    falhas_cursos = await _gravar_em_lote(db.cursos, {
+        (curso, aluno): UpdateOne(
+            {"_id": curso, "alunos": {"$ne": aluno}},
+            {"$push": {"alunos": aluno}, "$inc": {"total_alunos": 1}},
+        )
+        for curso, alunos in por_curso.items()
+        for aluno in alunos
+    })
+    falhas_alunos = await _gravar_em_lote(db.alunos, {
+        aluno: UpdateOne({"_id": aluno}, {"$addToSet": {"cursos": {"$each": cursos}}})
+        for aluno, cursos in por_aluno.items()
+    })
+
+    for curso, alunos in por_curso.items():
+        for aluno in alunos:
+            i = pares[(curso, aluno)]
+            status[i] = "erro" if (curso, aluno) in falhas_cursos or aluno in falhas_alunos else "matriculado"
+
+    if por_curso:
+        estatisticas.marcar_alteracao()
+
+    return {
+        "matriculados": status.count("matriculado"),
+        "resultados": [
+            {"curso_id": matricula.curso_id, "aluno_id": matricula.aluno_id, "status": situacao}
+            for matricula, situacao in zip(matriculas, status)
+        ],
+    }
+
+
 
 
 
@@ -120,15 +226,18 @@ async def cursos_sem_alunos():
     return cursos
 
 
+# Total de cursos por professor lido de `estatisticas` (ver estatisticas.py)
 @router.get("/professores/mais_cursos/{quantidade}")
-async def professores_com_mais_cursos(quantidade: int):
-    pipeline = [
-        {"$group": {"_id": "$professor_id", "total_cursos": {"$sum": 1}}},  # Conta cursos por professor
-        {"$match": {"total_cursos": {"$gte": quantidade}}},  # Filtra professores com mais de X cursos
-        {"$sort": {"total_cursos": -1}}  # Ordena
-    ]
-    resultado = await db.cursos.aggregate(pipeline).to_list(100)
-    return resultado
+async def professores_com_mais_cursos(quantidade: int, response: Response):
+    linhas, metadados = await estatisticas.ler(
+        db,
+        "cursos_por_professor",
+        {"total_cursos": {"$gte": quantidade}},  # Filtra professores com mais de X cursos
+        [("total_cursos", -1)],  # Ordena
+        100,
+    )
+    estatisticas.cabecalhos_atualizacao(response, metadados)
+    return [{"_id": linha["professor_id"], "total_cursos": linha["total_cursos"]} for linha in linhas]
 
 
 
@@ -157,43 +266,31 @@ async def alunos_mais_velhos():
 
 # Cursos, Alunos e Professores
 # Descrição: Retorna os cursos junto com os detalhes dos professores e a contagem de alunos matriculados.
+PIPELINE_CURSOS_DETALHES = registrar_pipeline("cursos/detalhes", "cursos", [
+    {
+        "$lookup": {
+            "from": "professores",
+            "localField": "professor_id",
+            "foreignField": "_id",
+            "as": "professor_info"
+        }
+    },
+    {"$unwind": {"path": "$professor_info", "preserveNullAndEmptyArrays": True}},
+    # O total de alunos vem do contador mantido nas matrículas, sem $lookup em alunos
+    {
+        "$project": {
+            "_id": 1,
+            "nome": 1,
+            "descricao": 1,
+            "professor": "$professor_info.nome",
+            "total_alunos": {"$ifNull": ["$total_alunos", 0]}
+        }
+    }
+])
+
 @router.get("/cursos/detalhes")
 async def cursos_com_professores_e_contagem_alunos():
-    pipeline = [
-        {
-            "$lookup": {
-                "from": "professores",
-                "localField": "professor_id",
-                "foreignField": "_id",
-                "as": "professor_info"
-            }
-        },
-        {"$unwind": {"path": "$professor_info", "preserveNullAndEmptyArrays": True}},
-        {
-            "$lookup": {
-                "from": "alunos",
-                "localField": "alunos",
-                "foreignField": "_id",
-                "as": "alunos_info"
-            }
-        },
-        {
-            "$addFields": {
-                "total_alunos": {"$size": "$alunos_info"}
-            }
-        },
-        {
-            "$project": {
-                "_id": 1,
-                "nome": 1,
-                "descricao": 1,
-                "professor": "$professor_info.nome",
-                "total_alunos": 1
-            }
-        }
-    ]
-    
-    resultado = await db.cursos.aggregate(pipeline).to_list(100)
+    resultado = await db.cursos.aggregate(PIPELINE_CURSOS_DETALHES).to_list(100)
     
     for curso in resultado:
         curso["_id"] = str(curso["_id"])
@@ -202,56 +299,56 @@ async def cursos_com_professores_e_contagem_alunos():
 
 # Alunos, Cursos e Departamentos
 # Descrição: Retorna os alunos e os cursos que eles estão matriculados, juntamente com os departamentos responsáveis pelos cursos.
-@router.get("/alunos/detalhes")
-async def alunos_com_cursos_e_departamentos():
-    pipeline = [
-        {
-            "$lookup": {
-                "from": "cursos",
-                "localField": "cursos",
-                "foreignField": "_id",
-                "as": "cursos_info"
-            }
-        },
-        {
-            "$lookup": {
-                "from": "departamentos",
-                "localField": "cursos_info.departamento_id",
-                "foreignField": "_id",
-                "as": "departamentos_info"
-            }
-        },
-        {
-            "$project": {
-                "_id": 1,
-                "nome": 1,
-                "email": 1,
-                "cursos": {
-                    "$map": {
-                        "input": "$cursos_info",
-                        "as": "curso",
-                        "in": {
-                            "nome": "$$curso.nome",
-                            "departamento": {
-                                "$arrayElemAt": [
-                                    {
-                                        "$filter": {
-                                            "input": "$departamentos_info",
-                                            "as": "departamento",
-                                            "cond": {"$eq": ["$$departamento._id", "$$curso.departamento_id"]}
-                                        }
-                                    },
-                                    0
-                                ]
-                            }
+PIPELINE_ALUNOS_DETALHES = registrar_pipeline("alunos/detalhes", "alunos", [
+    {
+        "$lookup": {
+            "from": "cursos",
+            "localField": "cursos",
+            "foreignField": "_id",
+            "as": "cursos_info"
+        }
+    },
+    {
+        "$lookup": {
+            "from": "departamentos",
+            "localField": "cursos_info.departamento_id",
+            "foreignField": "_id",
+            "as": "departamentos_info"
+        }
+    },
+    {
+        "$project": {
+            "_id": 1,
+            "nome": 1,
+            "email": 1,
+            "cursos": {
+                "$map": {
+                    "input": "$cursos_info",
+                    "as": "curso",
+                    "in": {
+                        "nome": "$$curso.nome",
+                        "departamento": {
+                            "$arrayElemAt": [
+                                {
+                                    "$filter": {
+                                        "input": "$departamentos_info",
+                                        "as": "departamento",
+                                        "cond": {"$eq": ["$$departamento._id", "$$curso.departamento_id"]}
+                                    }
+                                },
+                                0
+                            ]
                         }
                     }
                 }
             }
         }
-    ]
+    }
+])
 
-    resultado = await db.alunos.aggregate(pipeline).to_list(100)
+@router.get("/alunos/detalhes")
+async def alunos_com_cursos_e_departamentos():
+    resultado = await db.alunos.aggregate(PIPELINE_ALUNOS_DETALHES).to_list(100)
 
     for aluno in resultado:
         aluno["_id"] = str(aluno["_id"])
@@ -260,42 +357,31 @@ async def alunos_com_cursos_e_departamentos():
 
 # Professores, Cursos e Alunos
 # Descrição: Retorna os professores, seus cursos e o total de alunos matriculados em cada curso.
+PIPELINE_PROFESSORES_DETALHES = registrar_pipeline("professores/detalhes", "professores", [
+    {
+        "$lookup": {
+            "from": "cursos",
+            "localField": "_id",
+            "foreignField": "professor_id",
+            "as": "cursos_info"
+        }
+    },
+    # Soma dos contadores dos cursos do professor (matrículas, não alunos
+    # distintos), sem $lookup em alunos
+    {
+        "$project": {
+            "_id": 1,
+            "nome": 1,
+            "email": 1,
+            "cursos": "$cursos_info.nome",
+            "total_alunos": {"$sum": "$cursos_info.total_alunos"}
+        }
+    }
+])
+
 @router.get("/professores/detalhes")
 async def professores_com_cursos_e_total_alunos():
-    pipeline = [
-        {
-            "$lookup": {
-                "from": "cursos",
-                "localField": "_id",
-                "foreignField": "professor_id",
-                "as": "cursos_info"
-            }
-        },
-        {
-            "$lookup": {
-                "from": "alunos",
-                "localField": "cursos_info._id",
-                "foreignField": "cursos",
-                "as": "alunos_info"
-            }
-        },
-        {
-            "$addFields": {
-                "total_alunos": {"$size": "$alunos_info"}
-            }
-        },
-        {
-            "$project": {
-                "_id": 1,
-                "nome": 1,
-                "email": 1,
-                "cursos": "$cursos_info.nome",
-                "total_alunos": 1
-            }
-        }
-    ]
-    
-    resultado = await db.professores.aggregate(pipeline).to_list(100)
+    resultado = await db.professores.aggregate(PIPELINE_PROFESSORES_DETALHES).to_list(100)
     
     for professor in resultado:
         professor["_id"] = str(professor["_id"])
@@ -304,38 +390,20 @@ async def professores_com_cursos_e_total_alunos():
 
 # Média de Idade dos Alunos por Curso e Departamento
 # Descrição: Retorna a média de idade dos alunos por curso e por departamento.
-
+# Lida da coleção materializada `estatisticas` (ver estatisticas.py); os
+# cabeçalhos X-Estatisticas-* dizem quando os números foram calculados
 @router.get("/estatisticas/media_idade")
-async def media_idade_alunos_por_curso_departamento():
-    pipeline = [
-        {
-            "$lookup": {
-                "from": "cursos",
-                "localField": "cursos",
-                "foreignField": "_id",
-                "as": "cursos_info"
-            }
-        },
-        {"$unwind": "$cursos_info"},
-        {
-            "$lookup": {
-                "from": "departamentos",
-                "localField": "cursos_info.departamento_id",
-                "foreignField": "_id",
-                "as": "departamento_info"
-            }
-        },
-        {"$unwind": "$departamento_info"},
+async def media_idade_alunos_por_curso_departamento(response: Response):
+    linhas, metadados = await estatisticas.ler(
+        db, "media_idade", {}, [("departamento", 1), ("media_idade", -1)], 100
+    )
+    estatisticas.cabecalhos_atualizacao(response, metadados)
+
+    return [
         {
-            "$group": {
-                "_id": {"curso": "$cursos_info.nome", "departamento": "$departamento_info.nome"},
-                "media_idade": {"$avg": "$idade"},
-                "total_alunos": {"$sum": 1}
-            }
-        },
-        {"$sort": {"_id.departamento": 1, "media_idade": -1}}
+            "_id": {"curso": linha["curso"], "departamento": linha["departamento"]},
+            "media_idade": linha["media_idade"],
+            "total_alunos": linha["total_alunos"],
+        }
+        for linha in linhas
     ]
-
-    resultado = await db.alunos.aggregate(pipeline).to_list(100)
-
-    return resultado
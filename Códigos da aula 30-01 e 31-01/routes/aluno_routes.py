@@ -1,7 +1,10 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Response
 from config import db
+from paginacao import CABECALHO_CURSOR, paginar
+import estatisticas
 from schemas import Aluno
 from typing import List, Dict, Any
+from typing import Literal, Optional
 from bson import ObjectId
 
 # Criação do roteador para agrupar as rotas relacionadas aos alunos
@@ -29,16 +32,26 @@ async def criar_aluno(aluno: Aluno):
     # Converte o `_id` do MongoDB para string antes de retornar
     aluno_criado["_id"] = str(aluno_criado["_id"])
 
+    estatisticas.marcar_alteracao()  # Recalcula as estatísticas materializadas
+
     return aluno_criado
 
 
 # Listar alunos com paginação
 @router.get("/", response_model=List[Aluno])
-async def listar_alunos(skip: int = 0, limit: int = 10):
+async def listar_alunos(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(10, ge=1, le=1000),
+    ordenar: Literal["_id", "nome", "-nome", "idade", "-idade"] = "_id",
+):
     """
-    Lista os alunos do banco de dados com suporte a paginação (skip e limit).
+    Lista os alunos do banco de dados com paginação por cursor: o cursor da
+    próxima página vem no cabeçalho X-Proximo-Cursor e é passado em `cursor`.
     """
-    alunos = await db.alunos.find().skip(skip).limit(limit).to_list(100)
+    alunos, proximo = await paginar(db.alunos, cursor, limit, ordenar)
+    if proximo:
+        response.headers[CABECALHO_CURSOR] = proximo
 
     # Converte `_id` para string antes de retornar
     for aluno in alunos:
@@ -103,6 +116,8 @@ async def atualizar_aluno(aluno_id: str, aluno: Aluno):
     aluno_atualizado = await db.alunos.find_one({"_id": ObjectId(aluno_id)})
     aluno_atualizado["_id"] = str(aluno_atualizado["_id"])
 
+    estatisticas.marcar_alteracao()  # Recalcula as estatísticas materializadas
+
     return aluno_atualizado
 
 
@@ -129,11 +144,20 @@ async def excluir_aluno(aluno_id: str):
     if delete_result.deleted_count == 0:
         raise HTTPException(status_code=500, detail="Erro ao excluir aluno")
 
-    # 🔹 Remove o ID do aluno da lista de alunos nos cursos onde estava matriculado
+    # 🔹 Remove o ID do aluno da lista de alunos nos cursos onde estava matriculado.
+    # Cursos antigos podem guardar o ID como string, e o aluno pode aparecer
+    # mais de uma vez: as duas formas saem todas, e o contador de matrículas
+    # é recalculado a partir da lista que sobrou (como em contadores.py)
+    ids = [aluno_obj_id, aluno_id]
     await db.cursos.update_many(
-        {"alunos": aluno_obj_id},  # Filtra cursos que contêm esse aluno
-        {"$pull": {"alunos": aluno_obj_id}}  # Remove o aluno da lista de `alunos`
+        {"alunos": {"$in": ids}},  # Filtra cursos que contêm esse aluno
+        [
+            {"$set": {"alunos": {"$filter": {"input": "$alunos", "cond": {"$not": [{"$in": ["$$this", ids]}]}}}}},
+            {"$set": {"total_alunos": {"$size": {"$setUnion": ["$alunos", []]}}}},
+        ]
     )
 
+    estatisticas.marcar_alteracao()  # Recalcula as estatísticas materializadas
+
     return {"message": "Aluno excluído e removido dos cursos com sucesso"}
 
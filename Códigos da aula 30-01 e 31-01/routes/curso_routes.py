@@ -1,15 +1,29 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Response
 from config import db
+from paginacao import CABECALHO_CURSOR, paginar
+import estatisticas
 from schemas import Curso
 from typing import List
+from typing import Literal, Optional
 from bson import ObjectId
 from typing import Dict, Any
 
 router = APIRouter()
 
+
+# Converte os IDs de alunos recebidos em ObjectId, o tipo usado nas
+# matrículas (routes/acao.py) e na exclusão de aluno, sem repetições
+def ids_alunos(alunos):
+    if not all(ObjectId.is_valid(aluno_id) for aluno_id in alunos or []):
+        raise HTTPException(status_code=400, detail="ID de aluno inválido")
+    return list(dict.fromkeys(ObjectId(aluno_id) for aluno_id in alunos or []))
+
+
 @router.post("/", response_model=Curso)
 async def criar_curso(curso: Curso):
     curso_dict = curso.dict(by_alias=True, exclude={"id"})  # Remove o id para o Mongo gerar um novo
+    curso_dict["alunos"] = ids_alunos(curso_dict["alunos"])
+    curso_dict["total_alunos"] = len(curso_dict["alunos"])  # Contador de matrículas
     novo_curso = await db.cursos.insert_one(curso_dict)
 
     curso_criado = await db.cursos.find_one({"_id": novo_curso.inserted_id})
@@ -18,13 +32,25 @@ async def criar_curso(curso: Curso):
         raise HTTPException(status_code=400, detail="Erro ao criar curso")
 
     curso_criado["_id"] = str(curso_criado["_id"])  # Converte ObjectId para string antes de retornar
+    curso_criado["alunos"] = [str(aluno_id) for aluno_id in curso_criado["alunos"]]
+
+    estatisticas.marcar_alteracao()  # Recalcula as estatísticas materializadas
 
     return curso_criado
 
 
+# Listagem paginada por cursor: o cursor da próxima página vem no cabeçalho
+# X-Proximo-Cursor e é passado de volta em `cursor`
 @router.get("/", response_model=List[Curso])
-async def listar_cursos(skip: int = 0, limit: int = 10):
-    cursos = await db.cursos.find().skip(skip).limit(limit).to_list(100)
+async def listar_cursos(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(10, ge=1, le=1000),
+    ordenar: Literal["_id", "nome", "-nome", "carga_horaria", "-carga_horaria"] = "_id",
+):
+    cursos, proximo = await paginar(db.cursos, cursor, limit, ordenar)
+    if proximo:
+        response.headers[CABECALHO_CURSOR] = proximo
 
     # Convertendo ObjectId para string antes de passar ao Pydantic
     for curso in cursos:
@@ -71,6 +97,9 @@ async def atualizar_curso(curso_id: str, curso: Curso):
 
     # Removendo o campo id antes da atualização para evitar erro
     curso_dict = curso.dict(by_alias=True, exclude={"id"})
+    # A lista de alunos é substituída inteira, então o contador é refeito
+    curso_dict["alunos"] = ids_alunos(curso_dict["alunos"])
+    curso_dict["total_alunos"] = len(curso_dict["alunos"])
 
     # Atualizar curso
     resultado = await db.cursos.update_one({"_id": ObjectId(curso_id)}, {"$set": curso_dict})
@@ -84,6 +113,9 @@ async def atualizar_curso(curso_id: str, curso: Curso):
 
     # Converter ObjectId para string antes de retornar
     curso_atualizado["_id"] = str(curso_atualizado["_id"])
+    curso_atualizado["alunos"] = [str(aluno_id) for aluno_id in curso_atualizado["alunos"]]
+
+    estatisticas.marcar_alteracao()  # Recalcula as estatísticas materializadas
 
     return curso_atualizado
 
@@ -101,6 +133,8 @@ async def deletar_curso(curso_id: str):
     if resultado.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Curso não encontrado")
 
+    estatisticas.marcar_alteracao()  # Recalcula as estatísticas materializadas
+
     return {"message": "Curso deletado com sucesso"}
 
 
@@ -1,7 +1,10 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Response
 from config import db
+from paginacao import CABECALHO_CURSOR, paginar
+import estatisticas
 from schemas import Departamento
 from typing import List
+from typing import Literal, Optional
 from bson import ObjectId
 
 router = APIRouter()
@@ -27,9 +30,18 @@ async def criar_departamento(departamento: Departamento):
 
 
 
+# Listagem paginada por cursor: o cursor da próxima página vem no cabeçalho
+# X-Proximo-Cursor e é passado de volta em `cursor`
 @router.get("/", response_model=list[Departamento])
-async def listar_departamentos(skip: int = 0, limit: int = 10):
-    departamentos = await db.departamentos.find().skip(skip).limit(limit).to_list(100)
+async def listar_departamentos(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(10, ge=1, le=1000),
+    ordenar: Literal["_id", "nome", "-nome"] = "_id",
+):
+    departamentos, proximo = await paginar(db.departamentos, cursor, limit, ordenar)
+    if proximo:
+        response.headers[CABECALHO_CURSOR] = proximo
 
     for dep in departamentos:
         dep["_id"] = str(dep["_id"])  # Convertendo ObjectId para string
@@ -66,6 +78,8 @@ async def atualizar_departamento(departamento_id: str, departamento: Departament
     departamento_atualizado = await db.departamentos.find_one({"_id": ObjectId(departamento_id)})
     departamento_atualizado["_id"] = str(departamento_atualizado["_id"])
 
+    estatisticas.marcar_alteracao()  # Recalcula as estatísticas materializadas
+
     return departamento_atualizado
 
 
@@ -79,4 +93,6 @@ async def deletar_departamento(departamento_id: str):
     if resultado.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Departamento não encontrado")
 
+    estatisticas.marcar_alteracao()  # Recalcula as estatísticas materializadas
+
     return {"message": "Departamento deletado com sucesso"}
@@ -0,0 +1,16 @@
+from fastapi import APIRouter
+from config import db
+from indices import IndiceNaoUsado, status_indices, verificar_consultas
+
+router = APIRouter()
+
+# Estado dos índices (pronto, construindo ou ausente) e o resultado da
+# verificação de que as consultas registradas usam índice
+@router.get("/")
+async def listar_indices():
+    try:
+        await verificar_consultas(db)
+        problemas = []
+    except IndiceNaoUsado as erro:
+        problemas = erro.problemas
+    return {"indices": await status_indices(db), "consultas_sem_indice": problemas}
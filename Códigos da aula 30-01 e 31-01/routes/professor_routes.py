@@ -1,7 +1,9 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Response
 from config import db
+from paginacao import CABECALHO_CURSOR, paginar
 from schemas import Professor
 from typing import List
+from typing import Literal, Optional
 from bson import ObjectId
 
 router = APIRouter()
@@ -21,9 +23,18 @@ async def criar_professor(professor: Professor):
     return professor_criado
 
 
+# Listagem paginada por cursor: o cursor da próxima página vem no cabeçalho
+# X-Proximo-Cursor e é passado de volta em `cursor`
 @router.get("/", response_model=list[Professor])
-async def listar_professores(skip: int = 0, limit: int = 10):
-    professores = await db.professores.find().skip(skip).limit(limit).to_list(100)
+async def listar_professores(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(10, ge=1, le=1000),
+    ordenar: Literal["_id", "nome", "-nome"] = "_id",
+):
+    professores, proximo = await paginar(db.professores, cursor, limit, ordenar)
+    if proximo:
+        response.headers[CABECALHO_CURSOR] = proximo
 
     for prof in professores:
         prof["_id"] = str(prof["_id"])  # Convertendo ObjectId para string
@@ -1,7 +1,9 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Response
 from config import db
+from paginacao import CABECALHO_CURSOR, paginar
 from schemas import Turma
 from typing import List
+from typing import Literal, Optional
 from bson import ObjectId
 
 router = APIRouter()
@@ -22,9 +24,18 @@ async def criar_turma(turma: Turma):
 
     return turma_criada
 
+# Listagem paginada por cursor: o cursor da próxima página vem no cabeçalho
+# X-Proximo-Cursor e é passado de volta em `cursor`
 @router.get("/", response_model=list[Turma])
-async def listar_turmas(skip: int = 0, limit: int = 10):
-    turmas = await db.turmas.find().skip(skip).limit(limit).to_list(100)
+async def listar_turmas(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(10, ge=1, le=1000),
+    ordenar: Literal["_id", "nome", "-nome"] = "_id",
+):
+    turmas, proximo = await paginar(db.turmas, cursor, limit, ordenar)
+    if proximo:
+        response.headers[CABECALHO_CURSOR] = proximo
 
     for turma in turmas:
         turma["_id"] = str(turma["_id"])  # Convertendo ObjectId para string
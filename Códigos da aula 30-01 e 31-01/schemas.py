@@ -42,4 +42,7 @@ class Departamento(BaseModel):
     chefe_id: Optional[str]  # ID do professor chefe do departamento (Relacionamento 1:1)
     cursos: List[str]  # Lista de IDs dos cursos pertencentes ao departamento (Relacionamento 1:N)
 
-
+# Definição do modelo de dados para uma matrícula (par curso/aluno) da carga em massa
+class Matricula(BaseModel):
+    curso_id: str  # ID do curso
+    aluno_id: str  # ID do aluno
@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("pymongo")
+import indices
+from indices import IndiceNaoUsado, verificar_consultas
+
+
+# Banco falso: devolve o explain pronto de cada coleção e nenhum índice além do _id
+class BancoFalso:
+    def __init__(self, explains):
+        self.explains = explains
+
+    async def command(self, nome, comando, verbosity):
+        return self.explains[comando.get("aggregate") or comando.get("find")]
+
+    def __getitem__(self, colecao):
+        class Colecao:
+            async def index_information(self):
+                return {"_id_": {"key": [("_id", 1)]}}
+
+        return Colecao()
+
+
+PLANO_COM_INDICE = {"queryPlanner": {"winningPlan": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN"}}}}
+PLANO_COLLSCAN = {"queryPlanner": {"winningPlan": {"stage": "COLLSCAN"}}}
+LOOKUP = {"$lookup": {"from": "cursos", "localField": "cursos", "foreignField": "_id", "as": "c"}}
+
+
+def verificar(monkeypatch, pipeline, explain):
+    monkeypatch.setattr(indices, "CONSULTAS_QUENTES", [])
+    monkeypatch.setattr(indices, "PIPELINES_QUENTES", [("teste", "alunos", pipeline)])
+    asyncio.run(verificar_consultas(BancoFalso({"alunos": explain})))
+
+
+def problemas(monkeypatch, pipeline, explain):
+    with pytest.raises(IndiceNaoUsado) as erro:
+        verificar(monkeypatch, pipeline, explain)
+    return erro.value.problemas
+
+
+# Sem $match, o pipeline lê a coleção de origem inteira de propósito
+def test_pipeline_sem_match_pode_varrer_a_origem(monkeypatch):
+    verificar(monkeypatch, [LOOKUP], {"stages": [{"$cursor": PLANO_COLLSCAN}, LOOKUP]})
+
+
+def test_collscan_na_origem_de_pipeline_com_match(monkeypatch):
+    pipeline = [{"$match": {"idade": {"$gt": 20}}}, LOOKUP]
+    # Formato clássico ($cursor) e o do SBE (junção dentro do winningPlan)
+    classico = {"stages": [{"$cursor": PLANO_COLLSCAN}, LOOKUP]}
+    sbe = {"queryPlanner": {"winningPlan": {
+        "queryPlan": {"stage": "EQ_LOOKUP", "strategy": "IndexedLoopJoin", "inputStage": {"stage": "COLLSCAN"}}
+    }}}
+    assert problemas(monkeypatch, pipeline, classico) == ["teste (alunos): COLLSCAN"]
+    assert problemas(monkeypatch, pipeline, sbe) == ["teste (alunos): COLLSCAN"]
+    verificar(monkeypatch, pipeline, {"stages": [{"$cursor": PLANO_COM_INDICE}, LOOKUP]})
+
+
+def test_collscan_dentro_do_lookup(monkeypatch):
+    com_varredura = {**LOOKUP, "collectionScans": 3, "indexesUsed": []}
+    explain = {"stages": [{"$cursor": PLANO_COLLSCAN}, com_varredura]}
+    assert problemas(monkeypatch, [LOOKUP], explain) == ["teste (alunos): COLLSCAN em $lookup"]
+
+    com_indice = {**LOOKUP, "collectionScans": 0, "indexesUsed": ["_id_"]}
+    verificar(monkeypatch, [LOOKUP], {"stages": [{"$cursor": PLANO_COLLSCAN}, com_indice]})
+
+
+def test_juncao_sem_indice(monkeypatch):
+    explain = {"queryPlanner": {"winningPlan": {
+        "stage": "EQ_LOOKUP", "strategy": "HashJoin", "inputStage": {"stage": "COLLSCAN"}
+    }}}
+    assert problemas(monkeypatch, [LOOKUP], explain) == ["teste (alunos): $lookup com HashJoin"]
@@ -0,0 +1,69 @@
+import base64
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("bson")
+from bson import Code, ObjectId, Regex, json_util
+from fastapi import HTTPException
+
+from paginacao import codificar_cursor, decodificar_cursor, filtro_apos, chave_ordenacao
+
+
+def cursor_de(texto):
+    return base64.urlsafe_b64encode(texto.encode()).decode()
+
+
+@pytest.mark.parametrize("ordenar, valores", [
+    ("_id", [ObjectId()]),
+    ("nome", ["Ana", ObjectId()]),
+    ("-idade", [21, ObjectId()]),
+    ("nota", [7.5, ObjectId()]),
+    ("ativo", [True, ObjectId()]),
+    ("criado_em", [datetime(2024, 1, 30, 12, 0), ObjectId()]),
+    ("nome", [None, ObjectId()]),
+])
+def test_cursor_valido_volta_os_valores(ordenar, valores):
+    assert decodificar_cursor(codificar_cursor(ordenar, valores), ordenar) == valores
+
+
+@pytest.mark.parametrize("cursor", [
+    # Não é base64
+    "@@@",
+    # Base64 de algo que não é JSON
+    cursor_de("isto não é json"),
+    # JSON que não é o par [ordenação, valores]
+    cursor_de('{"a": 1}'),
+    cursor_de('["_id"]'),
+    # ObjectId malformado no JSON estendido (bson.errors.InvalidId)
+    cursor_de('["_id", [{"$oid": "zz"}]]'),
+    # Valores que não são lista
+    cursor_de('["_id", "abc"]'),
+    # Quantidade errada de valores para a chave
+    cursor_de('["_id", []]'),
+    cursor_de('["_id", [1, 2]]'),
+    # Documento no lugar do valor: viraria operador no filtro
+    cursor_de('["_id", [{"$gt": ""}]]'),
+    # Lista no lugar do valor
+    cursor_de('["_id", [[1, 2]]]'),
+    # Tipos BSON que não são valores simples
+    codificar_cursor("_id", [Regex(".*")]),
+    codificar_cursor("_id", [Code("function () { return true; }")]),
+])
+def test_cursor_malformado_da_400(cursor):
+    with pytest.raises(HTTPException) as erro:
+        decodificar_cursor(cursor, "_id")
+    assert erro.value.status_code == 400
+
+
+def test_cursor_de_outra_ordenacao_da_400():
+    cursor = codificar_cursor("nome", ["Ana", ObjectId()])
+    with pytest.raises(HTTPException) as erro:
+        decodificar_cursor(cursor, "-nome")
+    assert erro.value.status_code == 400
+
+
+def test_filtro_apos_nulo_crescente_pega_os_nao_nulos():
+    id_ = ObjectId()
+    filtro = filtro_apos(chave_ordenacao("nome"), [None, id_])
+    assert filtro == {"$or": [{"nome": None, "_id": {"$gt": id_}}, {"nome": {"$ne": None}}]}
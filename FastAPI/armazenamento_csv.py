@@ -0,0 +1,424 @@
+import contextlib
+import csv
+import gc
+import io
+import os
+import tempfile
+import threading
+import time
+
+from indice_offsets import IndiceOffsets
+from repositorio import RepositorioArquivo, assinatura_arquivo
+from wal import LogEscrita, sincronizar_pasta
+
+FIELDNAMES = ["id", "nome", "preco", "quantidade"]
+
+# Modos de escrita:
+#   "reescrita" - cada mudança regrava o CSV inteiro
+#   "append"    - cada mudança acrescenta uma linha; a compactação regrava depois
+#   "wal"       - cada lote vai para o log `<csv>.wal` com fsync; checkpoints
+#                 periódicos regravam o CSV e esvaziam o log
+MODOS = ("reescrita", "append", "wal")
+
+
+# Uma linha só com o id (demais campos vazios) marca o produto como removido
+def _eh_remocao(row):
+    return row["preco"] == ""
+
+
+# Desliga o coletor de ciclos durante a carga: criar milhões de objetos
+# dispara coletas que percorrem o catálogo inteiro várias vezes
+@contextlib.contextmanager
+def sem_coleta():
+    ativo = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if ativo:
+            gc.enable()
+
+
+# Leitura rápida de um CSV gravado pelo próprio serviço: as colunas são
+# convertidas de uma vez (map(int), map(float)) e os produtos recebem os
+# valores já tipados, sem o DictReader montar um dicionário por linha nem o
+# modelo converter texto. Levanta ValueError se o arquivo não estiver no
+# formato esperado, para a carga cair na leitura validada.
+def _ler_colunas(file, modelo):
+    reader = csv.reader(file)
+    cabecalho = next(reader, None)
+    if cabecalho is None:
+        return {}, 0
+    if cabecalho != FIELDNAMES:
+        raise ValueError("Cabeçalho inesperado")
+    rows = list(reader)
+    if not rows:
+        return {}, 0
+    if any(len(row) != len(FIELDNAMES) for row in rows):
+        raise ValueError("Linha com número de campos inesperado")
+    ids, nomes, precos, quantidades = zip(*rows)
+    ids = list(map(int, ids))
+
+    produtos = {}
+    if "" in precos:
+        # Há linhas de remoção (modo append): aplica na ordem do arquivo
+        obsoletos = 0
+        for id, nome, preco, quantidade in zip(ids, nomes, precos, quantidades):
+            if preco == "":
+                obsoletos += 2 if produtos.pop(id, None) is not None else 1
+                continue
+            if id in produtos:
+                obsoletos += 1
+            produtos[id] = modelo(id=id, nome=nome, preco=float(preco), quantidade=int(quantidade))
+        return produtos, obsoletos
+
+    precos = map(float, precos)
+    quantidades = map(int, quantidades)
+    for id, nome, preco, quantidade in zip(ids, nomes, precos, quantidades):
+        produtos[id] = modelo(id=id, nome=nome, preco=preco, quantidade=quantidade)
+    return produtos, len(ids) - len(produtos)
+
+
+# Aplica uma linha (produto ou remoção) ao dicionário e conta as obsoletas
+def aplicar_row(produtos, row, modelo):
+    id = int(row["id"])
+    if _eh_remocao(row):
+        obsoletos = 1
+        if produtos.pop(id, None) is not None:
+            obsoletos += 1
+        return obsoletos
+    obsoletos = 1 if id in produtos else 0
+    produtos[id] = modelo(**row)
+    return obsoletos
+
+
+# Lê um CSV de produtos (com eventuais linhas de remoção) e devolve
+# ({id: produto}, linhas obsoletas). Com `confiavel`, tenta antes o caminho
+# rápido de `_ler_colunas`; se ele falhar, relê validando linha a linha.
+def ler_csv(caminho, modelo, confiavel=True):
+    if not os.path.exists(caminho):
+        return {}, 0
+    with open(caminho, mode="r", newline="", encoding="utf-8") as file:
+        if confiavel:
+            try:
+                return _ler_colunas(file, modelo)
+            except ValueError:
+                file.seek(0)
+        produtos = {}
+        obsoletos = 0
+        for row in csv.DictReader(file):
+            obsoletos += aplicar_row(produtos, row, modelo)
+        return produtos, obsoletos
+
+
+# Grava os produtos num arquivo temporário na mesma pasta de `caminho`;
+# com `sincronizar`, só retorna depois do fsync
+def gravar_temporario(caminho, produtos, sincronizar=False):
+    pasta = os.path.dirname(os.path.abspath(caminho))
+    fd, temporario = tempfile.mkstemp(dir=pasta, suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode="w", newline="", encoding="utf-8") as file:
+            writer = csv.writer(file)
+            writer.writerow(FIELDNAMES)
+            # Lê os atributos direto, sem model_dump() por produto
+            writer.writerows(
+                (produto.id, produto.nome, produto.preco, produto.quantidade) for produto in produtos
+            )
+            if sincronizar:
+                file.flush()
+                os.fsync(file.fileno())
+    except BaseException:
+        os.remove(temporario)
+        raise
+    return temporario
+
+
+# Acrescenta registros ao final do CSV (produtos ou remoções) com uma
+# única escrita, para que um lote não fique pela metade no arquivo
+def acrescentar_csv(caminho, rows):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=FIELDNAMES)
+    if not os.path.exists(caminho) or os.path.getsize(caminho) == 0:
+        writer.writeheader()
+    writer.writerows(rows)
+    with open(caminho, mode="a", newline="", encoding="utf-8") as file:
+        file.write(buffer.getvalue())
+
+
+# Modo append: uma queda no meio de acrescentar_csv pode deixar a última
+# linha pela metade (sem a quebra de linha final). Na abertura, ela é
+# descartada antes que a próxima escrita seja acrescentada depois dela.
+def recuperar_csv(caminho, bloco=65536):
+    try:
+        file = open(caminho, mode="r+b")
+    except FileNotFoundError:
+        return
+    with file:
+        tamanho = file.seek(0, os.SEEK_END)
+        fim = tamanho
+        while fim > 0:
+            inicio = max(0, fim - bloco)
+            file.seek(inicio)
+            quebra = file.read(fim - inicio).rfind(b"\n")
+            if quebra >= 0:
+                fim = inicio + quebra + 1
+                break
+            fim = inicio
+        if fim < tamanho:
+            file.truncate(fim)
+            file.flush()
+            os.fsync(file.fileno())
+
+
+# Linhas que registram um lote de mudanças (anterior, atual) no modo append
+# ou no log, e quantas linhas do arquivo elas deixam obsoletas
+def rows_mudancas(mudancas):
+    rows = []
+    obsoletos = 0
+    for anterior, atual in mudancas:
+        if atual is None:
+            rows.append({"id": anterior.id, "nome": "", "preco": "", "quantidade": ""})
+            obsoletos += 2
+        else:
+            rows.append(atual.model_dump())
+            if anterior is not None:
+                obsoletos += 1
+    return rows, obsoletos
+
+
+# Mantém os produtos do CSV em memória, indexados pelo id.
+# O arquivo só é lido de novo quando o mtime ou o tamanho mudam.
+# É o backend "csv" de `repositorio.criar_repositorio`.
+#
+# No modo "append" o CSV funciona como um log: uma linha repetida substitui
+# a anterior e uma linha de remoção apaga o produto. Quando o número de
+# linhas obsoletas passa de `limite_compactacao`, uma thread em segundo
+# plano regrava o arquivo só com os produtos vivos.
+#
+# Com `indice_offsets=True`, as buscas por id de um processo que ainda não
+# tem o catálogo atualizado em memória usam o índice em disco (`<csv>.idx`)
+# e leem só a linha do produto, em vez de carregar o arquivo inteiro.
+#
+# Com `leitura_confiavel=True` (padrão) o CSV é lido pelo caminho rápido de
+# `ler_csv`; se ele falhar, o arquivo é relido linha a linha com a
+# validação completa do modelo.
+#
+# No modo "wal" o CSV é só o último checkpoint: as mudanças vão para o log
+# (ver wal.LogEscrita), que é reaplicado por cima do CSV na carga. Quando o
+# log passa de `limite_wal` bytes, um checkpoint regrava o CSV (com fsync) e
+# descarta do log o que já está nele.
+class ArmazenamentoCSV(RepositorioArquivo):
+    def __init__(
+        self,
+        caminho,
+        modelo,
+        modo="reescrita",
+        limite_compactacao=1000,
+        indice_offsets=False,
+        limite_wal=4 * 1024 * 1024,
+        leitura_confiavel=True,
+        coerencia=False,
+    ):
+        if modo not in MODOS:
+            raise ValueError(f"Modo inválido: {modo}")
+        if modo == "wal" and indice_offsets:
+            # O índice só cobre o CSV, não as mudanças que ainda estão no log
+            raise ValueError("O índice de offsets não pode ser usado no modo wal")
+        super().__init__(caminho, modelo, coerencia)
+        self.modo = modo
+        self.limite_compactacao = limite_compactacao
+        self._obsoletos = 0
+        self._compactando = False
+        self._reescritas = 0
+        self._indice = IndiceOffsets(caminho) if indice_offsets else None
+        self.limite_wal = limite_wal
+        self.leitura_confiavel = leitura_confiavel
+        self._wal = None
+        # Outro worker pode estar gravando no arquivo (ou no log) agora
+        trava = self._coerencia.travar() if self._coerencia is not None else contextlib.nullcontext()
+        if modo == "wal":
+            self._wal = LogEscrita(caminho + ".wal")
+            with trava:
+                self._wal.recuperar()
+        elif modo == "append":
+            with trava:
+                recuperar_csv(caminho)
+
+    # No modo wal o catálogo depende do CSV e do log
+    def _assinatura_arquivo(self):
+        assinatura = super()._assinatura_arquivo()
+        if self._wal is None:
+            return assinatura
+        return (assinatura, assinatura_arquivo(self._wal.caminho))
+
+    def _carregar(self):
+        with sem_coleta():
+            produtos, obsoletos = ler_csv(self.caminho, self.modelo, self.leitura_confiavel)
+            if self._wal is not None:
+                # Só a cauda gravada desde o último checkpoint está no log
+                rows, _ = self._wal.ler()
+                for row in rows:
+                    aplicar_row(produtos, dict(zip(FIELDNAMES, row)), self.modelo)
+        self._obsoletos = obsoletos
+        return produtos
+
+    def obter(self, id):
+        if self._indice is not None and self._assinatura != self._versao():
+            row = self._indice.buscar(id)
+            return None if row is None else self.modelo(**dict(zip(FIELDNAMES, row)))
+        return super().obter(id)
+
+    # Mantém o índice de offsets em dia com o que acabou de ser gravado
+    def _atualizar_indice(self):
+        if self._indice is not None:
+            self._indice.atualizar()
+
+    def _gravar_temporario(self, produtos, sincronizar=False):
+        return gravar_temporario(self.caminho, produtos, sincronizar)
+
+    # O temporário substitui o CSV de uma vez, assim uma falha no meio da
+    # escrita não deixa o arquivo truncado
+    def _reescrever(self, produtos):
+        os.replace(self._gravar_temporario(produtos), self.caminho)
+        self._reescritas += 1
+
+    def _rows_mudancas(self, mudancas):
+        rows, obsoletos = rows_mudancas(mudancas)
+        self._obsoletos += obsoletos
+        return rows
+
+    # Persiste um lote de mudanças (anterior, atual) já aplicado ao índice
+    def _persistir(self, mudancas):
+        try:
+            if self.modo == "append":
+                acrescentar_csv(self.caminho, self._rows_mudancas(mudancas))
+            elif self.modo == "wal":
+                rows = self._rows_mudancas(mudancas)
+                self._wal.acrescentar([[row[campo] for campo in FIELDNAMES] for row in rows])
+            else:
+                self._reescrever(self._produtos.values())
+        except BaseException:
+            # O índice já foi alterado: força a releitura do que está no disco
+            self._assinatura = None
+            raise
+        self._assinatura = self._versao()
+        self._atualizar_indice()
+        if self.modo == "append" and self._obsoletos >= self.limite_compactacao:
+            self._agendar_compactacao()
+        if self.modo == "wal" and self._wal.tamanho() >= self.limite_wal:
+            self._agendar_compactacao()
+
+    # Reescreve o CSV e atualiza o índice sem precisar ler o arquivo de novo
+    def salvar(self, produtos):
+        with self._escrita():
+            if self.modo == "wal":
+                # Trocar o CSV antes de esvaziar o log deixaria uma janela em
+                # que o log antigo seria reaplicado sobre o catálogo novo; a
+                # diferença vai para o log como um lote comum
+                atuais = self.produtos()
+                novos = {produto.id: produto for produto in produtos}
+                mudancas = [(anterior, None) for id, anterior in atuais.items() if id not in novos]
+                mudancas += [(atuais.get(id), produto) for id, produto in novos.items()]
+                self._substituir(novos)
+                self._persistir(mudancas)
+                return
+            self._reescrever(produtos)
+            self._substituir({produto.id: produto for produto in produtos})
+            self._obsoletos = 0
+            self._assinatura = self._versao()
+            self._atualizar_indice()
+
+    def _agendar_compactacao(self):
+        with self._lock:
+            if not self._compactando:
+                self._compactando = True
+                alvo = self.checkpoint if self.modo == "wal" else self.compactar
+                threading.Thread(target=alvo, daemon=True).start()
+
+    # Se o CSV foi regravado (por este ou outro processo) desde `info`, a
+    # cópia feita para compactação ou checkpoint está velha
+    def _regravado_desde(self, info, reescritas):
+        if self._reescritas != reescritas:
+            return True
+        try:
+            atual = os.stat(self.caminho)
+        except FileNotFoundError:
+            return info is not None
+        return info is None or atual.st_ino != info.st_ino or atual.st_size < info.st_size
+
+    # Regrava o CSV só com os produtos vivos. A maior parte do trabalho é
+    # feita fora do lock; as linhas acrescentadas enquanto isso são copiadas
+    # para o final do novo arquivo antes da troca.
+    def compactar(self):
+        try:
+            with self._escrita(publicar=False):
+                if not os.path.exists(self.caminho):
+                    return
+                produtos = list(self.produtos().values())
+                info = os.stat(self.caminho)
+                tamanho = info.st_size
+                reescritas = self._reescritas
+            temporario = self._gravar_temporario(produtos)
+            try:
+                with self._escrita():
+                    if self._regravado_desde(info, reescritas):
+                        os.remove(temporario)
+                        return
+                    with open(self.caminho, mode="rb") as file:
+                        file.seek(tamanho)
+                        cauda = file.read()
+                    if cauda:
+                        with open(temporario, mode="ab") as file:
+                            file.write(cauda)
+                    os.replace(temporario, self.caminho)
+                    self._reescritas += 1
+                    self._obsoletos = cauda.count(b"\n")
+                    self._assinatura = self._versao()
+                    self._atualizar_indice()
+            except BaseException:
+                if os.path.exists(temporario):
+                    os.remove(temporario)
+                raise
+        finally:
+            self._compactando = False
+
+    # Modo wal: regrava o CSV com o catálogo atual e tira do log os lotes que
+    # ele já contém. Se o processo cair entre a troca do CSV e a limpeza do
+    # log, os lotes são reaplicados na carga sem mudar o resultado.
+    def checkpoint(self):
+        try:
+            with self._escrita(publicar=False):
+                produtos = list(self.produtos().values())
+                fim_wal = self._wal.tamanho()
+                info = os.stat(self.caminho) if os.path.exists(self.caminho) else None
+                reescritas = self._reescritas
+            temporario = self._gravar_temporario(produtos, sincronizar=True)
+            with self._escrita():
+                if self._regravado_desde(info, reescritas):
+                    os.remove(temporario)
+                    return
+                try:
+                    os.replace(temporario, self.caminho)
+                except BaseException:
+                    os.remove(temporario)
+                    raise
+                sincronizar_pasta(self.caminho)
+                self._reescritas += 1
+                self._wal.descartar_ate(fim_wal)
+                self._obsoletos = 0
+                self._assinatura = self._versao()
+        finally:
+            self._compactando = False
+
+    # Compacta o CSV (ou faz o checkpoint do log) a cada `intervalo` segundos,
+    # se houver algo a compactar
+    def iniciar_compactacao_periodica(self, intervalo):
+        def loop():
+            while True:
+                time.sleep(intervalo)
+                if self.modo == "append" and self._obsoletos:
+                    self._agendar_compactacao()
+                if self.modo == "wal" and self._wal.tamanho():
+                    self._agendar_compactacao()
+
+        threading.Thread(target=loop, daemon=True).start()
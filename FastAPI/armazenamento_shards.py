@@ -0,0 +1,219 @@
+import bisect
+import contextlib
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from armazenamento_csv import (
+    acrescentar_csv,
+    gravar_temporario,
+    ler_csv,
+    rows_mudancas,
+    sem_coleta,
+)
+from repositorio import RepositorioArquivo, assinatura_arquivo
+
+MODOS = ("reescrita", "append")
+
+
+# Catálogo dividido por faixa de id em vários CSVs (shards) dentro de uma
+# pasta. O `manifesto.json` guarda o tamanho das faixas e, para cada shard,
+# a faixa [inicio, fim) e o arquivo:
+#
+#   {"tamanho_faixa": 100000,
+#    "shards": [{"inicio": 0, "fim": 100000, "arquivo": "shard_000000.csv"}, ...]}
+#
+# Cada lote regrava (ou, no modo "append", acrescenta linhas a) só os shards
+# que ele toca, e a compactação também é feita um shard por vez. Assim o
+# custo de uma escrita depende do tamanho da faixa, não do catálogo inteiro.
+# Na carga, os shards são lidos em paralelo por um pool de threads.
+#
+# É o backend "csv_shards" de `repositorio.criar_repositorio`.
+class ArmazenamentoShardsCSV(RepositorioArquivo):
+    def __init__(
+        self,
+        pasta,
+        modelo,
+        tamanho_faixa=100_000,
+        modo="reescrita",
+        limite_compactacao=1000,
+        threads=4,
+        coerencia=False,
+    ):
+        if modo not in MODOS:
+            raise ValueError(f"Modo inválido: {modo}")
+        os.makedirs(pasta, exist_ok=True)
+        super().__init__(os.path.join(pasta, "manifesto.json"), modelo, coerencia)
+        self.pasta = pasta
+        self.modo = modo
+        self.limite_compactacao = limite_compactacao
+        self.threads = threads
+        self._obsoletos = {}  # número do shard -> linhas obsoletas
+        self._compactando = False
+        self._manifesto = self._ler_manifesto()
+        if self._manifesto is None:
+            self._criar_manifesto(tamanho_faixa)
+
+    @property
+    def tamanho_faixa(self):
+        return self._manifesto["tamanho_faixa"]
+
+    def _ler_manifesto(self):
+        try:
+            with open(self.caminho, mode="r", encoding="utf-8") as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return None
+
+    # Pasta nova: o tamanho da faixa só vale até o primeiro manifesto. Com
+    # vários processos subindo juntos, o manifesto é lido de novo com a trava
+    # entre processos e só é criado se ainda faltar; senão um processo podia
+    # gravar um manifesto vazio por cima dos shards que outro já registrou.
+    def _criar_manifesto(self, tamanho_faixa):
+        trava = self._coerencia.travar() if self._coerencia is not None else contextlib.nullcontext()
+        with self._lock, trava:
+            self._manifesto = self._ler_manifesto()
+            if self._manifesto is not None:
+                return
+            self._manifesto = {"tamanho_faixa": tamanho_faixa, "shards": []}
+            self._gravar_manifesto()
+            if self._coerencia is not None:
+                self._coerencia.incrementar()
+
+    def _gravar_manifesto(self):
+        fd, temporario = tempfile.mkstemp(dir=self.pasta, suffix=".tmp")
+        try:
+            with os.fdopen(fd, mode="w", encoding="utf-8") as file:
+                json.dump(self._manifesto, file, indent=2)
+            os.replace(temporario, self.caminho)
+        except BaseException:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+            raise
+
+    def _numero(self, id):
+        return id // self.tamanho_faixa
+
+    def _arquivo(self, numero):
+        return os.path.join(self.pasta, f"shard_{numero:06d}.csv")
+
+    def _shards(self):
+        return [shard["inicio"] // self.tamanho_faixa for shard in self._manifesto["shards"]]
+
+    # Inclui no manifesto os shards que ainda não existem
+    def _registrar_shards(self, numeros):
+        novos = set(numeros) - set(self._shards())
+        if not novos:
+            return
+        for numero in novos:
+            self._manifesto["shards"].append({
+                "inicio": numero * self.tamanho_faixa,
+                "fim": (numero + 1) * self.tamanho_faixa,
+                "arquivo": os.path.basename(self._arquivo(numero)),
+            })
+        self._manifesto["shards"].sort(key=lambda shard: shard["inicio"])
+        self._gravar_manifesto()
+
+    # O catálogo muda quando o manifesto ou qualquer shard muda
+    def _assinatura_arquivo(self):
+        assinaturas = [assinatura_arquivo(self.caminho)]
+        assinaturas += [assinatura_arquivo(self._arquivo(numero)) for numero in self._shards()]
+        return tuple(assinaturas)
+
+    def _carregar(self):
+        self._manifesto = self._ler_manifesto() or self._manifesto
+        numeros = self._shards()
+        with sem_coleta(), ThreadPoolExecutor(self.threads) as executor:
+            partes = list(executor.map(lambda numero: ler_csv(self._arquivo(numero), self.modelo), numeros))
+        produtos = {}
+        self._obsoletos = {}
+        for numero, (parte, obsoletos) in zip(numeros, partes):
+            produtos.update(parte)
+            self._obsoletos[numero] = obsoletos
+        return produtos
+
+    # Produtos de um shard, em ordem de id, a partir da lista ordenada
+    def _produtos_shard(self, numero):
+        ids = self._ids
+        inicio = bisect.bisect_left(ids, numero * self.tamanho_faixa)
+        fim = bisect.bisect_left(ids, (numero + 1) * self.tamanho_faixa)
+        return [self._produtos[id] for id in ids[inicio:fim]]
+
+    def _reescrever_shard(self, numero):
+        caminho = self._arquivo(numero)
+        os.replace(gravar_temporario(caminho, self._produtos_shard(numero)), caminho)
+        self._obsoletos[numero] = 0
+
+    def _persistir(self, mudancas):
+        por_shard = {}
+        for anterior, atual in mudancas:
+            id = (atual if atual is not None else anterior).id
+            por_shard.setdefault(self._numero(id), []).append((anterior, atual))
+        try:
+            self._registrar_shards(por_shard)
+            for numero, mudancas_shard in por_shard.items():
+                if self.modo == "append":
+                    rows, obsoletos = rows_mudancas(mudancas_shard)
+                    acrescentar_csv(self._arquivo(numero), rows)
+                    self._obsoletos[numero] = self._obsoletos.get(numero, 0) + obsoletos
+                else:
+                    self._reescrever_shard(numero)
+        except BaseException:
+            # O índice já foi alterado: força a releitura do que está no disco
+            self._assinatura = None
+            raise
+        self._assinatura = self._versao()
+        if self.modo == "append" and any(
+            self._obsoletos.get(numero, 0) >= self.limite_compactacao for numero in por_shard
+        ):
+            self._agendar_compactacao(self.limite_compactacao)
+
+    # Regrava todos os shards com os produtos informados e remove os
+    # arquivos de faixas que ficaram vazias
+    def salvar(self, produtos):
+        with self._escrita():
+            antigos = self._shards()
+            self._substituir({produto.id: produto for produto in produtos})
+            numeros = sorted({self._numero(id) for id in self._ids})
+            for numero in numeros:
+                self._reescrever_shard(numero)
+            self._manifesto["shards"] = []
+            self._registrar_shards(numeros)
+            for numero in set(antigos) - set(numeros):
+                os.remove(self._arquivo(numero))
+                self._obsoletos.pop(numero, None)
+            self._assinatura = self._versao()
+
+    def _agendar_compactacao(self, limite=1):
+        with self._lock:
+            if not self._compactando:
+                self._compactando = True
+                threading.Thread(target=self.compactar, args=(limite,), daemon=True).start()
+
+    # Regrava, um por vez, os shards com pelo menos `limite` linhas obsoletas.
+    # Cada shard é regravado com o lock, que só segura as escritas pelo tempo
+    # de regravar aquele shard.
+    def compactar(self, limite=1):
+        try:
+            for numero in self._shards():
+                if self._obsoletos.get(numero, 0) < limite:
+                    continue
+                with self._escrita():
+                    if self._obsoletos.get(numero, 0) >= limite:
+                        self._reescrever_shard(numero)
+                        self._assinatura = self._versao()
+        finally:
+            self._compactando = False
+
+    # Compacta os shards com linhas obsoletas a cada `intervalo` segundos
+    def iniciar_compactacao_periodica(self, intervalo):
+        def loop():
+            while True:
+                time.sleep(intervalo)
+                if self.modo == "append" and any(self._obsoletos.values()):
+                    self._agendar_compactacao()
+
+        threading.Thread(target=loop, daemon=True).start()
@@ -0,0 +1,282 @@
+"""Benchmark dos backends de persistência das APIs de produtos.
+
+Para cada app e tamanho de catálogo, gera os dados, sobe o app em processo
+com o TestClient e mede get por id, listagem, criação, atualização e remoção
+(ops/s, p50 e p99 em ms), além do pico de memória (RSS) do processo.
+Cada cenário roda num subprocesso próprio, para o RSS ser só dele.
+
+Exemplos:
+    python benchmark.py
+    python benchmark.py --tamanhos 1000 100000 --apps crudcsv main4:sqlite
+    python benchmark.py --saida novo.json --comparar base.json
+"""
+import argparse
+import contextlib
+import importlib
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PASTA = os.path.dirname(os.path.abspath(__file__))
+PASTA_XML = os.path.join(PASTA, "..", "Códigos da aula 14-11")
+
+# app -> (módulo, backend do main4 ou modo do CSV, prefixo das rotas, formato dos dados)
+APPS = {
+    "crudcsv": ("crudcsv", None, "/produtos", "csv"),
+    "crudcsv:append": ("crudcsv", "append", "/produtos", "csv"),
+    "main4:memoria": ("main4", "memoria", "/produtos", "repositorio"),
+    "main4:csv": ("main4", "csv", "/produtos", "csv"),
+    "main4:csv_shards": ("main4", "csv_shards", "/produtos", "repositorio"),
+    "main4:xml": ("main4", "xml", "/produtos", "xml"),
+    "main4:sqlite": ("main4", "sqlite", "/produtos", "repositorio"),
+    "main4:binario": ("main4", "binario", "/produtos", "repositorio"),
+    "mainxml": ("mainxml", None, "/produtos", "xml"),
+    "main3": ("main3", None, "/itens", "lista"),
+}
+# Apps sem rota DELETE
+SEM_REMOCAO = {"main3"}
+OPERACOES = ("get", "listar", "criar", "atualizar", "remover")
+TAMANHOS = (1_000, 10_000, 100_000, 1_000_000)
+
+
+# Catálogo determinístico: o mesmo tamanho gera sempre os mesmos produtos
+def gerar_produtos(tamanho, semente=42):
+    aleatorio = random.Random(semente)
+    for id in range(1, tamanho + 1):
+        yield {
+            "id": id,
+            "nome": f"Produto {id}",
+            "preco": round(aleatorio.uniform(1, 1000), 2),
+            "quantidade": aleatorio.randint(0, 500),
+        }
+
+
+def escrever_csv(caminho, tamanho):
+    with open(caminho, mode="w", newline="", encoding="utf-8") as file:
+        file.write("id,nome,preco,quantidade\n")
+        for p in gerar_produtos(tamanho):
+            file.write(f"{p['id']},{p['nome']},{p['preco']},{p['quantidade']}\n")
+
+
+def escrever_xml(caminho, tamanho):
+    with open(caminho, mode="w", encoding="utf-8") as file:
+        file.write("<produtos>")
+        for p in gerar_produtos(tamanho):
+            file.write(
+                f"<produto><id>{p['id']}</id><nome>{p['nome']}</nome>"
+                f"<preco>{p['preco']}</preco><quantidade>{p['quantidade']}</quantidade></produto>"
+            )
+        file.write("</produtos>")
+
+
+def importar_app(modulo, variante):
+    if modulo == "main4":
+        os.environ["PRODUTOS_BACKEND"] = variante
+    if modulo == "crudcsv" and variante:
+        os.environ["CSV_MODO"] = variante
+    # O lxml.py de exemplo da pasta da aula não atrapalha: o motor_xml
+    # importa o pacote lxml sem olhar essa pasta
+    sys.path.insert(0, PASTA_XML if modulo == "mainxml" else PASTA)
+    return importlib.import_module(modulo)
+
+
+def popular(m, modulo, formato, tamanho):
+    if formato == "csv":
+        escrever_csv("database.csv", tamanho)
+    elif formato == "xml":
+        escrever_xml("database.xml", tamanho)
+    elif formato == "repositorio":
+        m.repositorio.aplicar_lote(
+            [("criar", p["id"], m.Produto(**p)) for p in gerar_produtos(tamanho)]
+        )
+    elif formato == "lista":
+        # Pelo inserir_item, para que os índices de id e de valor incluam os itens
+        for p in gerar_produtos(tamanho):
+            m.inserir_item(m.Item(id=p["id"], nome=p["nome"], valor=p["preco"], is_oferta=p["quantidade"] < 10))
+
+
+def corpo(modulo, id):
+    if modulo == "main3":
+        return {"id": id, "nome": f"Novo {id}", "valor": 10.5, "is_oferta": False}
+    return {"id": id, "nome": f"Novo {id}", "preco": 10.5, "quantidade": 3}
+
+
+def percentil(ordenados, p):
+    return ordenados[min(len(ordenados) - 1, int(p / 100 * len(ordenados)))]
+
+
+# Executa `requisicao(i)` até `quantidade` vezes (ou até estourar o tempo,
+# com pelo menos 3 amostras) e resume as latências
+def medir(requisicao, quantidade, tempo_maximo):
+    latencias = []
+    inicio = time.perf_counter()
+    for i in range(quantidade):
+        antes = time.perf_counter()
+        resposta = requisicao(i)
+        latencias.append(time.perf_counter() - antes)
+        if resposta.status_code >= 300:
+            raise RuntimeError(f"{resposta.request.method} {resposta.request.url}: {resposta.status_code} {resposta.text}")
+        if len(latencias) >= 3 and time.perf_counter() - inicio > tempo_maximo:
+            break
+    total = time.perf_counter() - inicio
+    latencias.sort()
+    return {
+        "amostras": len(latencias),
+        "ops_s": round(len(latencias) / total, 2),
+        "p50_ms": round(percentil(latencias, 50) * 1000, 3),
+        "p99_ms": round(percentil(latencias, 99) * 1000, 3),
+    }
+
+
+def rss_pico_mb():
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa em KiB, macOS em bytes
+    return round(pico / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def executar_cenario(app, tamanho, quantidade, quantidade_listar, tempo_maximo):
+    from fastapi.testclient import TestClient
+
+    modulo, variante, prefixo, formato = APPS[app]
+    aleatorio = random.Random(7)
+    with tempfile.TemporaryDirectory() as pasta:
+        os.chdir(pasta)
+        if formato in ("csv", "xml"):
+            popular(None, modulo, formato, tamanho)
+        m = importar_app(modulo, variante)
+        if formato not in ("csv", "xml"):
+            popular(m, modulo, formato, tamanho)
+
+        resultado = {"app": app, "tamanho": tamanho, "operacoes": {}}
+        with TestClient(m.app) as client:
+            # A primeira leitura inclui a carga do arquivo para a memória
+            antes = time.perf_counter()
+            client.get(f"{prefixo}/1")
+            resultado["primeira_leitura_ms"] = round((time.perf_counter() - antes) * 1000, 3)
+
+            # O id do corpo é o mesmo da rota: o mainxml grava o id do corpo
+            def atualizar(id):
+                return client.put(f"{prefixo}/{id}", json=corpo(modulo, id))
+
+            novos = [tamanho + 1 + i for i in range(quantidade)]
+            requisicoes = {
+                "get": lambda i: client.get(f"{prefixo}/{aleatorio.randint(1, tamanho)}"),
+                "listar": lambda i: client.get(f"{prefixo}/" if modulo == "main3" else prefixo),
+                "criar": lambda i: client.post(f"{prefixo}/" if modulo == "main3" else prefixo, json=corpo(modulo, novos[i])),
+                "atualizar": lambda i: atualizar(aleatorio.randint(1, tamanho)),
+                # Remove os produtos criados acima, mantendo o tamanho do catálogo
+                "remover": lambda i: client.delete(f"{prefixo}/{novos[i]}"),
+            }
+            criados = quantidade
+            for operacao in OPERACOES:
+                if operacao == "remover" and modulo in SEM_REMOCAO:
+                    resultado["operacoes"][operacao] = None
+                    continue
+                total = quantidade_listar if operacao == "listar" else quantidade
+                if operacao == "remover":
+                    total = criados
+                medicao = medir(requisicoes[operacao], total, tempo_maximo)
+                if operacao == "criar":
+                    criados = medicao["amostras"]
+                resultado["operacoes"][operacao] = medicao
+        resultado["rss_pico_mb"] = rss_pico_mb()
+    return resultado
+
+
+# Cenários com p50 pior que a base além da tolerância (em %)
+def comparar(base, atual, tolerancia):
+    anteriores = {(r["app"], r["tamanho"]): r for r in base["resultados"] if "operacoes" in r}
+    regressoes = []
+    for r in atual["resultados"]:
+        anterior = anteriores.get((r["app"], r["tamanho"]))
+        if anterior is None or "operacoes" not in r:
+            continue
+        for operacao, medicao in r["operacoes"].items():
+            medicao_base = anterior["operacoes"].get(operacao)
+            if not medicao or not medicao_base:
+                continue
+            variacao = (medicao["p50_ms"] / medicao_base["p50_ms"] - 1) * 100
+            if variacao > tolerancia:
+                regressoes.append(f"{r['app']} n={r['tamanho']} {operacao}: p50 +{variacao:.0f}%")
+    return regressoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--apps", nargs="+", default=list(APPS), choices=list(APPS))
+    parser.add_argument("--tamanhos", nargs="+", type=int, default=list(TAMANHOS))
+    parser.add_argument("--operacoes", type=int, default=200, help="requisições por operação")
+    parser.add_argument("--listagens", type=int, default=5, help="requisições de listagem completa")
+    parser.add_argument("--tempo-maximo", type=float, default=20.0, help="segundos por operação antes de parar")
+    parser.add_argument("--saida", default="benchmark.json")
+    parser.add_argument("--comparar", help="resultado anterior para detectar regressões")
+    parser.add_argument("--tolerancia", type=float, default=20.0, help="piora aceita no p50, em %%")
+    parser.add_argument("--cenario", nargs=2, metavar=("APP", "TAMANHO"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.cenario:
+        app, tamanho = args.cenario[0], int(args.cenario[1])
+        # Logs das rotas não se misturam com o JSON do resultado
+        with contextlib.redirect_stdout(sys.stderr):
+            resultado = executar_cenario(app, tamanho, args.operacoes, args.listagens, args.tempo_maximo)
+        print(json.dumps(resultado))
+        return
+
+    resultados = []
+    for tamanho in args.tamanhos:
+        for app in args.apps:
+            print(f"{app} n={tamanho}...", file=sys.stderr, flush=True)
+            processo = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--cenario", app, str(tamanho),
+                 "--operacoes", str(args.operacoes), "--listagens", str(args.listagens),
+                 "--tempo-maximo", str(args.tempo_maximo)],
+                capture_output=True, text=True,
+            )
+            if processo.returncode != 0:
+                erro = processo.stderr.strip().splitlines()[-1:] or ["sem saída"]
+                resultados.append({"app": app, "tamanho": tamanho, "erro": erro[0]})
+                print(f"  erro: {erro[0]}", file=sys.stderr)
+                continue
+            resultado = json.loads(processo.stdout.strip().splitlines()[-1])
+            resultados.append(resultado)
+            for operacao, medicao in resultado["operacoes"].items():
+                if medicao:
+                    print(f"  {operacao:10} {medicao['ops_s']:>10} ops/s  p50 {medicao['p50_ms']:>9} ms  "
+                          f"p99 {medicao['p99_ms']:>9} ms", file=sys.stderr)
+            print(f"  rss pico {resultado['rss_pico_mb']} MB", file=sys.stderr)
+
+    saida = {
+        "data": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "parametros": {"operacoes": args.operacoes, "listagens": args.listagens, "tempo_maximo": args.tempo_maximo},
+        "resultados": resultados,
+    }
+    with open(args.saida, mode="w", encoding="utf-8") as file:
+        json.dump(saida, file, indent=2, ensure_ascii=False)
+    print(f"Resultados em {args.saida}", file=sys.stderr)
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as file:
+            regressoes = comparar(json.load(file), saida, args.tolerancia)
+        for regressao in regressoes:
+            print(f"REGRESSÃO {regressao}", file=sys.stderr)
+        if regressoes:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
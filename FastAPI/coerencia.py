@@ -0,0 +1,70 @@
+import mmap
+import os
+import struct
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+GERACAO = struct.Struct("<Q")
+
+
+# Coerência entre processos (vários workers do uvicorn) usando só a máquina
+# local: um arquivo `<dados>.geracao` de 8 bytes, mapeado em memória, guarda
+# um contador que todo escritor incrementa depois de gravar. O `flock` nesse
+# mesmo arquivo garante um escritor por vez entre os processos.
+#
+# Um leitor só compara o contador com o último que viu (uma leitura de
+# memória, sem stat nem syscall) e recarrega os dados quando ele muda.
+class Coerencia:
+    def __init__(self, caminho):
+        if fcntl is None:
+            raise RuntimeError("A coerência entre processos precisa de fcntl (Unix)")
+        self.caminho = caminho
+        self._fd = os.open(caminho, os.O_RDWR | os.O_CREAT, 0o644)
+        self._lock = threading.RLock()
+        self._profundidade = 0
+        with self.travar():
+            if os.fstat(self._fd).st_size < GERACAO.size:
+                os.ftruncate(self._fd, GERACAO.size)
+        self._mapa = mmap.mmap(self._fd, GERACAO.size)
+
+    def geracao(self):
+        return GERACAO.unpack_from(self._mapa, 0)[0]
+
+    # Trava de escrita entre processos. Pode ser aninhada na mesma thread: o
+    # flock só é liberado quando o bloco mais externo termina.
+    def travar(self):
+        return _Trava(self)
+
+    # Deve ser chamado com a trava: publica que os dados mudaram
+    def incrementar(self):
+        geracao = self.geracao() + 1
+        GERACAO.pack_into(self._mapa, 0, geracao)
+        return geracao
+
+
+class _Trava:
+    def __init__(self, coerencia):
+        self.coerencia = coerencia
+
+    def __enter__(self):
+        c = self.coerencia
+        c._lock.acquire()
+        if c._profundidade == 0:
+            try:
+                fcntl.flock(c._fd, fcntl.LOCK_EX)
+            except BaseException:
+                c._lock.release()
+                raise
+        c._profundidade += 1
+        return c
+
+    def __exit__(self, *erro):
+        c = self.coerencia
+        c._profundidade -= 1
+        if c._profundidade == 0:
+            fcntl.flock(c._fd, fcntl.LOCK_UN)
+        c._lock.release()
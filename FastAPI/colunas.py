@@ -0,0 +1,102 @@
+import threading
+
+import numpy as np
+
+
+# Cópia colunar (arrays NumPy) de id, preço e quantidade dos produtos, usada
+# para agregações e filtros numéricos sem criar um objeto por linha.
+# É mantida em sincronia pelo ArmazenamentoCSV: `carregar` recebe o catálogo
+# inteiro a cada leitura do CSV e `registrar` recebe cada mudança gravada.
+class ColunasProdutos:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.carregar({})
+
+    def carregar(self, produtos):
+        with self._lock:
+            tamanho = len(produtos)
+            capacidade = max(16, tamanho)
+            self.ids = np.empty(capacidade, dtype=np.int64)
+            self.preco = np.empty(capacidade, dtype=np.float64)
+            self.quantidade = np.empty(capacidade, dtype=np.int64)
+            self.ids[:tamanho] = np.fromiter(produtos.keys(), dtype=np.int64, count=tamanho)
+            self.preco[:tamanho] = np.fromiter(
+                (produto.preco for produto in produtos.values()), dtype=np.float64, count=tamanho
+            )
+            self.quantidade[:tamanho] = np.fromiter(
+                (produto.quantidade for produto in produtos.values()), dtype=np.int64, count=tamanho
+            )
+            self.tamanho = tamanho
+            self._posicoes = {id: i for i, id in enumerate(produtos.keys())}
+
+    def _crescer(self):
+        capacidade = len(self.ids) * 2
+        for nome in ("ids", "preco", "quantidade"):
+            antigo = getattr(self, nome)
+            novo = np.empty(capacidade, dtype=antigo.dtype)
+            novo[:self.tamanho] = antigo[:self.tamanho]
+            setattr(self, nome, novo)
+
+    # anterior=None: produto criado; atual=None: produto removido
+    def registrar(self, anterior, atual):
+        with self._lock:
+            if anterior is None:
+                if self.tamanho == len(self.ids):
+                    self._crescer()
+                i = self.tamanho
+                self.tamanho += 1
+                self._posicoes[atual.id] = i
+            elif atual is None:
+                # Remove trocando pelo último elemento, sem deslocar os arrays
+                i = self._posicoes.pop(anterior.id)
+                ultimo = self.tamanho - 1
+                if i != ultimo:
+                    self.ids[i] = self.ids[ultimo]
+                    self.preco[i] = self.preco[ultimo]
+                    self.quantidade[i] = self.quantidade[ultimo]
+                    self._posicoes[int(self.ids[i])] = i
+                self.tamanho = ultimo
+                return
+            else:
+                i = self._posicoes[anterior.id]
+            self.ids[i] = atual.id
+            self.preco[i] = atual.preco
+            self.quantidade[i] = atual.quantidade
+
+    def estatisticas(self, limite_estoque):
+        with self._lock:
+            n = self.tamanho
+            preco = self.preco[:n]
+            quantidade = self.quantidade[:n]
+            if n == 0:
+                return {
+                    "total_produtos": 0,
+                    "quantidade_total": 0,
+                    "valor_estoque": 0.0,
+                    "preco_min": None,
+                    "preco_max": None,
+                    "preco_medio": None,
+                    "estoque_baixo": 0,
+                }
+            return {
+                "total_produtos": n,
+                "quantidade_total": int(quantidade.sum()),
+                "valor_estoque": float(np.dot(preco, quantidade)),
+                "preco_min": float(preco.min()),
+                "preco_max": float(preco.max()),
+                "preco_medio": float(preco.mean()),
+                "estoque_baixo": int(np.count_nonzero(quantidade < limite_estoque)),
+            }
+
+    # Ids (ordenados) dos produtos que satisfazem todos os filtros informados
+    def filtrar(self, preco_min=None, preco_max=None, quantidade_lt=None):
+        with self._lock:
+            n = self.tamanho
+            mascara = np.ones(n, dtype=bool)
+            if preco_min is not None:
+                mascara &= self.preco[:n] >= preco_min
+            if preco_max is not None:
+                mascara &= self.preco[:n] <= preco_max
+            if quantidade_lt is not None:
+                mascara &= self.quantidade[:n] < quantidade_lt
+            return np.sort(self.ids[:n][mascara])
@@ -1,11 +1,25 @@
-from fastapi import FastAPI, HTTPException 
-from http import HTTPStatus
+from fastapi import FastAPI
 from pydantic import BaseModel
-import csv
+from typing import Literal, Optional
+from repositorio import criar_repositorio
+from rotas_produtos import criar_router
+from respostas import resposta_produtos
+from colunas import ColunasProdutos
 import os
 
 app = FastAPI()
 csv_FILE = "database.csv"
+# "append" grava só uma linha por mudança e compacta o arquivo em segundo plano;
+# "wal" grava cada lote num log com fsync e faz checkpoints do CSV
+CSV_MODO = os.getenv("CSV_MODO", "reescrita")
+# "1" busca produtos por id via índice de offsets em disco (database.csv.idx)
+CSV_INDICE_OFFSETS = os.getenv("CSV_INDICE_OFFSETS") == "1"
+# Tamanho da faixa de ids de cada shard; com ele, os produtos ficam divididos
+# em vários CSVs na pasta database_shards (modos reescrita e append)
+CSV_SHARDS = int(os.getenv("CSV_SHARDS", "0"))
+# "1" ao rodar com vários workers (uvicorn --workers N): as escritas passam
+# por uma trava entre processos e cada worker recarrega o que os outros gravaram
+CSV_COERENCIA = os.getenv("CSV_COERENCIA") == "1"
 
 #Modelo de dados
 class Produto(BaseModel):
@@ -14,78 +28,52 @@ class Produto(BaseModel):
         preco: float
         quantidade: int
 
-# Ler os dados do CSV
-def ler_dados_csv():
-    produtos = []
-    if os.path.exists(csv_FILE):
-        with open (csv_FILE, mode="r", newline="") as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                produtos.append(Produto(**row))
-    return produtos
+class Estatisticas(BaseModel):
+        total_produtos: int
+        quantidade_total: int
+        valor_estoque: float
+        preco_min: Optional[float]
+        preco_max: Optional[float]
+        preco_medio: Optional[float]
+        estoque_baixo: int
 
+# Produtos ficam em memória e o CSV só é relido quando muda no disco. Só as
+# opções próprias do CSV ficam aqui; as rotas CRUD são as de rotas_produtos.py
+if CSV_SHARDS:
+    armazenamento = criar_repositorio(
+        "csv_shards", Produto, "database_shards", CSV_COERENCIA, tamanho_faixa=CSV_SHARDS, modo=CSV_MODO
+    )
+else:
+    armazenamento = criar_repositorio(
+        "csv", Produto, csv_FILE, CSV_COERENCIA, modo=CSV_MODO, indice_offsets=CSV_INDICE_OFFSETS
+    )
+if CSV_MODO in ("append", "wal"):
+    # Além dos limites de linhas obsoletas/tamanho do log, compacta a cada minuto
+    armazenamento.iniciar_compactacao_periodica(60)
 
-#Escrever os dados
-def escrever_dados_csv(produtos):
-    with open(csv_FILE, mode="w", newline="") as file:
-        fieldnames = ["id", "nome", "preco", "quantidade"]
-        writer = csv.DictWriter(file, fieldnames=fieldnames)
-        writer.writeheader()
-        for produto in produtos:
-            writer.writerow(produto.dict())
+# id, preço e quantidade em arrays NumPy para as agregações
+colunas = ColunasProdutos()
+armazenamento.adicionar_observador(colunas)
 
-@app.get("/produtos", response_model=list[Produto])
-def listar_produtos():
-        return ler_dados_csv()
-    
-@app.get("/produtos/{id}")
-def get_products_by_id(id:int):
-    products = ler_dados_csv()
-    
-    for product in products:
-        if product.id == id:
-            return product
-    raise HTTPException(status_code=404, detail="Item nao encontrado")
+# Agregações do estoque calculadas sobre as colunas, sem montar os produtos.
+# Declarada antes das rotas /produtos/{produto_id} do router.
+@app.get("/produtos/stats", response_model=Estatisticas)
+def estatisticas_produtos(limite_estoque: int = 10):
+    armazenamento.produtos()  # recarrega o CSV (e as colunas) se ele mudou
+    return colunas.estatisticas(limite_estoque)
 
-@app.post("/produtos",response_model=Produto, status_code=HTTPStatus.CREATED )
-def criar_produto(produto:Produto):
-    produtos = ler_dados_csv()
-    
-    if any(p.id == produto.id for p in produtos):
-        raise HTTPException(status_code=400,detail="Produto já existente")
-    produtos.append(produto)
-    escrever_dados_csv(produtos)
-    return produto
-    
-@app.put("/produtos/{id}",response_model=Produto)
-def atualizar_produto(id:int, produtoAtualizado:Produto):
-    produtos = ler_dados_csv()
-    for i , produto in enumerate(produtos):
-        if produto.id == id:
-            produtos[i] = produtoAtualizado
-            escrever_dados_csv(produtos)
-            return produtoAtualizado
-    raise HTTPException(status_code=404,detail="Produto não encontrado")
+# Produtos dentro das faixas de preço/quantidade informadas, em ordem de id
+@app.get("/produtos/filtro", response_model=list[Produto])
+def filtrar_produtos(
+    preco_min: Optional[float] = None,
+    preco_max: Optional[float] = None,
+    quantidade_lt: Optional[int] = None,
+    formato: Literal["json", "ndjson", "csv"] = "json",
+):
+    produtos = armazenamento.produtos()
+    ids = colunas.filtrar(preco_min, preco_max, quantidade_lt)
+    encontrados = (produtos[id] for id in ids.tolist() if id in produtos)
+    return resposta_produtos(encontrados, formato, list(Produto.model_fields))
 
-@app.delete("/produtos2/{id}", status_code=HTTPStatus.NO_CONTENT)
-def remover_produto(id:int):
-    produtos = ler_dados_csv()
-    for i, produto in enumerate(produtos):
-        if produto.id == id:
-            produtos.pop(i)
-            escrever_dados_csv(produtos)
-            return {
-                        "id": id,
-                        "message" : "Produto deletado"
-                    }
-    raise HTTPException(status_code=404, detail="Produto não encontrado")
-
-@app.delete("/produtos/{id}", status_code=HTTPStatus.NO_CONTENT)
-def remover_produto2(id:int):
-    produtos = ler_dados_csv()
-    produtos_filtrados = [produto for produto in produtos if produto.id == id]
-    if len(produtos) == len(produtos_filtrados):
-        raise HTTPException(status_code=404, detail="Produto não encontrado")
-    escrever_dados_csv(produtos_filtrados)
-    return {"message" : "Produto deletado"}
-     
\ No newline at end of file
+# Listagem, busca, cargas em massa e CRUD por id
+app.include_router(criar_router(armazenamento, Produto))
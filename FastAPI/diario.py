@@ -0,0 +1,150 @@
+import gc
+import os
+import pickle
+import struct
+import tempfile
+import threading
+import zlib
+
+from wal import sincronizar_pasta
+
+# Cabeçalho de cada registro do journal: tamanho e crc32 dos dados
+CABECALHO = struct.Struct("<II")
+
+
+def _gravar_atomico(caminho, dados):
+    pasta = os.path.dirname(os.path.abspath(caminho))
+    fd, temporario = tempfile.mkstemp(dir=pasta, suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode="wb") as file:
+            file.write(dados)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporario, caminho)
+    except BaseException:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        raise
+    sincronizar_pasta(caminho)
+
+
+# Persistência opcional dos itens que os apps guardam só em memória
+# (main3.py, main22.py): um snapshot `<caminho>.snapshot` com o estado
+# inteiro (pickle protocolo 5) e um journal binário `<caminho>.journal` com
+# cada mutação feita depois dele.
+#
+# Cada registro do journal é (seq, operação) em pickle, precedido do tamanho
+# e do crc32; um registro cortado por uma queda é descartado na abertura. O
+# snapshot guarda o seq da última operação que ele já contém, então, se o
+# processo cair entre gravar o snapshot e encurtar o journal, as operações
+# repetidas são puladas na carga.
+#
+# A cada `limite` registros, um snapshot novo é gravado numa thread e o
+# journal volta a ter só as operações posteriores a ele. O que as operações
+# significam fica a cargo do app: o Diario só guarda e devolve.
+#
+# `trava` é o lock com que o app aplica as operações e chama registrar(). A
+# thread do snapshot copia o estado com essa trava (nenhuma operação entra
+# no meio da cópia) e serializa a cópia depois de soltá-la, então a
+# requisição que completa o limite não paga pela cópia.
+class Diario:
+    def __init__(self, caminho, trava, limite=10_000, sincronizar=False):
+        self.caminho_snapshot = caminho + ".snapshot"
+        self.caminho_journal = caminho + ".journal"
+        self.trava = trava
+        self.limite = limite
+        # Com sincronizar=True, cada registro tem fsync (sobrevive a uma queda
+        # de energia); sem ele, só a uma queda do processo
+        self.sincronizar = sincronizar
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._registros = 0  # registros no journal desde o último snapshot
+        self._gravando = False
+        self._file = None
+
+    def _ler_journal(self, seq_snapshot):
+        operacoes = []
+        fim = 0
+        if not os.path.exists(self.caminho_journal):
+            return operacoes, fim
+        with open(self.caminho_journal, mode="rb") as file:
+            dados = file.read()
+        posicao = 0
+        while posicao + CABECALHO.size <= len(dados):
+            tamanho, crc = CABECALHO.unpack_from(dados, posicao)
+            inicio = posicao + CABECALHO.size
+            registro = dados[inicio:inicio + tamanho]
+            if len(registro) < tamanho or zlib.crc32(registro) != crc:
+                break
+            seq, operacao = pickle.loads(registro)
+            self._seq = max(self._seq, seq)
+            if seq > seq_snapshot:
+                operacoes.append(operacao)
+            posicao = fim = inicio + tamanho
+        return operacoes, fim
+
+    # Devolve o estado do último snapshot (None se não houver) e as operações
+    # gravadas depois dele, na ordem, para o app reaplicar
+    def carregar(self):
+        estado = None
+        seq_snapshot = 0
+        # Sem o coletor de lixo, carregar milhões de objetos é bem mais rápido
+        gc.disable()
+        try:
+            if os.path.exists(self.caminho_snapshot):
+                with open(self.caminho_snapshot, mode="rb") as file:
+                    seq_snapshot, estado = pickle.load(file)
+            self._seq = seq_snapshot
+            operacoes, fim = self._ler_journal(seq_snapshot)
+        finally:
+            gc.enable()
+        if os.path.exists(self.caminho_journal) and os.path.getsize(self.caminho_journal) > fim:
+            # Descarta o registro incompleto do fim
+            with open(self.caminho_journal, mode="r+b") as file:
+                file.truncate(fim)
+        self._registros = len(operacoes)
+        self._file = open(self.caminho_journal, mode="ab")
+        return estado, operacoes
+
+    # Acrescenta uma operação ao journal. Deve ser chamado na mesma ordem em
+    # que as operações são aplicadas (com a trava do app). `estado()` devolve
+    # uma cópia do estado atual e só é chamado quando é hora de um snapshot,
+    # na thread do snapshot e com a trava do app.
+    def registrar(self, operacao, estado):
+        with self._lock:
+            self._seq += 1
+            dados = pickle.dumps((self._seq, operacao), protocol=5)
+            self._file.write(CABECALHO.pack(len(dados), zlib.crc32(dados)) + dados)
+            self._file.flush()
+            if self.sincronizar:
+                os.fsync(self._file.fileno())
+            self._registros += 1
+            if self._registros < self.limite or self._gravando:
+                return
+            self._gravando = True
+        threading.Thread(target=self._gravar_snapshot, args=(estado,), daemon=True).start()
+
+    def _gravar_snapshot(self, estado):
+        try:
+            with self.trava:
+                # Com a trava do app, a cópia e a posição do journal
+                # correspondem às mesmas operações
+                copia = estado()
+                with self._lock:
+                    seq = self._seq
+                    offset = self._file.tell()
+                    registros = self._registros
+            _gravar_atomico(self.caminho_snapshot, pickle.dumps((seq, copia), protocol=5))
+            with self._lock:
+                # Mantém no journal só o que chegou enquanto o snapshot era gravado
+                self._file.close()
+                try:
+                    with open(self.caminho_journal, mode="rb") as file:
+                        file.seek(offset)
+                        cauda = file.read()
+                    _gravar_atomico(self.caminho_journal, cauda)
+                    self._registros -= registros
+                finally:
+                    self._file = open(self.caminho_journal, mode="ab")
+        finally:
+            self._gravando = False
@@ -0,0 +1,55 @@
+import asyncio
+
+
+# Fila de escrita única (group commit).
+# As rotas enviam operações para a fila e aguardam o resultado; uma só tarefa
+# junta tudo o que chegou dentro de `janela` segundos (ou enquanto o lote
+# anterior ainda estava sendo gravado), aplica o lote com `aplicar_lote` numa
+# thread e responde a todas as requisições de uma vez.
+class EscritorLote:
+    def __init__(self, aplicar_lote, janela=0.002, tamanho_maximo=1000):
+        self.aplicar_lote = aplicar_lote
+        self.janela = janela
+        self.tamanho_maximo = tamanho_maximo
+        self._fila = None
+        self._tarefa = None
+        self._loop = None
+
+    # A tarefa é criada no primeiro uso, dentro do loop que está rodando a app
+    def _iniciar(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._tarefa.done():
+            self._loop = loop
+            self._fila = asyncio.Queue()
+            self._tarefa = loop.create_task(self._executar())
+
+    # Envia uma operação e espera o lote em que ela entrou ser gravado
+    async def enviar(self, operacao):
+        self._iniciar()
+        futuro = self._loop.create_future()
+        await self._fila.put((operacao, futuro))
+        return await futuro
+
+    async def _executar(self):
+        while True:
+            lote = [await self._fila.get()]
+            if self.janela:
+                await asyncio.sleep(self.janela)
+            while len(lote) < self.tamanho_maximo and not self._fila.empty():
+                lote.append(self._fila.get_nowait())
+
+            try:
+                resultados = await asyncio.to_thread(
+                    self.aplicar_lote, [operacao for operacao, _ in lote]
+                )
+            except Exception as erro:
+                resultados = [erro] * len(lote)
+
+            for (_, futuro), resultado in zip(lote, resultados):
+                # A requisição pode ter sido cancelada enquanto esperava
+                if futuro.done():
+                    continue
+                if isinstance(resultado, Exception):
+                    futuro.set_exception(resultado)
+                else:
+                    futuro.set_result(resultado)
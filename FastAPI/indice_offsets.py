@@ -0,0 +1,185 @@
+import csv
+import mmap
+import os
+import struct
+import tempfile
+import threading
+
+# Cabeçalho do arquivo de índice: assinatura, inode do CSV, quantos bytes do
+# CSV o índice cobre, mtime do CSV naquele momento e número de entradas
+CABECALHO = struct.Struct("<8sQQqQ")
+MAGICO = b"PRODIDX1"
+
+# Cada entrada: id, offset e tamanho da linha no CSV (ordenadas pelo id)
+ENTRADA = struct.Struct("<qQI")
+
+
+# Percorre o CSV (aberto em modo binário) a partir de `inicio`, devolvendo
+# (offset, bytes) de cada registro completo. Um registro pode ocupar mais de
+# uma linha se tiver um campo entre aspas com quebra de linha.
+def ler_registros(file, inicio=0):
+    file.seek(inicio)
+    offset = inicio
+    inicio_registro = inicio
+    pendente = b""
+    for linha in file:
+        if not pendente:
+            inicio_registro = offset
+        pendente += linha
+        offset += len(linha)
+        if pendente.count(b'"') % 2 == 0:
+            # Última linha sem quebra: ainda está sendo escrita
+            if not pendente.endswith(b"\n"):
+                return
+            yield inicio_registro, pendente
+            pendente = b""
+
+
+def decodificar_registro(dados):
+    return next(csv.reader([dados.decode("utf-8")]))
+
+
+# Lê os registros a partir de `inicio` e devolve {id: (offset, tamanho)},
+# com None para os ids removidos, e até onde o arquivo foi lido
+def mapear_registros(file, inicio=0):
+    posicoes = {}
+    fim = inicio
+    registros = ler_registros(file, inicio)
+    if inicio == 0:
+        primeiro = next(registros, None)  # cabeçalho
+        if primeiro is not None:
+            fim = primeiro[0] + len(primeiro[1])
+    for offset, dados in registros:
+        row = decodificar_registro(dados)
+        id = int(row[0])
+        # Linha de remoção: só o id preenchido
+        posicoes[id] = None if row[2] == "" else (offset, len(dados))
+        fim = offset + len(dados)
+    return posicoes, fim
+
+
+# Índice em disco (`<csv>.idx`) que leva o id de um produto à posição da
+# sua linha no CSV. As entradas ficam num array ordenado, lido via mmap com
+# busca binária, então vários processos podem consultar o mesmo índice sem
+# carregar o catálogo em memória.
+#
+# O índice guarda o inode, o tamanho e o mtime do CSV que ele cobre:
+#   - inode diferente ou arquivo menor: o CSV foi regravado, reconstrói
+#   - arquivo maior: linhas foram acrescentadas (modo append); só a cauda é
+#     lida e mantida num dicionário até ficar grande o bastante para
+#     compensar reconstruir o índice
+class IndiceOffsets:
+    def __init__(self, caminho_csv, limite_cauda=1_000_000):
+        self.caminho_csv = caminho_csv
+        self.caminho = caminho_csv + ".idx"
+        self.limite_cauda = limite_cauda
+        self._mmap = None
+        self._quantidade = 0
+        self._coberto = None
+        self._cauda = {}
+        self._cauda_ate = 0
+        self._arquivo_csv = None
+        self._inode_csv = None
+        self._lock = threading.Lock()
+
+    def _construir(self, file, info):
+        posicoes, fim = mapear_registros(file)
+        entradas = sorted(
+            (id, posicao) for id, posicao in posicoes.items() if posicao is not None
+        )
+        pasta = os.path.dirname(os.path.abspath(self.caminho))
+        fd, temporario = tempfile.mkstemp(dir=pasta, suffix=".tmp")
+        try:
+            with os.fdopen(fd, mode="wb") as saida:
+                saida.write(CABECALHO.pack(MAGICO, info.st_ino, fim, info.st_mtime_ns, len(entradas)))
+                for id, (offset, tamanho) in entradas:
+                    saida.write(ENTRADA.pack(id, offset, tamanho))
+            os.replace(temporario, self.caminho)
+        except BaseException:
+            os.remove(temporario)
+            raise
+        self._abrir()
+
+    def _abrir(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        self._coberto = None
+        with open(self.caminho, mode="rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magico, inode, coberto, mtime, quantidade = CABECALHO.unpack_from(self._mmap, 0)
+        if magico != MAGICO:
+            raise ValueError(f"Índice inválido: {self.caminho}")
+        self._quantidade = quantidade
+        self._coberto = (inode, coberto, mtime)
+        self._cauda = {}
+        self._cauda_ate = coberto
+
+    # Garante que o índice corresponde ao CSV atual, reconstruindo ou lendo
+    # a cauda conforme o caso
+    def atualizar(self):
+        with self._lock:
+            if not os.path.exists(self.caminho_csv):
+                self._cauda = {}
+                self._quantidade = 0
+                return
+            if self._coberto is None and os.path.exists(self.caminho):
+                try:
+                    self._abrir()
+                except (ValueError, struct.error):
+                    pass
+            # O arquivo aberto garante que o inode consultado é o mesmo lido
+            with open(self.caminho_csv, mode="rb") as file:
+                info = os.fstat(file.fileno())
+                if not self._valido(info):
+                    self._construir(file, info)
+                elif info.st_size > self._cauda_ate:
+                    cauda, fim = mapear_registros(file, self._cauda_ate)
+                    self._cauda.update(cauda)
+                    self._cauda_ate = fim
+                    if fim - self._coberto[1] > self.limite_cauda:
+                        self._construir(file, info)
+                if self._inode_csv != info.st_ino:
+                    if self._arquivo_csv is not None:
+                        self._arquivo_csv.close()
+                    self._arquivo_csv = os.fdopen(os.dup(file.fileno()), mode="rb")
+                    self._inode_csv = info.st_ino
+
+    def _valido(self, info):
+        if self._coberto is None:
+            return False
+        inode, coberto, mtime = self._coberto
+        if info.st_ino != inode or info.st_size < coberto:
+            return False
+        if info.st_size == coberto and info.st_mtime_ns != mtime:
+            return False
+        return True
+
+    def _buscar_posicao(self, id):
+        if id in self._cauda:
+            return self._cauda[id]
+        inicio, fim = 0, self._quantidade
+        while inicio < fim:
+            meio = (inicio + fim) // 2
+            atual, offset, tamanho = ENTRADA.unpack_from(
+                self._mmap, CABECALHO.size + meio * ENTRADA.size
+            )
+            if atual == id:
+                return offset, tamanho
+            if atual < id:
+                inicio = meio + 1
+            else:
+                fim = meio
+        return None
+
+    # Lê só a linha do produto no CSV; devolve os campos ou None
+    def buscar(self, id):
+        self.atualizar()
+        with self._lock:
+            posicao = self._buscar_posicao(id)
+            if posicao is None:
+                return None
+            offset, tamanho = posicao
+            self._arquivo_csv.seek(offset)
+            dados = self._arquivo_csv.read(tamanho)
+        return decodificar_registro(dados)
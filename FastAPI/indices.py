@@ -0,0 +1,196 @@
+import bisect
+import heapq
+import threading
+import unicodedata
+
+ORDENACOES = ("id", "preco", "-preco", "nome", "-nome")
+# Maior que qualquer caractere de um nome: limite superior da faixa de um prefixo
+FIM_PREFIXO = "\U0010ffff"
+
+
+# Forma usada nas buscas por nome: sem maiúsculas e sem acentos
+def normalizar(texto):
+    decomposto = unicodedata.normalize("NFKD", texto.casefold())
+    return "".join(c for c in decomposto if not unicodedata.combining(c))
+
+
+def _trigramas(texto):
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+
+# Ordena os ids pela chave pedida e aplica o limite; com limite, usa um heap
+# em vez de ordenar todos os candidatos
+def _ordenar(ids, ordenar, chave_preco, chave_nome, limit):
+    campo = ordenar.lstrip("-")
+    if campo == "preco":
+        chave = lambda id: (chave_preco(id), id)
+    elif campo == "nome":
+        chave = lambda id: (chave_nome(id), id)
+    else:
+        chave = None
+    decrescente = ordenar.startswith("-")
+    if limit is None:
+        return sorted(ids, key=chave, reverse=decrescente)
+    if decrescente:
+        return heapq.nlargest(limit, ids, key=chave)
+    return heapq.nsmallest(limit, ids, key=chave)
+
+
+# Busca sem índices: percorre os produtos e filtra um a um. É o que os
+# backends sem índices em memória usam.
+def buscar_sequencial(
+    produtos, nome_prefixo=None, nome_contem=None, preco_min=None, preco_max=None, ordenar="id", limit=None
+):
+    prefixo = normalizar(nome_prefixo) if nome_prefixo else None
+    contem = normalizar(nome_contem) if nome_contem else None
+    encontrados = {}
+    for produto in produtos:
+        if preco_min is not None and produto.preco < preco_min:
+            continue
+        if preco_max is not None and produto.preco > preco_max:
+            continue
+        if prefixo is not None or contem is not None:
+            nome = normalizar(produto.nome)
+            if prefixo is not None and not nome.startswith(prefixo):
+                continue
+            if contem is not None and contem not in nome:
+                continue
+        encontrados[produto.id] = produto
+    ids = _ordenar(
+        encontrados,
+        ordenar,
+        lambda id: encontrados[id].preco,
+        lambda id: normalizar(encontrados[id].nome),
+        limit,
+    )
+    return [encontrados[id] for id in ids]
+
+
+# Índices secundários dos produtos, mantidos como observador do repositório
+# (`carregar` a cada carga completa, `registrar` a cada mudança):
+#   - (preco, id) numa lista ordenada, para faixas de preço com bisect
+#   - (nome normalizado, id) numa lista ordenada, para prefixos de nome
+#   - trigramas do nome -> ids, para "nome contém"; só é montado na primeira
+#     busca por substring e a partir daí acompanha as mudanças
+class IndicesProdutos:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.carregar({})
+
+    def carregar(self, produtos):
+        with self._lock:
+            self._precos = {id: produto.preco for id, produto in produtos.items()}
+            self._nomes = {id: normalizar(produto.nome) for id, produto in produtos.items()}
+            self._por_preco = sorted((preco, id) for id, preco in self._precos.items())
+            self._por_nome = sorted((nome, id) for id, nome in self._nomes.items())
+            self._trigramas = None
+
+    def _montar_trigramas(self):
+        self._trigramas = {}
+        for id, nome in self._nomes.items():
+            for trigrama in _trigramas(nome):
+                self._trigramas.setdefault(trigrama, set()).add(id)
+
+    def _inserir(self, produto):
+        nome = normalizar(produto.nome)
+        self._precos[produto.id] = produto.preco
+        self._nomes[produto.id] = nome
+        bisect.insort(self._por_preco, (produto.preco, produto.id))
+        bisect.insort(self._por_nome, (nome, produto.id))
+        if self._trigramas is not None:
+            for trigrama in _trigramas(nome):
+                self._trigramas.setdefault(trigrama, set()).add(produto.id)
+
+    def _retirar(self, id):
+        preco = self._precos.pop(id)
+        nome = self._nomes.pop(id)
+        del self._por_preco[bisect.bisect_left(self._por_preco, (preco, id))]
+        del self._por_nome[bisect.bisect_left(self._por_nome, (nome, id))]
+        if self._trigramas is not None:
+            for trigrama in _trigramas(nome):
+                ids = self._trigramas[trigrama]
+                ids.discard(id)
+                if not ids:
+                    del self._trigramas[trigrama]
+
+    # anterior=None: produto criado; atual=None: produto removido
+    def registrar(self, anterior, atual):
+        with self._lock:
+            if anterior is not None and atual is not None:
+                if anterior.preco == atual.preco and anterior.nome == atual.nome:
+                    return
+            if anterior is not None:
+                self._retirar(anterior.id)
+            if atual is not None:
+                self._inserir(atual)
+
+    def _faixa_preco(self, preco_min, preco_max):
+        inicio = 0 if preco_min is None else bisect.bisect_left(self._por_preco, (preco_min, float("-inf")))
+        fim = (
+            len(self._por_preco)
+            if preco_max is None
+            else bisect.bisect_right(self._por_preco, (preco_max, float("inf")))
+        )
+        return [id for _, id in self._por_preco[inicio:fim]]
+
+    def _prefixo(self, prefixo):
+        inicio = bisect.bisect_left(self._por_nome, (prefixo,))
+        fim = bisect.bisect_left(self._por_nome, (prefixo + FIM_PREFIXO,))
+        return [id for _, id in self._por_nome[inicio:fim]]
+
+    def _contem(self, trecho, candidatos):
+        if len(trecho) < 3:
+            # Curto demais para trigramas: confere os nomes um a um
+            ids = self._nomes if candidatos is None else candidatos
+            return [id for id in ids if trecho in self._nomes[id]]
+        if self._trigramas is None:
+            self._montar_trigramas()
+        conjuntos = sorted(
+            (self._trigramas.get(trigrama, set()) for trigrama in _trigramas(trecho)), key=len
+        )
+        ids = set.intersection(*conjuntos)
+        if candidatos is not None:
+            ids &= candidatos
+        # Os trigramas só dizem que o trecho pode estar no nome
+        return [id for id in ids if trecho in self._nomes[id]]
+
+    # Ids dos produtos que atendem a todos os filtros, na ordem pedida
+    def buscar(self, nome_prefixo=None, nome_contem=None, preco_min=None, preco_max=None, ordenar="id", limit=None):
+        if ordenar not in ORDENACOES:
+            raise ValueError(f"Ordenação inválida: {ordenar}")
+        with self._lock:
+            # Cada filtro usa o seu índice; a lista de um filtro já vem na
+            # ordem de preço (faixa de preço) ou de nome (prefixo)
+            listas = []
+            if preco_min is not None or preco_max is not None:
+                listas.append(("preco", self._faixa_preco(preco_min, preco_max)))
+            if nome_prefixo:
+                listas.append(("nome", self._prefixo(normalizar(nome_prefixo))))
+
+            candidatos = None
+            for _, ids in listas:
+                candidatos = set(ids) if candidatos is None else candidatos & set(ids)
+            if nome_contem:
+                candidatos = set(self._contem(normalizar(nome_contem), candidatos))
+                listas.append((None, None))
+
+            campo = ordenar.lstrip("-")
+            if len(listas) == 1 and listas[0][0] == campo:
+                # Um filtro só, já na ordem pedida: basta fatiar
+                ids = listas[0][1]
+                if ordenar.startswith("-"):
+                    ids = ids[::-1]
+                return ids if limit is None else ids[:limit]
+            if not listas:
+                if campo == "preco":
+                    ids = [id for _, id in self._por_preco]
+                elif campo == "nome":
+                    ids = [id for _, id in self._por_nome]
+                else:
+                    ids = None
+                if ids is not None:
+                    if ordenar.startswith("-"):
+                        ids = ids[::-1]
+                    return ids if limit is None else ids[:limit]
+                candidatos = self._precos.keys()
+            return _ordenar(candidatos, ordenar, self._precos.__getitem__, self._nomes.__getitem__, limit)
@@ -0,0 +1,104 @@
+import asyncio
+import json
+
+from fastapi import HTTPException, Request
+from pydantic import TypeAdapter, ValidationError
+from repositorio import LoteRejeitado, ProdutoJaExiste, ProdutoNaoEncontrado
+
+# Corpo das rotas /produtos/bulk: um array JSON ou NDJSON (um item por linha,
+# com Content-Type application/x-ndjson). O NDJSON é lido e validado à medida
+# que chega, sem guardar o corpo inteiro.
+
+
+def _eh_ndjson(request: Request):
+    tipo = request.headers.get("content-type", "")
+    return "ndjson" in tipo or "jsonl" in tipo
+
+
+async def _linhas(request: Request):
+    resto = b""
+    async for pedaco in request.stream():
+        resto += pedaco
+        *linhas, resto = resto.split(b"\n")
+        for linha in linhas:
+            yield linha
+    yield resto
+
+
+async def _ler_itens(request: Request, validar_array, validar_linha):
+    if not _eh_ndjson(request):
+        try:
+            return validar_array(await request.body())
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail=json.loads(e.json(include_url=False)))
+    itens = []
+    numero = 0
+    async for linha in _linhas(request):
+        numero += 1
+        if not linha.strip():
+            continue
+        try:
+            itens.append(validar_linha(linha))
+        except (ValidationError, ValueError) as e:
+            raise HTTPException(status_code=422, detail=f"Linha {numero} inválida: {e}")
+    return itens
+
+
+# Produtos completos (POST e PUT)
+async def ler_produtos(request: Request, Produto):
+    adaptador = TypeAdapter(list[Produto])
+    return await _ler_itens(request, adaptador.validate_json, Produto.model_validate_json)
+
+
+# Ids a remover (DELETE): cada item é um id ou um objeto com "id"
+async def ler_ids(request: Request):
+    def id_do_item(item):
+        if isinstance(item, dict):
+            item = item.get("id")
+        if not isinstance(item, int) or isinstance(item, bool):
+            raise ValueError(f"id inválido: {item!r}")
+        return item
+
+    def validar_array(corpo):
+        try:
+            itens = json.loads(corpo)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=f"JSON inválido: {e}")
+        if not isinstance(itens, list):
+            raise HTTPException(status_code=422, detail="Esperado um array de ids")
+        try:
+            return [id_do_item(item) for item in itens]
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+
+    return await _ler_itens(request, validar_array, lambda linha: id_do_item(json.loads(linha)))
+
+
+def verificar_duplicados(ids):
+    vistos = set()
+    duplicados = set()
+    for id in ids:
+        if id in vistos:
+            duplicados.add(id)
+        vistos.add(id)
+    if duplicados:
+        raise HTTPException(
+            status_code=400, detail={"mensagem": "IDs repetidos no lote", "ids": sorted(duplicados)}
+        )
+
+
+# Aplica o lote inteiro numa única gravação; se alguma operação falhar,
+# nada é gravado e a resposta lista os ids problemáticos
+async def aplicar_lote_atomico(repositorio, operacoes):
+    if not operacoes:
+        return
+    try:
+        await asyncio.to_thread(repositorio.aplicar_lote, operacoes, True)
+    except LoteRejeitado as e:
+        existentes = [erro.args[0] for erro in e.erros if isinstance(erro, ProdutoJaExiste)]
+        if existentes:
+            raise HTTPException(status_code=400, detail={"mensagem": "ID já existe", "ids": existentes})
+        ausentes = [erro.args[0] for erro in e.erros if isinstance(erro, ProdutoNaoEncontrado)]
+        if ausentes:
+            raise HTTPException(status_code=404, detail={"mensagem": "Produto não encontrado", "ids": ausentes})
+        raise HTTPException(status_code=400, detail=[str(erro) for erro in e.erros])
@@ -1,6 +1,9 @@
 from typing import Union
 from fastapi import FastAPI
 from pydantic import BaseModel
+from diario import Diario
+import threading
+import os
 
 # Cria uma instância da aplicação FastAPI
 app = FastAPI()
@@ -14,6 +17,20 @@ class Item(BaseModel):
 # Dicionário para armazenar os itens, com o item_id como chave e o Item como valor
 items_db = {}
 
+# Trava que mantém as mudanças (e a ordem delas no journal) uma de cada vez
+trava = threading.Lock()
+
+# Persistência opcional: com ITENS_DIARIO=<caminho>, cada mudança vai para um journal
+# e, de tempos em tempos, um snapshot do dicionário é gravado (ver diario.py)
+diario = Diario(os.environ["ITENS_DIARIO"], trava) if os.environ.get("ITENS_DIARIO") else None
+
+# Na inicialização, carrega o último snapshot e reaplica as mudanças do journal
+if diario is not None:
+    estado, operacoes = diario.carregar()
+    items_db.update(estado or {})
+    for item_id, item in operacoes:  # Cada operação é (item_id, item)
+        items_db[item_id] = item
+
 # Endpoint raiz que retorna uma mensagem de boas-vindas
 @app.get("/")
 def read_root():
@@ -31,7 +48,11 @@ def le_item(item_id: int):
 # Endpoint para atualizar os dados de um item específico, baseado no item_id
 @app.put("/itens/{item_id}")
 def atualiza_item(item_id: int, item: Item):
-    # Atualiza o item no dicionário items_db com o item_id fornecido
-    items_db[item_id] = item
+    with trava:
+        # Atualiza o item no dicionário items_db com o item_id fornecido
+        items_db[item_id] = item
+        # Grava a mudança no journal (o snapshot recebe uma cópia do dicionário)
+        if diario is not None:
+            diario.registrar((item_id, item), lambda: dict(items_db))
     # Retorna uma mensagem de sucesso e os dados do item atualizado
     return {"mensagem": "Item atualizado com sucesso", "item": items_db[item_id]}
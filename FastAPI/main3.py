@@ -1,7 +1,12 @@
-from typing import Union, List
+from typing import Union, List, Dict, Tuple, Optional
 from http import HTTPStatus
+import bisect
+import heapq
+import threading
+import os
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
+from diario import Diario
 
 # Cria uma instância da aplicação FastAPI
 app = FastAPI()
@@ -16,6 +21,66 @@ class Item(BaseModel):
 # Lista para armazenar os itens, onde cada item é uma instância da classe Item
 itens: List[Item] = []
 
+# Índice de hash: id do item -> posição do item na lista de itens
+indice_ids: Dict[int, int] = {}
+
+# Índices ordenados por valor, um para cada valor de is_oferta (True, False ou None),
+# com tuplas (valor, id) para achar uma faixa de valores com busca binária
+indice_valor: Dict[Union[bool, None], List[Tuple[float, int]]] = {True: [], False: [], None: []}
+
+# Inclui um item no índice de valor
+def indexar_valor(item: Item):
+    bisect.insort(indice_valor[item.is_oferta], (item.valor, item.id))  # Insere mantendo a ordem
+
+# Retira um item do índice de valor
+def desindexar_valor(item: Item):
+    lista = indice_valor[item.is_oferta]  # Lista ordenada onde o item está
+    del lista[bisect.bisect_left(lista, (item.valor, item.id))]  # Remove a tupla do item
+
+# Inclui um item novo na lista e nos índices
+def inserir_item(item: Item):
+    itens.append(item)  # Adiciona o novo item à lista de itens
+    indice_ids[item.id] = len(itens) - 1  # Guarda a posição do item no índice de ids
+    indexar_valor(item)  # Inclui o item no índice de valor
+
+# Troca um item existente (com o mesmo id) na lista e nos índices
+def substituir_item(item: Item):
+    indice = indice_ids[item.id]  # Posição do item na lista
+    desindexar_valor(itens[indice])  # Tira a entrada antiga do índice de valor
+    indexar_valor(item)  # Inclui a entrada nova
+    itens[indice] = item  # Substitui o item existente pelo item atualizado
+
+# Trava que mantém as mudanças (e a ordem delas no journal) uma de cada vez
+trava = threading.Lock()
+
+# Persistência opcional: com ITENS_DIARIO=<caminho>, cada mudança vai para um journal
+# e, de tempos em tempos, um snapshot dos itens é gravado (ver diario.py)
+diario = Diario(os.environ["ITENS_DIARIO"], trava) if os.environ.get("ITENS_DIARIO") else None
+
+# Cópia do estado gravada no snapshot: a lista de itens e os índices de valor já
+# ordenados. Feita na thread do snapshot, com a trava (ver diario.py)
+def estado_atual():
+    return {"itens": list(itens), "indice_valor": {k: list(v) for k, v in indice_valor.items()}}
+
+# Na inicialização, carrega o último snapshot e reaplica as mudanças do journal
+if diario is not None:
+    estado, operacoes = diario.carregar()
+    if estado is not None:
+        itens.extend(estado["itens"])  # Itens do snapshot
+        indice_ids.update((item.id, indice) for indice, item in enumerate(itens))  # Refaz o índice de ids
+        indice_valor.update(estado["indice_valor"])  # Índices de valor já vêm ordenados
+    # Cada operação do journal é ("criar", item) ou ("atualizar", item)
+    for tipo, item in operacoes:
+        if tipo == "criar":
+            inserir_item(item)
+        else:
+            substituir_item(item)
+
+# Registra uma mudança já aplicada no journal (se a persistência estiver ligada)
+def registrar(tipo: str, item: Item):
+    if diario is not None:
+        diario.registrar((tipo, item), estado_atual)
+
 # Endpoint raiz que retorna uma mensagem de boas-vindas
 @app.get("/")
 def padrao():
@@ -25,41 +90,57 @@ def padrao():
 # Endpoint para ler os dados de um item específico, com base no item_id
 @app.get("/itens/{item_id}", response_model=Item)
 def ler_item(item_id: int):
-    # Itera sobre a lista de itens para encontrar o item com o ID especificado
-    for indice, item_atual in enumerate(itens):
-        if item_atual.id == item_id:
-            return item_atual  # Retorna o item encontrado
+    # Procura a posição do item no índice de ids
+    if item_id in indice_ids:
+        return itens[indice_ids[item_id]]  # Retorna o item encontrado
     # Lança uma exceção se o item não for encontrado, com status 404
     raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="Item não encontrado.")
 
-# Endpoint para listar todos os itens
+# Endpoint para listar os itens, opcionalmente filtrados por faixa de valor e por is_oferta
+@app.get("/itens", response_model=List[Item])
 @app.get("/itens/", response_model=List[Item])
-def listar_itens():
-    # Retorna a lista de todos os itens armazenados
-    return itens
+def listar_itens(
+    valor_min: Optional[float] = None,   # Valor mínimo (inclusive)
+    valor_max: Optional[float] = None,   # Valor máximo (inclusive)
+    is_oferta: Optional[bool] = None,    # Só itens em oferta (true) ou fora de oferta (false)
+):
+    # Sem filtros, retorna a lista de todos os itens armazenados
+    if valor_min is None and valor_max is None and is_oferta is None:
+        return itens
+    # Com is_oferta, só o índice daquele valor é consultado; sem ele, todos os índices
+    listas = [indice_valor[is_oferta]] if is_oferta is not None else list(indice_valor.values())
+    faixas = []
+    for lista in listas:
+        # Busca binária pelas pontas da faixa de valores
+        inicio = 0 if valor_min is None else bisect.bisect_left(lista, (valor_min, float("-inf")))
+        fim = len(lista) if valor_max is None else bisect.bisect_right(lista, (valor_max, float("inf")))
+        faixas.append(lista[inicio:fim])
+    # Junta as faixas em ordem de valor e retorna os itens correspondentes
+    return [itens[indice_ids[item_id]] for _, item_id in heapq.merge(*faixas)]
 
 # Endpoint para adicionar um novo item à lista
 @app.post("/itens/", response_model=Item, status_code=HTTPStatus.CREATED)
 def adicionar_item(item: Item):
-    # Verifica se já existe um item com o mesmo ID
-    if any(item_atual.id == item.id for item_atual in itens):
-        # Lança uma exceção com status 400 se o ID já existe
-        raise HTTPException(status_code=400, detail="ID já existe.")
-    # Adiciona o novo item à lista de itens
-    itens.append(item)
+    with trava:
+        # Verifica no índice de ids se já existe um item com o mesmo ID
+        if item.id in indice_ids:
+            # Lança uma exceção com status 400 se o ID já existe
+            raise HTTPException(status_code=400, detail="ID já existe.")
+        inserir_item(item)  # Adiciona o novo item à lista e aos índices
+        registrar("criar", item)  # Grava a mudança no journal
     return item  # Retorna o item adicionado
 
 # Endpoint para atualizar os dados de um item específico, com base no item_id
 @app.put("/itens/{item_id}", response_model=Item)
 def atualizar_item(item_id: int, item_atualizado: Item):
-    # Itera sobre a lista de itens para encontrar o item com o ID especificado
-    for indice, item_atual in enumerate(itens):
-        if item_atual.id == item_id:
+    with trava:
+        # Procura o item no índice de ids
+        if item_id in indice_ids:
             # Garante que o ID do item atualizado permanece o mesmo
             if item_atualizado.id != item_id:
                 item_atualizado.id = item_id
-            # Substitui o item existente pelo item atualizado
-            itens[indice] = item_atualizado
+            substituir_item(item_atualizado)  # Substitui o item na lista e nos índices
+            registrar("atualizar", item_atualizado)  # Grava a mudança no journal
             return item_atualizado  # Retorna o item atualizado
     # Lança uma exceção se o item não for encontrado, com status 404
     raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="Item não encontrado.")
@@ -0,0 +1,337 @@
+import bisect
+import contextlib
+import os
+import threading
+from abc import ABC, abstractmethod
+
+from indices import IndicesProdutos, buscar_sequencial
+
+
+class ProdutoJaExiste(Exception):
+    pass
+
+
+class ProdutoNaoEncontrado(Exception):
+    pass
+
+
+# Lote atômico recusado: nenhuma operação foi aplicada. `erros` traz a
+# exceção de cada operação que falharia.
+class LoteRejeitado(Exception):
+    def __init__(self, erros):
+        super().__init__(erros)
+        self.erros = erros
+
+
+# Interface comum dos armazenamentos de produtos. As rotas só conhecem estes
+# métodos, então trocar o backend (memória, CSV, XML, SQLite, binário) não
+# exige mudar nenhum handler.
+#
+# As mudanças são sempre feitas em lote: `aplicar_lote` recebe operações
+# ("criar" | "atualizar" | "remover", id, produto) e devolve, para cada uma,
+# o produto resultante (None na remoção) ou a exceção que ela causou.
+# Com `atomico=True`, ou todas as operações são aplicadas ou nenhuma é, e as
+# falhas são levantadas juntas num LoteRejeitado.
+class RepositorioProdutos(ABC):
+    @abstractmethod
+    def obter(self, id):
+        pass
+
+    # Percorre os produtos em ordem de id. `after_id` funciona como cursor:
+    # começa no primeiro id maior que ele.
+    @abstractmethod
+    def iterar(self, after_id=None, offset=0, limit=None):
+        pass
+
+    @abstractmethod
+    def aplicar_lote(self, operacoes, atomico=False):
+        pass
+
+    # Confere um lote sem aplicá-lo, levando em conta o efeito das operações
+    # anteriores do próprio lote; `existe(id)` consulta o estado atual
+    @staticmethod
+    def _verificar_lote(operacoes, existe):
+        presentes = {}
+        erros = []
+        for tipo, id, produto in operacoes:
+            presente = presentes[id] if id in presentes else existe(id)
+            if tipo == "criar":
+                if presente:
+                    erros.append(ProdutoJaExiste(id))
+                    continue
+                presentes[id] = True
+            elif tipo in ("atualizar", "remover"):
+                if not presente:
+                    erros.append(ProdutoNaoEncontrado(id))
+                    continue
+                presentes[id] = tipo == "atualizar"
+            else:
+                raise ValueError(f"Operação inválida: {tipo}")
+        return erros
+
+    # Produtos filtrados por prefixo ou trecho do nome e por faixa de preço,
+    # ordenados por `ordenar` ("id", "preco", "-preco", "nome", "-nome").
+    # Sem índices, percorre todos os produtos.
+    def buscar(
+        self, nome_prefixo=None, nome_contem=None, preco_min=None, preco_max=None, ordenar="id", limit=None
+    ):
+        return buscar_sequencial(
+            self.iterar(), nome_prefixo, nome_contem, preco_min, preco_max, ordenar, limit
+        )
+
+    def listar(self):
+        return list(self.iterar())
+
+    def _aplicar(self, tipo, id, produto=None):
+        resultado = self.aplicar_lote([(tipo, id, produto)])[0]
+        if isinstance(resultado, Exception):
+            raise resultado
+        return resultado
+
+    def criar(self, produto):
+        return self._aplicar("criar", produto.id, produto)
+
+    def atualizar(self, id, produto):
+        return self._aplicar("atualizar", id, produto)
+
+    def remover(self, id):
+        self._aplicar("remover", id)
+
+
+# Produtos num dicionário {id: produto} com uma lista ordenada de ids ao lado.
+# Serve sozinho como backend em memória e como base dos backends que carregam
+# o arquivo inteiro (CSV, XML), que só precisam sobrescrever `produtos()`
+# para recarregar e `_persistir()` para gravar cada lote.
+class RepositorioMemoria(RepositorioProdutos):
+    def __init__(self, modelo):
+        self.modelo = modelo
+        self._produtos = {}
+        self._ids = []
+        self._lock = threading.RLock()
+        self._observadores = []
+        self._indices = None
+
+    # Estruturas derivadas (colunas, índices secundários...) que acompanham
+    # o catálogo: `carregar(produtos)` recebe o dicionário inteiro a cada
+    # carga e `registrar(anterior, atual)` recebe cada mudança
+    # (anterior=None na criação, atual=None na remoção)
+    def adicionar_observador(self, observador):
+        with self._lock:
+            self._observadores.append(observador)
+            observador.carregar(self._produtos)
+
+    def _notificar_carga(self):
+        for observador in self._observadores:
+            observador.carregar(self._produtos)
+
+    # Troca o catálogo inteiro em memória (depois de ler um arquivo, por exemplo)
+    def _substituir(self, produtos):
+        self._produtos = produtos
+        self._ids = sorted(produtos)
+        self._notificar_carga()
+
+    def produtos(self):
+        return self._produtos
+
+    def obter(self, id):
+        return self.produtos().get(id)
+
+    def iterar(self, after_id=None, offset=0, limit=None):
+        produtos = self.produtos()
+        # A lista de ids nunca é alterada no lugar, então esta referência
+        # continua válida mesmo que outro lote seja gravado durante a iteração
+        ids = self._ids
+        inicio = 0 if after_id is None else bisect.bisect_right(ids, after_id)
+        inicio += offset
+        fim = len(ids) if limit is None else min(len(ids), inicio + limit)
+        for i in range(inicio, fim):
+            produto = produtos.get(ids[i])
+            if produto is not None:
+                yield produto
+
+    # Atualiza a lista ordenada de ids depois de um lote de mudanças
+    # (anterior, atual). A lista é copiada, nunca alterada no lugar.
+    def _atualizar_ids(self, mudancas):
+        if len(mudancas) > 64:
+            self._ids = sorted(self._produtos)
+            return
+        ids = self._ids[:]
+        for anterior, atual in mudancas:
+            if anterior is None:
+                bisect.insort(ids, atual.id)
+            elif atual is None:
+                del ids[bisect.bisect_left(ids, anterior.id)]
+        self._ids = ids
+
+    # Grava no disco um lote de mudanças (anterior, atual) já aplicado
+    # ao dicionário; em memória não há nada a fazer
+    def _persistir(self, mudancas):
+        pass
+
+    # Trecho que altera os dados; os backends ligados a arquivos também
+    # seguram a trava entre processos (ver RepositorioArquivo)
+    def _escrita(self, publicar=True):
+        return self._lock
+
+    def aplicar_lote(self, operacoes, atomico=False):
+        with self._escrita():
+            produtos = self.produtos()
+            if atomico:
+                erros = self._verificar_lote(operacoes, produtos.__contains__)
+                if erros:
+                    raise LoteRejeitado(erros)
+            resultados = []
+            mudancas = []  # (anterior, atual) de cada operação aplicada
+            for tipo, id, produto in operacoes:
+                anterior = produtos.get(id)
+                if tipo == "criar":
+                    if anterior is not None:
+                        resultados.append(ProdutoJaExiste(id))
+                        continue
+                    produtos[id] = produto
+                elif tipo == "atualizar":
+                    if anterior is None:
+                        resultados.append(ProdutoNaoEncontrado(id))
+                        continue
+                    # O id do produto atualizado permanece o mesmo da rota
+                    if produto.id != id:
+                        produto = produto.model_copy(update={"id": id})
+                    produtos[id] = produto
+                elif tipo == "remover":
+                    if anterior is None:
+                        resultados.append(ProdutoNaoEncontrado(id))
+                        continue
+                    del produtos[id]
+                    produto = None
+                else:
+                    raise ValueError(f"Operação inválida: {tipo}")
+                mudancas.append((anterior, produto))
+                resultados.append(produto)
+            if mudancas:
+                self._atualizar_ids(mudancas)
+                for observador in self._observadores:
+                    for anterior, atual in mudancas:
+                        observador.registrar(anterior, atual)
+                self._persistir(mudancas)
+            return resultados
+
+    # Usa os índices secundários (ver indices.py), criados na primeira busca
+    # e, a partir daí, atualizados a cada lote como os demais observadores
+    def buscar(
+        self, nome_prefixo=None, nome_contem=None, preco_min=None, preco_max=None, ordenar="id", limit=None
+    ):
+        with self._lock:
+            produtos = self.produtos()
+            if self._indices is None:
+                self._indices = IndicesProdutos()
+                self.adicionar_observador(self._indices)
+            ids = self._indices.buscar(nome_prefixo, nome_contem, preco_min, preco_max, ordenar, limit)
+            return [produtos[id] for id in ids]
+
+
+# (mtime, tamanho) identificam a versão de um arquivo; None se ele não existe
+def assinatura_arquivo(caminho):
+    try:
+        info = os.stat(caminho)
+    except FileNotFoundError:
+        return None
+    return (info.st_mtime_ns, info.st_size)
+
+
+# Repositório em memória ligado a um arquivo: o arquivo inteiro é carregado
+# com `_carregar()` e só é lido de novo quando o mtime ou o tamanho mudam.
+#
+# Com `coerencia=True` (vários processos servindo o mesmo arquivo), a versão
+# dos dados passa a ser o contador de `coerencia.Coerencia`: toda escrita
+# segura o flock, recarrega o que outro processo gravou e incrementa o
+# contador; as leituras só comparam o contador, sem stat no arquivo.
+# Mudanças feitas no arquivo por fora do serviço não são percebidas.
+class RepositorioArquivo(RepositorioMemoria):
+    def __init__(self, caminho, modelo, coerencia=False):
+        super().__init__(modelo)
+        self.caminho = caminho
+        self._assinatura = None
+        self._coerencia = None
+        if coerencia:
+            from coerencia import Coerencia
+            self._coerencia = Coerencia(caminho + ".geracao")
+
+    def _assinatura_arquivo(self):
+        return assinatura_arquivo(self.caminho)
+
+    # Versão atual dos dados no disco, comparada com `_assinatura` (a versão
+    # que está em memória)
+    def _versao(self):
+        if self._coerencia is not None:
+            return self._coerencia.geracao()
+        return self._assinatura_arquivo()
+
+    @contextlib.contextmanager
+    def _escrita(self, publicar=True):
+        with self._lock:
+            if self._coerencia is None:
+                yield
+                return
+            with self._coerencia.travar():
+                # Parte do que os outros processos já gravaram
+                self.produtos()
+                try:
+                    yield
+                finally:
+                    if publicar:
+                        geracao = self._coerencia.incrementar()
+                        # Se a escrita falhou, `_assinatura` é None e a
+                        # próxima leitura recarrega do disco
+                        if self._assinatura is not None:
+                            self._assinatura = geracao
+
+    @abstractmethod
+    def _carregar(self):
+        pass
+
+    # Retorna o índice {id: produto}, recarregando o arquivo se ele mudou
+    def produtos(self):
+        if self._versao() != self._assinatura:
+            with self._lock:
+                # A assinatura é lida antes da carga: se o arquivo mudar
+                # durante a leitura, a próxima chamada carrega de novo
+                assinatura = self._versao()
+                if assinatura != self._assinatura:
+                    self._substituir(self._carregar())
+                    self._assinatura = assinatura
+        return self._produtos
+
+
+BACKENDS = ("memoria", "csv", "csv_shards", "xml", "sqlite", "binario")
+
+
+# Cria o repositório do backend escolhido; `caminho` é o arquivo de dados
+# (a pasta, no csv_shards), e cada backend tem um nome padrão.
+# `coerencia=True` é para vários processos servindo os mesmos dados: liga a
+# coerência entre processos nos backends de arquivo (o SQLite já coordena os
+# processos sozinho; memória e binário não podem ser compartilhados).
+# `opcoes` são os argumentos próprios dos backends CSV (modo, indice_offsets,
+# tamanho_faixa...), repassados ao construtor do armazenamento.
+def criar_repositorio(backend, modelo, caminho=None, coerencia=False, **opcoes):
+    if coerencia and backend in ("memoria", "binario"):
+        raise ValueError(f"O backend {backend} não pode ser compartilhado entre processos")
+    if opcoes and backend not in ("csv", "csv_shards"):
+        raise ValueError(f"O backend {backend} não aceita as opções: {', '.join(opcoes)}")
+    if backend == "memoria":
+        return RepositorioMemoria(modelo)
+    if backend == "csv":
+        from armazenamento_csv import ArmazenamentoCSV
+        return ArmazenamentoCSV(caminho or "database.csv", modelo, coerencia=coerencia, **opcoes)
+    if backend == "csv_shards":
+        from armazenamento_shards import ArmazenamentoShardsCSV
+        return ArmazenamentoShardsCSV(caminho or "database_shards", modelo, coerencia=coerencia, **opcoes)
+    if backend == "xml":
+        from repositorio_xml import RepositorioXML
+        return RepositorioXML(caminho or "database.xml", modelo, coerencia=coerencia)
+    if backend == "sqlite":
+        from repositorio_sqlite import RepositorioSQLite
+        return RepositorioSQLite(caminho or "database.db", modelo)
+    if backend == "binario":
+        from repositorio_binario import RepositorioBinario
+        return RepositorioBinario(caminho or "database.bin", modelo)
+    raise ValueError(f"Backend inválido: {backend} (use um de {', '.join(BACKENDS)})")
@@ -0,0 +1,155 @@
+import bisect
+import mmap
+import os
+import struct
+import threading
+
+from repositorio import LoteRejeitado, ProdutoJaExiste, ProdutoNaoEncontrado, RepositorioProdutos
+
+# Cabeçalho: (mágico, capacidade em slots)
+CABECALHO = struct.Struct("<8sQ")
+MAGICO = b"PRODBIN1"
+# Slot de tamanho fixo: (ocupado, id, nome em utf-8, preço, quantidade)
+SLOT = struct.Struct("<?q120sdq")
+TAMANHO_NOME = 120
+CAPACIDADE_INICIAL = 1024
+
+
+# Backend "binario": registros de tamanho fixo num arquivo mapeado em memória.
+# Cada produto ocupa um slot; atualizar ou remover grava só o slot dele, e a
+# posição de cada id fica num dicionário montado na abertura do arquivo.
+class RepositorioBinario(RepositorioProdutos):
+    def __init__(self, caminho, modelo):
+        self.caminho = caminho
+        self.modelo = modelo
+        self._lock = threading.Lock()
+        self._file = open(caminho, "r+b" if os.path.exists(caminho) else "w+b")
+        if os.fstat(self._file.fileno()).st_size == 0:
+            self._formatar(CAPACIDADE_INICIAL)
+        self._mapa = mmap.mmap(self._file.fileno(), 0)
+        magico, self._capacidade = CABECALHO.unpack_from(self._mapa, 0)
+        if magico != MAGICO:
+            raise ValueError(f"{caminho} não é um arquivo de produtos")
+
+        self._slots = {}  # id -> número do slot
+        self._livres = []
+        for slot in range(self._capacidade):
+            ocupado, id = struct.unpack_from("<?q", self._mapa, self._posicao(slot))
+            if ocupado:
+                self._slots[id] = slot
+            else:
+                self._livres.append(slot)
+        # Slots livres usados do menor para o maior
+        self._livres.reverse()
+        self._ids = sorted(self._slots)
+
+    def _formatar(self, capacidade):
+        self._file.truncate(CABECALHO.size + capacidade * SLOT.size)
+        self._file.seek(0)
+        self._file.write(CABECALHO.pack(MAGICO, capacidade))
+        self._file.flush()
+
+    def _posicao(self, slot):
+        return CABECALHO.size + slot * SLOT.size
+
+    # Dobra o arquivo; os slots novos (zerados) ficam livres
+    def _crescer(self):
+        nova = self._capacidade * 2
+        self._mapa.close()
+        self._formatar(nova)
+        self._mapa = mmap.mmap(self._file.fileno(), 0)
+        self._livres = list(range(nova - 1, self._capacidade - 1, -1)) + self._livres
+        self._capacidade = nova
+
+    def _ler(self, slot):
+        _, id, nome, preco, quantidade = SLOT.unpack_from(self._mapa, self._posicao(slot))
+        return self.modelo(
+            id=id,
+            nome=nome.rstrip(b"\x00").decode("utf-8"),
+            preco=preco,
+            quantidade=quantidade,
+        )
+
+    def _escrever(self, slot, produto):
+        SLOT.pack_into(
+            self._mapa,
+            self._posicao(slot),
+            True,
+            produto.id,
+            produto.nome.encode("utf-8"),
+            produto.preco,
+            produto.quantidade,
+        )
+
+    def obter(self, id):
+        with self._lock:
+            slot = self._slots.get(id)
+            return None if slot is None else self._ler(slot)
+
+    def iterar(self, after_id=None, offset=0, limit=None):
+        # Cópia-na-escrita: a lista de ids nunca é alterada no lugar
+        ids = self._ids
+        inicio = 0 if after_id is None else bisect.bisect_right(ids, after_id)
+        inicio += offset
+        fim = len(ids) if limit is None else min(len(ids), inicio + limit)
+        for i in range(inicio, fim):
+            produto = self.obter(ids[i])
+            if produto is not None:
+                yield produto
+
+    def _nome_invalido(self, produto):
+        if len(produto.nome.encode("utf-8")) > TAMANHO_NOME:
+            return ValueError(f"Nome com mais de {TAMANHO_NOME} bytes")
+        return None
+
+    def aplicar_lote(self, operacoes, atomico=False):
+        resultados = []
+        with self._lock:
+            if atomico:
+                erros = self._verificar_lote(operacoes, self._slots.__contains__)
+                erros += [
+                    erro for tipo, id, produto in operacoes
+                    if tipo in ("criar", "atualizar") and (erro := self._nome_invalido(produto))
+                ]
+                if erros:
+                    raise LoteRejeitado(erros)
+            ids = self._ids[:]
+            for tipo, id, produto in operacoes:
+                slot = self._slots.get(id)
+                if tipo in ("criar", "atualizar"):
+                    erro = self._nome_invalido(produto)
+                    if erro is not None:
+                        resultados.append(erro)
+                        continue
+                if tipo == "criar":
+                    if slot is not None:
+                        resultados.append(ProdutoJaExiste(id))
+                        continue
+                    if not self._livres:
+                        self._crescer()
+                    slot = self._livres.pop()
+                    self._slots[id] = slot
+                    bisect.insort(ids, id)
+                elif tipo == "atualizar":
+                    if slot is None:
+                        resultados.append(ProdutoNaoEncontrado(id))
+                        continue
+                    if produto.id != id:
+                        produto = produto.model_copy(update={"id": id})
+                elif tipo == "remover":
+                    if slot is None:
+                        resultados.append(ProdutoNaoEncontrado(id))
+                        continue
+                    struct.pack_into("<?", self._mapa, self._posicao(slot), False)
+                    del self._slots[id]
+                    self._livres.append(slot)
+                    del ids[bisect.bisect_left(ids, id)]
+                    resultados.append(None)
+                    continue
+                else:
+                    raise ValueError(f"Operação inválida: {tipo}")
+                self._escrever(slot, produto)
+                resultados.append(produto)
+            self._ids = ids
+            self._mapa.flush()
+        return resultados
@@ -0,0 +1,148 @@
+import sqlite3
+import threading
+
+from indices import ORDENACOES, normalizar
+from repositorio import LoteRejeitado, ProdutoJaExiste, ProdutoNaoEncontrado, RepositorioProdutos
+
+# Quantas linhas são lidas por consulta ao percorrer a tabela
+TAMANHO_PAGINA = 500
+
+ORDEM_SQL = {
+    "id": "id",
+    "preco": "preco, id",
+    "-preco": "preco DESC, id DESC",
+    "nome": "normalizar(nome), id",
+    "-nome": "normalizar(nome) DESC, id DESC",
+}
+
+
+# Escapa % e _ para usar o texto num LIKE ... ESCAPE '\'
+def _escapar_like(texto):
+    return texto.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+# Backend "sqlite": uma tabela com o id como chave primária. Buscas e páginas
+# usam o índice da chave; cada lote de mudanças é uma única transação.
+class RepositorioSQLite(RepositorioProdutos):
+    def __init__(self, caminho, modelo):
+        self.modelo = modelo
+        self._conexao = sqlite3.connect(caminho, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conexao:
+            self._conexao.execute("PRAGMA journal_mode=WAL")
+            self._conexao.execute(
+                "CREATE TABLE IF NOT EXISTS produtos ("
+                "id INTEGER PRIMARY KEY, nome TEXT NOT NULL, "
+                "preco REAL NOT NULL, quantidade INTEGER NOT NULL)"
+            )
+            self._conexao.execute("CREATE INDEX IF NOT EXISTS produtos_preco ON produtos (preco)")
+        # Mesma normalização de nomes dos índices em memória
+        self._conexao.create_function("normalizar", 1, normalizar, deterministic=True)
+
+    def _produto(self, row):
+        return self.modelo(id=row[0], nome=row[1], preco=row[2], quantidade=row[3])
+
+    def obter(self, id):
+        with self._lock:
+            row = self._conexao.execute(
+                "SELECT id, nome, preco, quantidade FROM produtos WHERE id = ?", (id,)
+            ).fetchone()
+        return None if row is None else self._produto(row)
+
+    # Lê a tabela em páginas pela chave, sem segurar o lock durante o streaming
+    def iterar(self, after_id=None, offset=0, limit=None):
+        restante = -1 if limit is None else limit
+        while restante != 0:
+            tamanho = TAMANHO_PAGINA if restante < 0 else min(restante, TAMANHO_PAGINA)
+            with self._lock:
+                if after_id is None:
+                    rows = self._conexao.execute(
+                        "SELECT id, nome, preco, quantidade FROM produtos "
+                        "ORDER BY id LIMIT ? OFFSET ?",
+                        (tamanho, offset),
+                    ).fetchall()
+                else:
+                    rows = self._conexao.execute(
+                        "SELECT id, nome, preco, quantidade FROM produtos "
+                        "WHERE id > ? ORDER BY id LIMIT ? OFFSET ?",
+                        (after_id, tamanho, offset),
+                    ).fetchall()
+            for row in rows:
+                yield self._produto(row)
+            if len(rows) < tamanho:
+                return
+            # Próximas páginas continuam a partir do último id lido
+            after_id = rows[-1][0]
+            offset = 0
+            if restante > 0:
+                restante -= len(rows)
+
+    # A faixa de preço usa o índice produtos_preco; os filtros de nome são
+    # conferidos linha a linha pelo LIKE sobre o nome normalizado
+    def buscar(
+        self, nome_prefixo=None, nome_contem=None, preco_min=None, preco_max=None, ordenar="id", limit=None
+    ):
+        if ordenar not in ORDENACOES:
+            raise ValueError(f"Ordenação inválida: {ordenar}")
+        condicoes = []
+        parametros = []
+        if preco_min is not None:
+            condicoes.append("preco >= ?")
+            parametros.append(preco_min)
+        if preco_max is not None:
+            condicoes.append("preco <= ?")
+            parametros.append(preco_max)
+        if nome_prefixo:
+            condicoes.append("normalizar(nome) LIKE ? ESCAPE '\\'")
+            parametros.append(_escapar_like(normalizar(nome_prefixo)) + "%")
+        if nome_contem:
+            condicoes.append("normalizar(nome) LIKE ? ESCAPE '\\'")
+            parametros.append("%" + _escapar_like(normalizar(nome_contem)) + "%")
+        sql = "SELECT id, nome, preco, quantidade FROM produtos"
+        if condicoes:
+            sql += " WHERE " + " AND ".join(condicoes)
+        sql += " ORDER BY " + ORDEM_SQL[ordenar]
+        if limit is not None:
+            sql += " LIMIT ?"
+            parametros.append(limit)
+        with self._lock:
+            rows = self._conexao.execute(sql, parametros).fetchall()
+        return [self._produto(row) for row in rows]
+
+    def aplicar_lote(self, operacoes, atomico=False):
+        resultados = []
+        with self._lock, self._conexao:
+            for tipo, id, produto in operacoes:
+                if tipo == "criar":
+                    try:
+                        self._conexao.execute(
+                            "INSERT INTO produtos (id, nome, preco, quantidade) VALUES (?, ?, ?, ?)",
+                            (id, produto.nome, produto.preco, produto.quantidade),
+                        )
+                    except sqlite3.IntegrityError:
+                        resultados.append(ProdutoJaExiste(id))
+                        continue
+                elif tipo == "atualizar":
+                    cursor = self._conexao.execute(
+                        "UPDATE produtos SET nome = ?, preco = ?, quantidade = ? WHERE id = ?",
+                        (produto.nome, produto.preco, produto.quantidade, id),
+                    )
+                    if cursor.rowcount == 0:
+                        resultados.append(ProdutoNaoEncontrado(id))
+                        continue
+                    if produto.id != id:
+                        produto = produto.model_copy(update={"id": id})
+                elif tipo == "remover":
+                    cursor = self._conexao.execute("DELETE FROM produtos WHERE id = ?", (id,))
+                    if cursor.rowcount == 0:
+                        resultados.append(ProdutoNaoEncontrado(id))
+                        continue
+                    produto = None
+                else:
+                    raise ValueError(f"Operação inválida: {tipo}")
+                resultados.append(produto)
+            erros = [r for r in resultados if isinstance(r, Exception)]
+            if atomico and erros:
+                # Sair do bloco com exceção desfaz a transação inteira
+                raise LoteRejeitado(erros)
+        return resultados
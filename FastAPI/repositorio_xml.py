@@ -0,0 +1,47 @@
+import os
+import tempfile
+import xml.etree.ElementTree as ET
+
+from repositorio import RepositorioArquivo
+
+
+# Backend "xml": o mesmo formato do database.xml da aula de XML
+# (<produtos><produto><id>...</id>...</produto></produtos>), carregado em
+# memória e regravado inteiro (temporário + rename) a cada lote
+class RepositorioXML(RepositorioArquivo):
+    def _carregar(self):
+        produtos = {}
+        if os.path.exists(self.caminho):
+            for _, elem in ET.iterparse(self.caminho):
+                if elem.tag == "produto":
+                    produto = self.modelo(
+                        id=int(elem.findtext("id")),
+                        nome=elem.findtext("nome"),
+                        preco=float(elem.findtext("preco")),
+                        quantidade=int(elem.findtext("quantidade")),
+                    )
+                    produtos[produto.id] = produto
+                    elem.clear()
+        return produtos
+
+    def _persistir(self, mudancas):
+        root = ET.Element("produtos")
+        for produto in self.iterar():
+            produto_elem = ET.SubElement(root, "produto")
+            ET.SubElement(produto_elem, "id").text = str(produto.id)
+            ET.SubElement(produto_elem, "nome").text = produto.nome
+            ET.SubElement(produto_elem, "preco").text = str(produto.preco)
+            ET.SubElement(produto_elem, "quantidade").text = str(produto.quantidade)
+
+        pasta = os.path.dirname(os.path.abspath(self.caminho))
+        fd, temporario = tempfile.mkstemp(dir=pasta, suffix=".tmp")
+        try:
+            with os.fdopen(fd, mode="wb") as file:
+                ET.ElementTree(root).write(file, encoding="utf-8")
+            os.replace(temporario, self.caminho)
+        except BaseException:
+            os.remove(temporario)
+            # O dicionário já foi alterado: força a releitura do arquivo
+            self._assinatura = None
+            raise
+        self._assinatura = self._versao()
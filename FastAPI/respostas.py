@@ -0,0 +1,54 @@
+import csv
+import io
+
+from fastapi.responses import StreamingResponse
+
+# Quantos produtos vão em cada pedaço enviado ao cliente
+TAMANHO_PEDACO = 500
+
+
+def _agrupar(textos):
+    pedaco = []
+    for texto in textos:
+        pedaco.append(texto)
+        if len(pedaco) >= TAMANHO_PEDACO:
+            yield "".join(pedaco)
+            pedaco = []
+    if pedaco:
+        yield "".join(pedaco)
+
+
+def _json(produtos):
+    yield "["
+    separador = ""
+    for produto in produtos:
+        yield separador + produto.model_dump_json()
+        separador = ","
+    yield "]"
+
+
+def _ndjson(produtos):
+    for produto in produtos:
+        yield produto.model_dump_json() + "\n"
+
+
+def _csv(produtos, campos):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=campos)
+    writer.writeheader()
+    for produto in produtos:
+        writer.writerow(produto.model_dump())
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+# Serializa os produtos à medida que o iterador os entrega, sem montar a
+# lista inteira nem validá-la de novo contra o response_model
+def resposta_produtos(produtos, formato, campos):
+    if formato == "ndjson":
+        return StreamingResponse(_agrupar(_ndjson(produtos)), media_type="application/x-ndjson")
+    if formato == "csv":
+        return StreamingResponse(_agrupar(_csv(produtos, campos)), media_type="text/csv")
+    return StreamingResponse(_agrupar(_json(produtos)), media_type="application/json")
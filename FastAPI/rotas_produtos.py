@@ -0,0 +1,104 @@
+from fastapi import APIRouter, HTTPException, Query, Request
+from typing import Literal, Optional
+from repositorio import ProdutoJaExiste, ProdutoNaoEncontrado
+from escritor_lote import EscritorLote
+from respostas import resposta_produtos
+from lote import aplicar_lote_atomico, ler_ids, ler_produtos, verificar_duplicados
+
+
+# Rotas CRUD de /produtos sobre qualquer RepositorioProdutos. Os handlers só
+# usam obter/iterar/aplicar_lote, então servem para todos os backends.
+def criar_router(repositorio, Produto):
+    router = APIRouter()
+
+    # Escritor único: as mudanças concorrentes são gravadas juntas, em lote
+    escritor = EscritorLote(repositorio.aplicar_lote)
+
+    # Rota para obter os produtos, em ordem de id, paginados por offset/limit
+    # ou pelo cursor after_id (último id recebido), em json, ndjson ou csv
+    @router.get("/produtos", response_model=list[Produto])
+    def listar_produtos(
+        offset: int = Query(0, ge=0),
+        limit: Optional[int] = Query(None, ge=1),
+        after_id: Optional[int] = None,
+        formato: Literal["json", "ndjson", "csv"] = "json",
+    ):
+        produtos = repositorio.iterar(after_id=after_id, offset=offset, limit=limit)
+        return resposta_produtos(produtos, formato, list(Produto.model_fields))
+
+    # Rotas de carga em massa (array JSON ou NDJSON), gravadas numa única
+    # escrita e com tudo ou nada; vêm antes das rotas /produtos/{produto_id}
+    @router.post("/produtos/bulk", response_model=dict)
+    async def criar_produtos_lote(request: Request):
+        produtos = await ler_produtos(request, Produto)
+        verificar_duplicados(produto.id for produto in produtos)
+        await aplicar_lote_atomico(repositorio, [("criar", produto.id, produto) for produto in produtos])
+        return {"mensagem": "Produtos criados com sucesso", "quantidade": len(produtos)}
+
+    @router.put("/produtos/bulk", response_model=dict)
+    async def atualizar_produtos_lote(request: Request):
+        produtos = await ler_produtos(request, Produto)
+        verificar_duplicados(produto.id for produto in produtos)
+        await aplicar_lote_atomico(repositorio, [("atualizar", produto.id, produto) for produto in produtos])
+        return {"mensagem": "Produtos atualizados com sucesso", "quantidade": len(produtos)}
+
+    @router.delete("/produtos/bulk", response_model=dict)
+    async def deletar_produtos_lote(request: Request):
+        ids = await ler_ids(request)
+        verificar_duplicados(ids)
+        await aplicar_lote_atomico(repositorio, [("remover", id, None) for id in ids])
+        return {"mensagem": "Produtos deletados com sucesso", "quantidade": len(ids)}
+
+    # Rota de busca por nome (prefixo ou trecho, sem diferenciar maiúsculas
+    # nem acentos) e por faixa de preço, com ordenação e limite
+    @router.get("/produtos/busca", response_model=list[Produto])
+    def buscar_produtos(
+        nome_prefixo: Optional[str] = None,
+        nome_contem: Optional[str] = None,
+        preco_min: Optional[float] = None,
+        preco_max: Optional[float] = None,
+        ordenar: Literal["id", "preco", "-preco", "nome", "-nome"] = "id",
+        limit: Optional[int] = Query(None, ge=1),
+        formato: Literal["json", "ndjson", "csv"] = "json",
+    ):
+        produtos = repositorio.buscar(nome_prefixo, nome_contem, preco_min, preco_max, ordenar, limit)
+        return resposta_produtos(produtos, formato, list(Produto.model_fields))
+
+    # Rota para obter um produto por ID
+    @router.get("/produtos/{produto_id}", response_model=Produto)
+    def obter_produto(produto_id: int):
+        produto = repositorio.obter(produto_id)
+        if produto is not None:
+            return produto
+        raise HTTPException(status_code=404, detail="Produto não encontrado")
+
+    # Rota para criar um novo produto
+    @router.post("/produtos", response_model=Produto)
+    async def criar_produto(produto: Produto):
+        try:
+            return await escritor.enviar(("criar", produto.id, produto))
+        except ProdutoJaExiste:
+            raise HTTPException(status_code=400, detail="ID já existe")
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    # Rota para atualizar um produto
+    @router.put("/produtos/{produto_id}", response_model=Produto)
+    async def atualizar_produto(produto_id: int, produto_atualizado: Produto):
+        try:
+            return await escritor.enviar(("atualizar", produto_id, produto_atualizado))
+        except ProdutoNaoEncontrado:
+            raise HTTPException(status_code=404, detail="Produto não encontrado")
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    # Rota para deletar um produto
+    @router.delete("/produtos/{produto_id}", response_model=dict)
+    async def deletar_produto(produto_id: int):
+        try:
+            await escritor.enviar(("remover", produto_id, None))
+        except ProdutoNaoEncontrado:
+            raise HTTPException(status_code=404, detail="Produto não encontrado")
+        return {"mensagem": "Produto deletado com sucesso"}
+
+    return router
@@ -0,0 +1,158 @@
+import os
+import threading
+
+import pytest
+from pydantic import BaseModel
+
+from armazenamento_csv import ArmazenamentoCSV
+
+
+class Produto(BaseModel):
+    id: int
+    nome: str
+    preco: float
+    quantidade: int
+
+
+def produto(id, nome=None):
+    return Produto(id=id, nome=nome or f"produto {id}", preco=id * 1.5, quantidade=id)
+
+
+def abrir(caminho, modo, **opcoes):
+    return ArmazenamentoCSV(str(caminho), Produto, modo=modo, **opcoes)
+
+
+def catalogo(armazenamento):
+    return {id: p.model_dump() for id, p in armazenamento.produtos().items()}
+
+
+# Corta os últimos bytes do arquivo, como uma escrita interrompida
+def cortar(caminho, bytes_):
+    tamanho = os.path.getsize(caminho)
+    with open(caminho, "r+b") as file:
+        file.truncate(tamanho - bytes_)
+
+
+LOTE_1 = [("criar", id, produto(id)) for id in (1, 2, 3)]
+LOTE_2 = [("atualizar", 2, produto(2, "novo")), ("remover", 3, None), ("criar", 4, produto(4))]
+
+
+@pytest.mark.parametrize("modo, arquivo, esperado", [
+    # Log: o último lote perde a linha que o fecha e é descartado inteiro
+    ("wal", "database.csv.wal", {1: "produto 1", 2: "produto 2", 3: "produto 3"}),
+    # Append: só a linha cortada (a criação do 4) se perde
+    ("append", "database.csv", {1: "produto 1", 2: "novo"}),
+])
+def test_queda_no_meio_do_ultimo_registro(tmp_path, modo, arquivo, esperado):
+    caminho = tmp_path / "database.csv"
+    armazenamento = abrir(caminho, modo)
+    armazenamento.aplicar_lote(LOTE_1)
+    armazenamento.aplicar_lote(LOTE_2)
+    # Sem checkpoint nem compactação: a queda acontece com tudo no log/CSV
+    cortar(tmp_path / arquivo, 3)
+
+    recuperado = abrir(caminho, modo)
+    assert {id: p["nome"] for id, p in catalogo(recuperado).items()} == esperado
+
+    # O que vem depois é gravado depois da parte recuperada, não do lixo
+    recuperado.aplicar_lote([("criar", 5, produto(5))])
+    assert catalogo(abrir(caminho, modo)) == catalogo(recuperado)
+    assert 5 in catalogo(recuperado)
+
+
+@pytest.mark.parametrize("modo", ["reescrita", "append", "wal"])
+def test_reabre_com_o_mesmo_catalogo(tmp_path, modo):
+    caminho = tmp_path / "database.csv"
+    armazenamento = abrir(caminho, modo)
+    armazenamento.aplicar_lote(LOTE_1)
+    armazenamento.aplicar_lote(LOTE_2)
+    assert catalogo(abrir(caminho, modo)) == catalogo(armazenamento)
+
+
+def test_queda_na_reescrita_mantem_o_csv_anterior(tmp_path, monkeypatch):
+    caminho = tmp_path / "database.csv"
+    armazenamento = abrir(caminho, "reescrita")
+    armazenamento.aplicar_lote(LOTE_1)
+    antes = catalogo(armazenamento)
+
+    def queda(*args):
+        raise OSError("queda antes da troca do arquivo")
+
+    monkeypatch.setattr(os, "replace", queda)
+    with pytest.raises(OSError):
+        armazenamento.aplicar_lote(LOTE_2)
+    monkeypatch.undo()
+    assert catalogo(abrir(caminho, "reescrita")) == antes
+
+
+def test_checkpoint_esvazia_o_log(tmp_path):
+    caminho = tmp_path / "database.csv"
+    armazenamento = abrir(caminho, "wal")
+    armazenamento.aplicar_lote(LOTE_1)
+    armazenamento.aplicar_lote(LOTE_2)
+    assert os.path.getsize(str(caminho) + ".wal") > 0
+
+    armazenamento.checkpoint()
+    assert os.path.getsize(str(caminho) + ".wal") == 0
+    reaberto = abrir(caminho, "wal")
+    assert catalogo(reaberto) == catalogo(armazenamento)
+
+    # Uma queda logo depois do checkpoint não perde nada
+    os.remove(str(caminho) + ".wal")
+    assert catalogo(abrir(caminho, "wal")) == catalogo(armazenamento)
+
+
+# Um lote gravado enquanto o checkpoint/compactação escreve o temporário
+# (fora da trava) não pode se perder na troca do arquivo
+@pytest.mark.parametrize("modo, metodo", [("wal", "checkpoint"), ("append", "compactar")])
+def test_escrita_durante_a_compactacao(tmp_path, monkeypatch, modo, metodo):
+    caminho = tmp_path / "database.csv"
+    armazenamento = abrir(caminho, modo)
+    armazenamento.aplicar_lote(LOTE_1)
+    armazenamento.aplicar_lote(LOTE_2)
+
+    gravar_temporario = armazenamento._gravar_temporario
+
+    def gravar_com_escrita_concorrente(*args, **kwargs):
+        temporario = gravar_temporario(*args, **kwargs)
+        escrita = threading.Thread(
+            target=armazenamento.aplicar_lote,
+            args=([("criar", 6, produto(6)), ("remover", 1, None)],),
+        )
+        escrita.start()
+        escrita.join()
+        return temporario
+
+    monkeypatch.setattr(armazenamento, "_gravar_temporario", gravar_com_escrita_concorrente)
+    getattr(armazenamento, metodo)()
+
+    esperado = {2: "novo", 4: "produto 4", 6: "produto 6"}
+    assert {id: p["nome"] for id, p in catalogo(armazenamento).items()} == esperado
+    assert {id: p["nome"] for id, p in catalogo(abrir(caminho, modo)).items()} == esperado
+
+
+@pytest.mark.parametrize("modo, opcoes", [
+    ("wal", {"limite_wal": 2048}),
+    ("append", {"limite_compactacao": 20}),
+])
+def test_compactacao_em_segundo_plano_com_escritas(tmp_path, modo, opcoes):
+    caminho = tmp_path / "database.csv"
+    armazenamento = abrir(caminho, modo, **opcoes)
+    esperado = {}
+    for rodada in range(200):
+        id = rodada % 30
+        if id in esperado and rodada % 3 == 0:
+            armazenamento.aplicar_lote([("remover", id, None)])
+            del esperado[id]
+        else:
+            tipo = "atualizar" if id in esperado else "criar"
+            armazenamento.aplicar_lote([(tipo, id, produto(id, f"rodada {rodada}"))])
+            esperado[id] = f"rodada {rodada}"
+    # Espera a última compactação agendada terminar
+    for thread in threading.enumerate():
+        if thread is not threading.current_thread() and thread.daemon:
+            thread.join(5)
+
+    assert armazenamento._reescritas > 0
+    assert {id: p["nome"] for id, p in catalogo(armazenamento).items()} == esperado
+    assert {id: p["nome"] for id, p in catalogo(abrir(caminho, modo)).items()} == esperado
@@ -0,0 +1,143 @@
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+
+from repositorio import LoteRejeitado, ProdutoJaExiste, ProdutoNaoEncontrado, criar_repositorio
+from rotas_produtos import criar_router
+
+
+class Produto(BaseModel):
+    id: int
+    nome: str
+    preco: float
+    quantidade: int
+
+
+def produto(id, nome=None):
+    return {"id": id, "nome": nome or f"produto {id}", "preco": id * 1.5, "quantidade": id}
+
+
+@pytest.fixture(params=["memoria", "csv"])
+def repositorio(request, tmp_path):
+    caminho = None if request.param == "memoria" else str(tmp_path / "database.csv")
+    return criar_repositorio(request.param, Produto, caminho)
+
+
+@pytest.fixture
+def cliente(repositorio):
+    app = FastAPI()
+    app.include_router(criar_router(repositorio, Produto))
+    return TestClient(app)
+
+
+def ids(cliente):
+    return [p["id"] for p in cliente.get("/produtos").json()]
+
+
+def test_carga_em_massa_json_e_ndjson(cliente):
+    resposta = cliente.post("/produtos/bulk", json=[produto(1), produto(2)])
+    assert resposta.status_code == 200
+    assert resposta.json()["quantidade"] == 2
+
+    ndjson = "\n".join(json.dumps(produto(id)) for id in (3, 4)) + "\n"
+    resposta = cliente.post(
+        "/produtos/bulk", content=ndjson, headers={"Content-Type": "application/x-ndjson"}
+    )
+    assert resposta.status_code == 200
+    assert ids(cliente) == [1, 2, 3, 4]
+
+
+# Um item com problema derruba o lote inteiro: nada é gravado e a resposta
+# lista os ids problemáticos
+def test_falha_parcial_nao_grava_nada(cliente):
+    cliente.post("/produtos/bulk", json=[produto(1), produto(2)])
+
+    resposta = cliente.post("/produtos/bulk", json=[produto(3), produto(2), produto(4)])
+    assert resposta.status_code == 400
+    assert resposta.json()["detail"] == {"mensagem": "ID já existe", "ids": [2]}
+
+    resposta = cliente.put("/produtos/bulk", json=[produto(1, "novo"), produto(9)])
+    assert resposta.status_code == 404
+    assert resposta.json()["detail"]["ids"] == [9]
+
+    resposta = cliente.request("DELETE", "/produtos/bulk", json=[1, {"id": 8}])
+    assert resposta.status_code == 404
+    assert resposta.json()["detail"]["ids"] == [8]
+
+    assert ids(cliente) == [1, 2]
+    assert cliente.get("/produtos/1").json()["nome"] == "produto 1"
+
+
+def test_ids_repetidos_no_lote(cliente):
+    resposta = cliente.post("/produtos/bulk", json=[produto(1), produto(1)])
+    assert resposta.status_code == 400
+    assert resposta.json()["detail"]["ids"] == [1]
+    assert ids(cliente) == []
+
+
+def test_linha_ndjson_invalida(cliente):
+    ndjson = json.dumps(produto(1)) + "\n{quebrado\n"
+    resposta = cliente.post(
+        "/produtos/bulk", content=ndjson, headers={"Content-Type": "application/x-ndjson"}
+    )
+    assert resposta.status_code == 422
+    assert "Linha 2" in resposta.json()["detail"]
+    assert ids(cliente) == []
+
+
+# Sem atomico, cada operação tem o seu resultado: as que falham devolvem a
+# exceção e as outras são aplicadas
+def test_lote_com_resultados_mistos(repositorio):
+    repositorio.aplicar_lote([("criar", 1, Produto(**produto(1)))])
+    resultados = repositorio.aplicar_lote([
+        ("criar", 1, Produto(**produto(1))),
+        ("criar", 2, Produto(**produto(2))),
+        ("remover", 7, None),
+    ])
+    assert isinstance(resultados[0], ProdutoJaExiste)
+    assert resultados[1].id == 2
+    assert isinstance(resultados[2], ProdutoNaoEncontrado)
+    assert [p.id for p in repositorio.iterar()] == [1, 2]
+
+
+def test_lote_atomico_rejeitado(repositorio):
+    repositorio.aplicar_lote([("criar", 1, Produto(**produto(1)))])
+    with pytest.raises(LoteRejeitado) as erro:
+        repositorio.aplicar_lote([
+            ("criar", 2, Produto(**produto(2))),
+            ("criar", 1, Produto(**produto(1))),
+            ("atualizar", 5, Produto(**produto(5))),
+        ], True)
+    assert [type(e) for e in erro.value.erros] == [ProdutoJaExiste, ProdutoNaoEncontrado]
+    assert [e.args[0] for e in erro.value.erros] == [1, 5]
+    assert [p.id for p in repositorio.iterar()] == [1]
+
+
+# A verificação do lote atômico considera as operações anteriores do
+# próprio lote: criar e depois remover o mesmo id é válido, o contrário
+# (remover um id que só seria criado depois) não
+def test_lote_atomico_segue_a_ordem_das_operacoes(repositorio):
+    repositorio.aplicar_lote([
+        ("criar", 1, Produto(**produto(1))),
+        ("atualizar", 1, Produto(**produto(1, "novo"))),
+        ("criar", 2, Produto(**produto(2))),
+        ("remover", 2, None),
+        ("criar", 2, Produto(**produto(2, "de novo"))),
+    ], True)
+    assert {p.id: p.nome for p in repositorio.iterar()} == {1: "novo", 2: "de novo"}
+
+    with pytest.raises(LoteRejeitado) as erro:
+        repositorio.aplicar_lote([
+            ("remover", 3, None),
+            ("criar", 3, Produto(**produto(3))),
+            ("remover", 1, None),
+            ("atualizar", 1, Produto(**produto(1))),
+        ], True)
+    assert [(type(e), e.args[0]) for e in erro.value.erros] == [
+        (ProdutoNaoEncontrado, 3),
+        (ProdutoNaoEncontrado, 1),
+    ]
+    assert {p.id: p.nome for p in repositorio.iterar()} == {1: "novo", 2: "de novo"}
@@ -0,0 +1,104 @@
+import csv
+import io
+import os
+import tempfile
+
+from indice_offsets import decodificar_registro, ler_registros
+
+# Linha que fecha um lote no log: todos os campos vazios
+FIM_LOTE = ["", "", "", ""]
+
+
+# Sincroniza a pasta, para que um rename ou a criação de um arquivo nela
+# também sobreviva a uma queda de energia (não existe no Windows)
+def sincronizar_pasta(caminho):
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(caminho)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+# Log de escrita antecipada (write-ahead log) do CSV de produtos.
+#
+# Cada lote de mudanças vira algumas linhas no mesmo formato do CSV (uma
+# linha só com o id é uma remoção) seguidas da linha FIM_LOTE, gravadas com
+# uma única escrita e um fsync. Na leitura, só os lotes fechados contam: um
+# lote cortado no meio por uma queda é ignorado por inteiro.
+class LogEscrita:
+    def __init__(self, caminho):
+        self.caminho = caminho
+
+    def tamanho(self):
+        try:
+            return os.path.getsize(self.caminho)
+        except FileNotFoundError:
+            return 0
+
+    # Devolve as linhas dos lotes completos e o offset do fim do último deles
+    def ler(self):
+        rows = []
+        fim = 0
+        if not os.path.exists(self.caminho):
+            return rows, fim
+        with open(self.caminho, mode="rb") as file:
+            pendentes = []
+            for offset, dados in ler_registros(file):
+                try:
+                    row = decodificar_registro(dados)
+                except (UnicodeDecodeError, csv.Error):
+                    break
+                if row == FIM_LOTE:
+                    rows.extend(pendentes)
+                    pendentes = []
+                    fim = offset + len(dados)
+                else:
+                    pendentes.append(row)
+        return rows, fim
+
+    # Na abertura: descarta o que sobrou de um lote incompleto, para que os
+    # próximos lotes não sejam gravados depois de lixo
+    def recuperar(self):
+        rows, fim = self.ler()
+        if self.tamanho() > fim:
+            with open(self.caminho, mode="r+b") as file:
+                file.truncate(fim)
+                file.flush()
+                os.fsync(file.fileno())
+        return rows
+
+    def acrescentar(self, rows):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerows(rows)
+        writer.writerow(FIM_LOTE)
+        novo = not os.path.exists(self.caminho)
+        with open(self.caminho, mode="ab") as file:
+            file.write(buffer.getvalue().encode("utf-8"))
+            file.flush()
+            os.fsync(file.fileno())
+        if novo:
+            sincronizar_pasta(self.caminho)
+
+    # Depois de um checkpoint: mantém só o que foi gravado a partir de `offset`
+    # (lotes que chegaram enquanto o checkpoint era escrito)
+    def descartar_ate(self, offset):
+        with open(self.caminho, mode="rb") as file:
+            file.seek(offset)
+            cauda = file.read()
+        pasta = os.path.dirname(os.path.abspath(self.caminho))
+        fd, temporario = tempfile.mkstemp(dir=pasta, suffix=".tmp")
+        try:
+            with os.fdopen(fd, mode="wb") as file:
+                file.write(cauda)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temporario, self.caminho)
+        except BaseException:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+            raise
+        sincronizar_pasta(self.caminho)